@@ -0,0 +1,122 @@
+# access.py
+"""Снимок прав доступа в памяти.
+
+Проверка администратора и поиск отдела пользователя по Telegram ID
+выполняются на каждое нажатие кнопки, поэтому отвечают из словарей без
+обращения к БД. Снимок загружается при запуске и периодически
+(ACCESS_RELOAD_INTERVAL -- подхватывает изменения, сделанные другими
+репликами или синхронизацией с кадровой системой), а после изменений
+через бота обновляется только по затронутым сотрудникам.
+
+Администраторы -- ADMIN_IDS из config.py (их нельзя снять через бота) и
+пользователи с ролью UserRole.ADMIN.
+"""
+import logging
+from typing import TYPE_CHECKING, NamedTuple, Optional
+from database import Employee, UserRole
+from async_db import run_db
+from config import ADMIN_IDS, ACCESS_RELOAD_INTERVAL
+
+if TYPE_CHECKING:
+    # Только для аннотаций: импорт utils/importer (CLI) не должен тянуть python-telegram-bot
+    from telegram.ext import Application, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+RELOAD_JOB_NAME = "access_reload"
+
+
+class Member(NamedTuple):
+    """Сотрудник, которому принадлежит Telegram ID"""
+    employee_id: int
+    department_id: int
+
+
+class AccessSnapshot:
+    """Администраторы и соответствие Telegram ID -> сотрудник.
+
+    Используется только из цикла событий; словари заменяются или
+    изменяются целиком между await, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, bootstrap_admins=ADMIN_IDS):
+        self.bootstrap_admins = frozenset(bootstrap_admins)
+        self._admins = self.bootstrap_admins
+        self._members = {}  # Telegram ID -> Member
+        self._telegram_ids = {}  # ID сотрудника -> Telegram ID
+
+    def is_admin(self, telegram_id: int) -> bool:
+        return telegram_id in self._admins
+
+    def member(self, telegram_id: int) -> Optional[Member]:
+        return self._members.get(telegram_id)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    # ---------- загрузка ----------
+
+    def load(self, admin_ids, rows) -> None:
+        """Заменить снимок: ID администраторов и строки (id, Telegram ID, ID отдела)"""
+        self._admins = self.bootstrap_admins | frozenset(admin_ids)
+        self._members = {telegram_id: Member(emp_id, dept_id) for emp_id, telegram_id, dept_id in rows}
+        self._telegram_ids = {emp_id: telegram_id for emp_id, telegram_id, _ in rows}
+
+    async def reload(self, context: 'ContextTypes.DEFAULT_TYPE | None' = None) -> None:
+        """Полная загрузка из БД"""
+        admin_ids = await run_db(UserRole.get_ids)
+        rows = await run_db(Employee.get_access_rows)
+        self.load(admin_ids, rows)
+        logger.info(f"Права доступа: {len(self._admins)} администраторов, {len(self._members)} сотрудников")
+
+    # ---------- инкрементальные изменения ----------
+
+    def set_employee(self, employee_id: int, telegram_id: Optional[int], department_id: Optional[int]) -> None:
+        """Сотрудник добавлен или изменён (telegram_id=None -- удалён или без Telegram ID)"""
+        previous = self._telegram_ids.pop(employee_id, None)
+        member = self._members.get(previous)
+        if member is not None and member.employee_id == employee_id:
+            del self._members[previous]
+        if telegram_id is not None:
+            self._members[telegram_id] = Member(employee_id, department_id)
+            self._telegram_ids[employee_id] = telegram_id
+
+    async def refresh(self, employee_ids) -> None:
+        """Перечитать сотрудников после изменения через бота (удалённые убираются из снимка)"""
+        employee_ids = set(employee_ids)
+        rows = await run_db(Employee.get_access_rows, employee_ids)
+        for employee_id in employee_ids - {row[0] for row in rows}:
+            self.set_employee(employee_id, None, None)
+        for employee_id, telegram_id, department_id in rows:
+            self.set_employee(employee_id, telegram_id, department_id)
+
+    def remove_department(self, department_id: int) -> None:
+        """Отдел удалён вместе с сотрудниками"""
+        for member in list(self._members.values()):
+            if member.department_id == department_id:
+                self.set_employee(member.employee_id, None, None)
+
+    async def grant_admin(self, telegram_id: int) -> bool:
+        """Назначить администратора. False, если он уже был назначен"""
+        granted = await run_db(UserRole.grant, telegram_id)
+        self._admins = self._admins | {telegram_id}
+        return granted
+
+    async def revoke_admin(self, telegram_id: int) -> bool:
+        """Снять администратора, назначенного через бота"""
+        revoked = await run_db(UserRole.revoke, telegram_id)
+        if telegram_id not in self.bootstrap_admins:
+            self._admins = self._admins - {telegram_id}
+        return revoked
+
+
+# Общий снимок прав бота
+access = AccessSnapshot()
+
+
+def setup_access(application: 'Application') -> AccessSnapshot:
+    """Периодическое обновление снимка (первая загрузка -- в post_init, до получения обновлений)"""
+    application.job_queue.run_repeating(
+        access.reload, interval=ACCESS_RELOAD_INTERVAL, first=ACCESS_RELOAD_INTERVAL, name=RELOAD_JOB_NAME
+    )
+    return access
@@ -0,0 +1,60 @@
+# async_db.py
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from database import Session
+from config import DB_POOL_SIZE, DB_CALL_TIMEOUT
+
+# Отдельный ограниченный пул потоков: синхронные запросы SQLAlchemy
+# не блокируют цикл событий и не занимают пул по умолчанию
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Таймаут run_db истёк раньше, чем функция дошла до commit"""
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _check_deadline(session) -> None:
+    # Вызывающий уже получил TimeoutError: не фиксируем изменения у него за спиной
+    deadline = session.info.get('deadline')
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineExceeded("Таймаут обращения к БД истёк до фиксации транзакции")
+
+
+def _call_in_session(func, args, kwargs, deadline):
+    with Session() as session:
+        session.info['deadline'] = deadline
+        return func(session, *args, **kwargs)
+
+
+async def run_db(func, *args, timeout: float = DB_CALL_TIMEOUT, **kwargs):
+    """Выполнить func(session, *args, **kwargs) в пуле потоков БД.
+
+    Принимает classmethod'ы моделей (например, Department.get_all) и любые
+    функции, первым аргументом принимающие сессию.
+
+    По таймауту отменяется только ожидание: func продолжает выполняться в
+    потоке. Чтобы изменения не зафиксировались после того, как вызывающий
+    получил TimeoutError, commit после истечения таймаута откатывается
+    (DeadlineExceeded). Если таймаут истёк во время самого commit,
+    изменения могут сохраниться, поэтому неидемпотентные записи после
+    TimeoutError не повторяйте вслепую. timeout=None -- без таймаута.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # Контекст копируется, чтобы запросы учитывались в метриках вызвавшего обработчика
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(
+        _executor, context.run, partial(_call_in_session, func, args, kwargs, deadline)
+    )
+    return await asyncio.wait_for(future, timeout)
+
+
+def shutdown() -> None:
+    """Остановка пула потоков БД"""
+    _executor.shutdown(wait=True)
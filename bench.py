@@ -0,0 +1,447 @@
+# bench.py
+"""Замеры производительности слоя данных и обработчиков на синтетической организации.
+
+    python bench.py                       # 1000 отделов, 500 000 сотрудников, сравнение с базовой линией
+    python bench.py --save                # записать результаты как новую базовую линию
+    python bench.py --departments 50 --employees 5000 --repeat 20 --only employee
+
+Организация генерируется детерминированно (--seed) во временной БД или
+в файле --db (при повторном запуске с теми же параметрами используется
+заново). Для каждого сценария измеряются медиана, p95 и минимум времени
+одного вызова и количество SQL-запросов. Базовая линия хранится в JSON
+(--baseline); сценарий считается регрессией, если его медиана выросла
+больше чем на --threshold (и больше чем на NOISE_MS). Базовая линия
+имеет смысл только для той же машины и тех же параметров генерации.
+
+bench_baseline.json в репозитории снята с параметрами по умолчанию на
+одноядерной виртуальной машине x86_64 (Linux, Python 3.11.7, SQLite
+3.40.1; см. поле environment). На другой машине сначала сохраните свою
+базовую линию (--save, при необходимости в другой файл --baseline) на
+коде без изменений, а затем сравнивайте с ней.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, NamedTuple, Optional
+from sqlalchemy import insert, func, select
+import database
+from database import Department, Employee, birthday_key
+from migrations import migrate
+from cache import cache
+from rendering import render_cache
+from orm_audit import audit
+from handlers import view_departments, view_employees, view_employee_details
+from config import ADMIN_IDS, PAGE_SIZE
+
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.25  # Допустимый рост медианы (25%)
+NOISE_MS = 0.05  # Изменения меньше этого не считаются регрессией
+INSERT_BATCH = 10000
+
+SURNAMES = (
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров",
+    "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев",
+)
+NAMES = ("Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Иван", "Михаил", "Николай", "Павел")
+PATRONYMICS = ("Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Иванович", "Петрович", "Олегович")
+DEPARTMENT_WORDS = ("Отдел", "Служба", "Управление", "Сектор", "Группа")
+DEPARTMENT_TOPICS = (
+    "продаж", "закупок", "логистики", "кадров", "бухгалтерии", "разработки", "поддержки", "маркетинга",
+    "безопасности", "аналитики", "качества", "снабжения",
+)
+TELEGRAM_ID_BASE = 10 ** 9
+
+
+# ---------- синтетические данные ----------
+
+class BenchData(NamedTuple):
+    """Сведения о сгенерированной организации, нужные сценариям"""
+    department_ids: list
+    telegram_ids: list
+    employee_count: int
+    rng: random.Random
+
+
+def generate_org(session, departments: int, employees: int, seed: int = 1, log=print) -> None:
+    """Заполнить пустую БД: отделы, сотрудники (у каждого второго -- Telegram ID), начальники"""
+    rng = random.Random(seed)
+    session.execute(insert(Department), [
+        {'name': f"{rng.choice(DEPARTMENT_WORDS)} {rng.choice(DEPARTMENT_TOPICS)} №{i + 1}"}
+        for i in range(departments)
+    ])
+    session.commit()
+    department_ids = session.scalars(select(Department.id).order_by(Department.id)).all()
+
+    start = date(1960, 1, 1)
+    batch = []
+    for i in range(employees):
+        birth_date = start + timedelta(days=rng.randrange(365 * 45))
+        batch.append({
+            'full_name': f"{rng.choice(SURNAMES)} {rng.choice(NAMES)} {rng.choice(PATRONYMICS)}",
+            'birth_date': birth_date,
+            'birth_key': birthday_key(birth_date),
+            'telegram_id': TELEGRAM_ID_BASE + i if i % 2 == 0 else None,
+            # Первые сотрудники -- по одному в каждом отделе, они же начальники
+            'is_head': i < departments,
+            'department_id': department_ids[i % departments] if i < departments else rng.choice(department_ids),
+        })
+        if len(batch) == INSERT_BATCH:
+            session.execute(insert(Employee), batch)
+            session.commit()
+            batch = []
+            log(f"  сотрудников: {i + 1}/{employees}")
+    if batch:
+        session.execute(insert(Employee), batch)
+        session.commit()
+
+
+def load_data(session, seed: int) -> BenchData:
+    return BenchData(
+        department_ids=session.scalars(select(Department.id)).all(),
+        telegram_ids=session.scalars(select(Employee.telegram_id).where(Employee.telegram_id.is_not(None))).all(),
+        employee_count=session.scalar(select(func.max(Employee.id))),
+        rng=random.Random(seed),
+    )
+
+
+def prepare_database(url: str, departments: int, employees: int, seed: int, log=print) -> BenchData:
+    """Подключиться к БД для замеров и сгенерировать организацию, если её ещё нет"""
+    engine = database.init_engine(url)
+    migrate(engine)
+    with database.Session() as session:
+        counts = (session.scalar(select(func.count(Department.id))), session.scalar(select(func.count(Employee.id))))
+        if counts == (0, 0):
+            log(f"Генерация: {departments} отделов, {employees} сотрудников")
+            started = time.perf_counter()
+            generate_org(session, departments, employees, seed, log)
+            log(f"Сгенерировано за {time.perf_counter() - started:.1f} с")
+        elif counts != (departments, employees):
+            raise SystemExit(f"В БД {url} уже {counts[0]} отделов и {counts[1]} сотрудников, нужна пустая БД")
+        return load_data(session, seed)
+
+
+# ---------- поддельные объекты Telegram ----------
+
+class FakeUser(NamedTuple):
+    id: int
+
+
+class FakeChat(NamedTuple):
+    id: int
+
+
+class FakeMessage:
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.text = None
+        self.reply_markup = None
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        self.text, self.reply_markup = text, reply_markup
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        return FakeMessage(self.chat_id)
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int):
+        self.from_user = FakeUser(user_id)
+        self.message = FakeMessage(user_id)
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        await self.message.edit_text(text, reply_markup=reply_markup)
+
+
+class FakeBot:
+    """Bot API без сети: запросы только подсчитываются"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.requests += 1
+        return FakeMessage(chat_id)
+
+
+class FakeUpdate:
+    def __init__(self, user_id: int):
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeChat(user_id)
+        self.callback_query = FakeCallbackQuery(user_id)
+        self.message = None
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot_data = {}
+
+
+class FakeContext:
+    def __init__(self, bot: FakeBot, application: FakeApplication):
+        self.bot = bot
+        self.application = application
+        self.user_data = {}
+
+
+def fake_click(user_id: int = ADMIN_IDS[0] if ADMIN_IDS else 1) -> tuple[FakeUpdate, FakeContext]:
+    """Нажатие кнопки пользователем: обновление и контекст для вызова обработчика"""
+    return FakeUpdate(user_id), FakeContext(FakeBot(), FakeApplication())
+
+
+# ---------- сценарии ----------
+
+class Case(NamedTuple):
+    name: str
+    run: Callable  # run(data, prepared) -> None или корутина
+    setup: Optional[Callable] = None  # setup(data) -> prepared, не входит в замер
+
+
+CASES: list[Case] = []
+
+
+def case(name: str, setup: Optional[Callable] = None):
+    def register(func):
+        CASES.append(Case(name, func, setup))
+        return func
+    return register
+
+
+def in_session(func, *args):
+    with database.Session() as session:
+        return func(session, *args)
+
+
+def cold_caches(data: BenchData) -> None:
+    """Замер без кэша: каждый вызов идёт в БД"""
+    cache.clear()
+    render_cache.clear()
+
+
+@case("department.get_all[first]")
+def _(data, _):
+    in_session(Department.get_all, 1, PAGE_SIZE)
+
+
+@case("department.get_all[last]")
+def _(data, _):
+    # OFFSET: стоимость растёт с номером страницы
+    in_session(Department.get_all, len(data.department_ids) // PAGE_SIZE, PAGE_SIZE)
+
+
+@case("department.get_page_with_total")
+def _(data, _):
+    in_session(Department.get_page_with_total, None, PAGE_SIZE)
+
+
+@case("employee.get_by_department")
+def _(data, _):
+    in_session(Employee.get_by_department, data.rng.choice(data.department_ids), 1, PAGE_SIZE)
+
+
+@case("employee.get_count_by_department")
+def _(data, _):
+    in_session(Employee.get_count_by_department, data.rng.choice(data.department_ids))
+
+
+@case("department.get_employee_listing")
+def _(data, _):
+    in_session(Department.get_employee_listing, data.rng.choice(data.department_ids), None, PAGE_SIZE)
+
+
+@case("employee.get_by_telegram_id")
+def _(data, _):
+    in_session(Employee.get_by_telegram_id, data.rng.choice(data.telegram_ids))
+
+
+@case("employee.search")
+def _(data, _):
+    in_session(Employee.search, data.rng.choice(SURNAMES)[:4])
+
+
+@case("employee.get_upcoming_birthdays")
+def _(data, _):
+    in_session(Employee.get_upcoming_birthdays, date.today(), 14, None)
+
+
+def _new_department(data: BenchData) -> int:
+    """Отдел со средним количеством сотрудников, который удалит сценарий"""
+    size = max(1, data.employee_count // len(data.department_ids))
+    with database.Session() as session:
+        department = Department(name=f"Удаляемый {data.rng.random()}")
+        session.add(department)
+        session.flush()
+        session.execute(insert(Employee), [
+            {'full_name': f"Сотрудник {i}", 'birth_date': date(1990, 1, 1), 'birth_key': 101,
+             'department_id': department.id}
+            for i in range(size)
+        ])
+        session.commit()
+        return department.id
+
+
+@case("department.delete_by_id[cascade]", setup=_new_department)
+def _(data, department_id):
+    in_session(Department.delete_by_id, department_id)
+
+
+def _new_employee(data: BenchData) -> int:
+    with database.Session() as session:
+        return Employee.create(
+            session, full_name="Удаляемый", birth_date=date(1990, 1, 1), department_id=data.department_ids[0]
+        ).id
+
+
+@case("employee.delete_by_id", setup=_new_employee)
+def _(data, emp_id):
+    in_session(Employee.delete_by_id, emp_id)
+
+
+@case("handler.view_departments[cold]", setup=cold_caches)
+async def _(data, _):
+    await view_departments(*fake_click())
+
+
+@case("handler.view_employees[cold]", setup=cold_caches)
+async def _(data, _):
+    await view_employees(*fake_click(), dept_id=data.rng.choice(data.department_ids))
+
+
+@case("handler.view_employees[warm]")
+async def _(data, _):
+    await view_employees(*fake_click(), dept_id=data.department_ids[0])
+
+
+@case("handler.view_employee_details[cold]", setup=cold_caches)
+async def _(data, _):
+    await view_employee_details(*fake_click(), emp_id=data.rng.randint(1, data.employee_count))
+
+
+# ---------- замеры ----------
+
+async def _call(func, *args) -> None:
+    result = func(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def measure(bench_case: Case, data: BenchData, repeat: int, warmup: int) -> dict:
+    """Время одного вызова сценария, мс, и количество SQL-запросов в нём"""
+    timings = []
+    for i in range(warmup + repeat):
+        prepared = bench_case.setup(data) if bench_case.setup else None
+        started = time.perf_counter()
+        await _call(bench_case.run, data, prepared)
+        if i >= warmup:
+            timings.append((time.perf_counter() - started) * 1000)
+    # Отдельный вызов под аудитом: сам аудит в замер не входит
+    prepared = bench_case.setup(data) if bench_case.setup else None
+    with audit(bench_case.name) as report:
+        await _call(bench_case.run, data, prepared)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'min_ms': round(timings[0], 4),
+        'queries': report.queries,
+    }
+
+
+async def run_cases(data: BenchData, repeat: int, warmup: int, only: Optional[str] = None, log=print) -> dict:
+    results = {}
+    for bench_case in CASES:
+        if only and only not in bench_case.name:
+            continue
+        results[bench_case.name] = await measure(bench_case, data, repeat, warmup)
+        log(f"  {bench_case.name:<40} {results[bench_case.name]['median_ms']:>10.3f} мс "
+            f"(p95 {results[bench_case.name]['p95_ms']:.3f}, запросов {results[bench_case.name]['queries']})")
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Сценарии, медиана которых выросла больше допустимого по сравнению с базовой линией"""
+    if current['params'] != baseline.get('params'):
+        return []
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        now, before = result['median_ms'], base['median_ms']
+        if now > before * (1 + threshold) and now - before > NOISE_MS:
+            regressions.append(f"{name}: {before:.3f} -> {now:.3f} мс (+{(now / before - 1) if before else 0:.0%})")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: запросов {base['queries']} -> {result['queries']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Точка входа командной строки. Возвращает 1 при регрессиях"""
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетической организации")
+    parser.add_argument('--departments', type=int, default=1000, help="Количество отделов")
+    parser.add_argument('--employees', type=int, default=500000, help="Количество сотрудников")
+    parser.add_argument('--seed', type=int, default=1, help="Зерно генератора данных")
+    parser.add_argument('--repeat', type=int, default=50, help="Замеров на сценарий")
+    parser.add_argument('--warmup', type=int, default=5, help="Вызовов на прогрев перед замерами")
+    parser.add_argument('--only', help="Только сценарии, в названии которых есть эта строка")
+    parser.add_argument('--db', help="Файл SQLite для сгенерированных данных (по умолчанию временный)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="JSON с базовой линией")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Допустимый рост медианы")
+    parser.add_argument('--save', action='store_true', help="Сохранить результаты как базовую линию")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "bench.db")
+        data = prepare_database(f"sqlite:///{path}", args.departments, args.employees, args.seed)
+        try:
+            results = asyncio.run(run_cases(data, args.repeat, args.warmup, args.only))
+        finally:
+            database.get_engine().dispose()
+
+    current = {
+        'params': {'departments': args.departments, 'employees': args.employees, 'seed': args.seed},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'machine': platform.machine()},
+        'results': results,
+    }
+    if args.save:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('params') == current['params']:
+                # Сценарии, не попавшие в --only, остаются из прежней базовой линии
+                current['results'] = {**previous['results'], **results}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Базовая линия сохранена в {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Базовой линии {args.baseline} нет, сохраните её с --save")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('params') != current['params']:
+        print("Базовая линия снята с другими параметрами генерации, сравнение пропущено")
+        return 0
+    regressions = compare(current, baseline, args.threshold)
+    for line in regressions:
+        print(f"РЕГРЕССИЯ {line}")
+    print("Регрессий нет" if not regressions else f"Регрессий: {len(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# cache.py
+import time
+from collections import OrderedDict
+from async_db import run_db
+from config import CACHE_MAX_SIZE, CACHE_TTL
+
+
+class TTLCache:
+    """LRU-кэш с временем жизни записей и инвалидацией по тегам.
+
+    Используется только из цикла событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, maxsize: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # ключ -> (время истечения, значение, теги)
+        self._tags = {}  # тег -> множество ключей
+        self._generation = 0  # увеличивается при каждой инвалидации
+        self._epoch = 0  # увеличивается при полной очистке
+        self._tag_versions = {}  # тег -> количество инвалидаций
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def versions(self, tags) -> tuple:
+        """Версия данных с указанными тегами: меняется при каждой их инвалидации"""
+        return (self._epoch, *(self._tag_versions.get(tag, 0) for tag in tags))
+
+    def get(self, key) -> tuple[bool, object]:
+        """Возвращает (найдено, значение)"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key, value, tags=(), generation: int | None = None) -> None:
+        """Сохранить значение.
+
+        Если передан generation и с тех пор была инвалидация, значение
+        не сохраняется: оно могло быть прочитано до записи в БД.
+        """
+        if generation is not None and generation != self._generation:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def invalidate(self, *tags) -> None:
+        """Удалить все записи с любым из указанных тегов"""
+        self._generation += 1
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            for key in self._tags.pop(tag, ()):
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Полная очистка кэша"""
+        self._generation += 1
+        self._epoch += 1
+        self._tag_versions.clear()
+        self._data.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key) -> None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Общий кэш данных бота
+cache = TTLCache()
+
+DEPARTMENTS_TAG = "departments"  # Списки и количество отделов
+SEARCH_TAG = "search"  # Результаты поиска сотрудников
+BIRTHDAYS_TAG = "birthdays"  # Списки ближайших дней рождения
+
+
+def department_tag(department_id: int) -> str:
+    return f"department:{department_id}"
+
+
+def employee_tag(employee_id: int) -> str:
+    return f"employee:{employee_id}"
+
+
+async def cached_run_db(key, tags, func, *args):
+    """run_db с чтением через кэш.
+
+    tags -- последовательность тегов или функция, вычисляющая их по значению.
+    Пустые результаты (None) не кэшируются.
+    """
+    found, value = cache.get(key)
+    if found:
+        return value
+    generation = cache.generation
+    value = await run_db(func, *args)
+    if value is not None:
+        cache.set(key, value, tags(value) if callable(tags) else tags, generation=generation)
+    return value
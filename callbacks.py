@@ -0,0 +1,173 @@
+# callbacks.py
+"""Формат callback_data инлайн-кнопок и маршрутизация нажатий.
+
+callback_data имеет вид "<версия><код действия>[:<аргумент>...]", например
+"1de:5:n1c" -- список сотрудников отдела 5 после сотрудника 48. Числа
+записываются в base36, курсор пагинации -- направлением и id ('n1c').
+Длина проверяется при кодировании (Telegram допускает не больше 64 байт).
+
+Нажатие разбирается один раз, обработчик выбирается по коду действия
+словарём (без перебора регулярных выражений) и получает аргументы
+именованными параметрами нужного типа. Кнопки старой версии формата
+не разбираются и обрабатываются отдельно (см. stale_callback).
+"""
+from typing import Any, Callable, Optional
+from telegram import Update
+from telegram.ext import BaseHandler
+
+CALLBACK_VERSION = "1"
+MAX_CALLBACK_BYTES = 64  # Ограничение Telegram
+SEPARATOR = ":"
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _encode_int(value: int) -> str:
+    if value < 0:
+        return "-" + _encode_int(-value)
+    digits = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        digits = _DIGITS[remainder] + digits
+        if not value:
+            return digits
+
+
+def _decode_int(token: str) -> int:
+    return int(token, 36)
+
+
+def _encode_cursor(cursor: tuple[str, int]) -> str:
+    direction, item_id = cursor
+    return direction + _encode_int(item_id)
+
+
+def _decode_cursor(token: str) -> tuple[str, int]:
+    if token[0] not in ('n', 'p'):
+        raise ValueError(f"Неверный курсор: {token}")
+    return token[0], _decode_int(token[1:])
+
+
+# Типы аргументов: кодирование и разбор
+INT = (_encode_int, _decode_int)
+CURSOR = (_encode_cursor, _decode_cursor)
+
+_actions: dict[str, "CallbackAction"] = {}
+
+
+class CallbackAction:
+    """Действие инлайн-кнопки: код и типизированные аргументы.
+
+    Необязательные аргументы (None) кодируются пустой строкой.
+    """
+    __slots__ = ('code', 'fields')
+
+    def __init__(self, code: str, **fields):
+        if code in _actions:
+            raise ValueError(f"Код действия '{code}' уже занят")
+        self.code = code
+        self.fields = tuple(fields.items())
+        _actions[code] = self
+
+    def encode(self, *args) -> str:
+        """callback_data для кнопки"""
+        if len(args) > len(self.fields):
+            raise ValueError(f"Лишние аргументы для '{self.code}': {args}")
+        parts = [CALLBACK_VERSION + self.code]
+        for (name, (encode, _)), value in zip(self.fields, args):
+            parts.append("" if value is None else encode(value))
+        data = SEPARATOR.join(parts).rstrip(SEPARATOR)
+        if len(data.encode()) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data длиннее {MAX_CALLBACK_BYTES} байт: {data}")
+        return data
+
+    def decode_args(self, tokens: list[str]) -> dict[str, Any]:
+        args = {}
+        for index, (name, (_, decode)) in enumerate(self.fields):
+            token = tokens[index] if index < len(tokens) else ""
+            args[name] = decode(token) if token else None
+        return args
+
+    def __repr__(self) -> str:
+        return f"CallbackAction({self.code!r})"
+
+
+def decode(data: Optional[str]) -> Optional[tuple[CallbackAction, dict[str, Any]]]:
+    """Действие и аргументы из callback_data (None -- чужой или устаревший формат)"""
+    if not data or not data.startswith(CALLBACK_VERSION):
+        return None
+    code, *tokens = data[len(CALLBACK_VERSION):].split(SEPARATOR)
+    action = _actions.get(code)
+    if action is None or len(tokens) > len(action.fields):
+        return None
+    try:
+        return action, action.decode_args(tokens)
+    except (ValueError, IndexError):
+        return None
+
+
+# ---------- действия ----------
+
+MAIN_MENU = CallbackAction("mm")
+DEPARTMENTS = CallbackAction("dl", cursor=CURSOR)
+DEPARTMENT = CallbackAction("de", dept_id=INT, cursor=CURSOR)
+MY_DEPARTMENT = CallbackAction("md")
+ADD_DEPARTMENT = CallbackAction("ad")
+EDIT_DEPARTMENT = CallbackAction("ed", dept_id=INT)
+RENAME_DEPARTMENT = CallbackAction("rd", dept_id=INT)
+DELETE_DEPARTMENT = CallbackAction("xd", dept_id=INT)
+ADD_EMPLOYEE = CallbackAction("ae")
+ADD_EMPLOYEE_TO = CallbackAction("aa", dept_id=INT)
+EMPLOYEE = CallbackAction("ev", emp_id=INT)
+EDIT_EMPLOYEE = CallbackAction("ee", emp_id=INT)
+EDIT_EMPLOYEE_NAME = CallbackAction("en", emp_id=INT)
+EDIT_EMPLOYEE_BIRTH = CallbackAction("eb", emp_id=INT)
+DELETE_EMPLOYEE = CallbackAction("xe", emp_id=INT)
+UPCOMING_BIRTHDAYS = CallbackAction("ub", dept_id=INT)
+
+
+# ---------- маршрутизация ----------
+
+class CallbackRouter(BaseHandler[Update, Any]):
+    """Обработчик нажатий с таблицей {действие: функция}.
+
+    Функция вызывается как callback(update, context, **аргументы_действия).
+    Одно действие -- одна функция, поэтому порядок регистрации не влияет
+    на выбор обработчика.
+    """
+    __slots__ = ('routes',)
+
+    def __init__(self, routes: dict[CallbackAction, Callable], block: bool = True):
+        super().__init__(self._dispatch, block=block)
+        self.routes = {action.code: callback for action, callback in routes.items()}
+
+    def check_update(self, update: object):
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        decoded = decode(update.callback_query.data)
+        if decoded is None:
+            return None
+        action, args = decoded
+        callback = self.routes.get(action.code)
+        if callback is None:
+            return None
+        return callback, args
+
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        return await self.callback(update, context, *check_result)
+
+    @staticmethod
+    async def _dispatch(update, context, callback, args):
+        return await callback(update, context, **args)
+
+
+class StaleCallbackHandler(BaseHandler[Update, Any]):
+    """Нажатия на кнопки, callback_data которых не разбирается (старые сообщения)"""
+    __slots__ = ()
+
+    def check_update(self, update: object):
+        return (
+            isinstance(update, Update) and update.callback_query is not None
+            and update.callback_query.data is not None and decode(update.callback_query.data) is None
+        )
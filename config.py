@@ -1,8 +1,63 @@
 # Файл конфигурации бота
-ADMIN_IDS = []  # ID администраторов
+ADMIN_IDS = []  # ID администраторов (остальных назначают командой /grant_admin)
 TOKEN = "ENTER_TOKEN_HERE"  # Токен бота
 DATABASE_URL = "sqlite:///employees.db"  # Путь к БД
 # DATABASE_URL = "sqlite:///:memory:"  # Для тестов в памяти
 PAGE_SIZE = 5  # Элементов на странице
 LOG_LEVEL = "INFO"  # Уровень логирования
 CONFIRM_CODE_LENGTH = 4  # Длина кода подтверждения для удаления
+TIMEZONE = "Europe/Moscow"  # Часовой пояс для рассылки поздравлений
+BIRTHDAY_CHECK_TIME = "09:00"  # Время ежедневной рассылки поздравлений (ЧЧ:ММ)
+UPCOMING_DAYS = 30  # На сколько дней вперёд показывать ближайшие дни рождения
+DIGEST_WEEKDAY = 0  # День недели еженедельной сводки для начальников отделов (0 -- понедельник)
+DIGEST_TIME = "09:00"  # Время еженедельной сводки (ЧЧ:ММ)
+DIGEST_DAYS = 7  # Период, который охватывает еженедельная сводка, дней
+DB_POOL_SIZE = 4  # Количество потоков для запросов к БД
+DB_CALL_TIMEOUT = 10  # Таймаут одного обращения к БД, секунд
+DB_PROFILE = "auto"  # Профиль движка БД: "auto" (по DATABASE_URL), "sqlite" или "server"
+SQLITE_SYNCHRONOUS = "NORMAL"  # Режим synchronous для SQLite в режиме WAL: "NORMAL" или "FULL"
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Размер отображения файла БД в память, байт (0 -- отключить)
+SQLITE_CACHE_SIZE_KB = 64 * 1024  # Размер кэша страниц SQLite на соединение, КБ
+SQLITE_BUSY_TIMEOUT_MS = 5000  # Ожидание освобождения блокировки записи, мс
+DB_CONNECTION_POOL_SIZE = 8  # Постоянных соединений с сервером БД
+DB_MAX_OVERFLOW = 8  # Дополнительных соединений сверх пула при пиковой нагрузке
+DB_POOL_TIMEOUT = 10  # Ожидание свободного соединения из пула, секунд
+DB_POOL_RECYCLE = 1800  # Пересоздавать соединения старше указанного возраста, секунд
+CACHE_MAX_SIZE = 10000  # Максимальное количество записей в кэше
+CACHE_TTL = 300  # Время жизни записи кэша, секунд
+SEARCH_RESULTS_LIMIT = 10  # Максимальное количество результатов поиска сотрудников
+INLINE_CACHE_TIME = 30  # Время кэширования результатов инлайн-поиска на стороне Telegram, секунд
+RENDER_CACHE_SIZE = 2000  # Максимальное количество готовых экранов (текст + клавиатура) в кэше
+IMPORT_BATCH_SIZE = 1000  # Размер пакета при массовом импорте сотрудников
+IMPORT_TIMEOUT = 600  # Таймаут импорта одного файла, секунд
+DISPATCH_RATE = 25  # Сообщений в секунду при массовой рассылке (лимит Telegram ~30)
+DISPATCH_BURST = 25  # Допустимый всплеск сообщений
+DISPATCH_CONCURRENCY = 8  # Одновременных запросов к Bot API
+DISPATCH_CHAT_INTERVAL = 1.0  # Минимальный интервал между сообщениями в один чат, секунд
+DISPATCH_MAX_RETRIES = 5  # Повторов отправки при сетевых ошибках
+OUTBOX_BATCH_SIZE = 200  # Сообщений, забираемых из очереди рассылки за раз
+OUTBOX_LEASE_SECONDS = 300  # Время аренды забранных сообщений, секунд
+OUTBOX_POLL_INTERVAL = 30  # Период проверки очереди рассылки, секунд
+OUTBOX_RETRY_SECONDS = 60  # Задержка перед повторной отправкой, секунд
+OUTBOX_MAX_ATTEMPTS = 5  # Попыток отправки, после которых сообщение считается ошибочным
+OUTBOX_RETENTION_DAYS = 30  # Срок хранения отправленных сообщений, дней
+LEADER_LEASE_TTL = 15  # Срок аренды ведущей реплики, секунд (за это время другая реплика подхватит работу)
+LEADER_HEARTBEAT_INTERVAL = 5  # Период продления аренды ведущей реплики, секунд
+METRICS_HOST = "127.0.0.1"  # Адрес HTTP-сервера метрик Prometheus
+METRICS_PORT = 9464  # Порт HTTP-сервера метрик (0 -- не запускать)
+SLOW_QUERY_SECONDS = 0.2  # SQL-запросы дольше указанного времени записываются в журнал, секунд
+ORM_AUDIT_SAMPLE_RATE = 0.0  # Доля обновлений, проверяемых на ленивые загрузки и N+1 (0 -- отключено, 1 -- все)
+ORM_AUDIT_N1_THRESHOLD = 5  # Сколько одинаковых запросов за обновление считается N+1
+BOT_API_BASE_URL = "https://api.telegram.org/bot"  # Адрес Bot API (для нагрузочных тестов -- "http://127.0.0.1:8081/bot")
+ACCESS_RELOAD_INTERVAL = 300  # Период полной перезагрузки прав доступа из БД, секунд
+UPDATE_MODE = "polling"  # Способ получения обновлений: "polling" или "webhook"
+WEBHOOK_URL = ""  # Публичный HTTPS-адрес вебхука, например "https://bot.example.com/telegram"
+WEBHOOK_LISTEN = "0.0.0.0"  # Адрес, на котором слушает встроенный веб-сервер
+WEBHOOK_PORT = 8443  # Порт встроенного веб-сервера
+WEBHOOK_PATH = "telegram"  # Путь вебхука на встроенном веб-сервере
+WEBHOOK_SECRET = ""  # Секретный токен для проверки запросов Telegram (1-256 символов A-Z, a-z, 0-9, _, -)
+CONCURRENT_UPDATES = 64  # Одновременно обрабатываемых обновлений (1 -- последовательно)
+PERSISTENCE_TTL = 7 * 24 * 3600  # Через сколько секунд бездействия диалог считается заброшенным
+PERSISTENCE_MEMORY_IDLE = 3600  # Через сколько секунд бездействия данные пользователя выгружаются из памяти
+PERSISTENCE_UPDATE_INTERVAL = 10  # Период сохранения состояния диалогов, секунд
+PERSISTENCE_FLUSH_DELAY = 1.0  # Задержка для объединения изменений в одну запись, секунд
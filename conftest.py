@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import database
+from database import Base
+from db_engine import configure_engine
+from migrations import migrate
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_engine(tmp_path_factory):
+    """Тесты, работающие через database.Session, используют временную БД, а не рабочую"""
+    engine = database.init_engine(f"sqlite:///{tmp_path_factory.mktemp('db') / 'session.db'}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session():
+    """Сессия к отдельной БД в памяти"""
+    engine = create_engine("sqlite://")
+    configure_engine(engine)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Временная БД для кода, работающего через async_db.run_db"""
+    import async_db
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    configure_engine(engine)
+    migrate(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(async_db, "Session", factory)
+    yield factory
+    engine.dispose()
@@ -1,22 +1,192 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Date, ForeignKey, func
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from config import DATABASE_URL
-from typing import Optional
+from sqlalchemy import (
+    create_engine, Column, Integer, BigInteger, String, Boolean, Date, DateTime, Text, LargeBinary, ForeignKey,
+    Index, UniqueConstraint,
+    func, select, insert, update, delete, tuple_, or_, and_, case, text
+)
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, validates, joinedload, aliased
+from config import DATABASE_URL, DB_PROFILE
+from db_engine import engine_options, configure_engine
+from datetime import date, datetime, timedelta, timezone
+from calendar import isleap
+from typing import Optional, NamedTuple
+import re
+import uuid
 # Базовый класс для моделей
 Base = declarative_base()
 
+
+class Page(NamedTuple):
+    """Страница результатов keyset-пагинации"""
+    items: list
+    has_prev: bool
+    has_next: bool
+
+
+class SearchHit(NamedTuple):
+    """Найденный сотрудник"""
+    id: int
+    full_name: str
+    department_id: int
+    department_name: str
+
+
+class UpcomingBirthday(NamedTuple):
+    """Ближайший день рождения сотрудника"""
+    employee_id: int
+    full_name: str
+    department_id: int
+    department_name: str
+    birth_date: date
+    celebration_date: date
+
+
+class DigestRow(NamedTuple):
+    """Строка еженедельной сводки: получатель (начальник отдела) и именинник"""
+    head_id: int
+    head_chat_id: int
+    birthday: UpcomingBirthday
+
+
+class EmployeeListing(NamedTuple):
+    """Данные экрана списка сотрудников отдела"""
+    department: "Department"
+    page: Page
+    total: int
+    head_name: str | None
+
+
+def keyset_page(query, sort_column, id_column, cursor: tuple[str, int] | None, per_page: int) -> Page:
+    """Страница по ключу (sort_column, id_column) без OFFSET.
+
+    cursor -- None для первой страницы, ('n', id) для строк после строки id,
+    ('p', id) для строк перед ней. Значение sort_column граничной строки
+    берётся подзапросом, поэтому в курсоре достаточно хранить только id.
+    """
+    if cursor is None:
+        rows = query.order_by(sort_column, id_column).limit(per_page + 1).all()
+        return Page(rows[:per_page], False, len(rows) > per_page)
+
+    direction, cursor_id = cursor
+    cursor_value = select(sort_column).where(id_column == cursor_id).correlate(None).scalar_subquery()
+    key = tuple_(sort_column, id_column)
+    if direction == 'p':
+        rows = (
+            query.filter(key < tuple_(cursor_value, cursor_id))
+            .order_by(sort_column.desc(), id_column.desc())
+            .limit(per_page + 1)
+            .all()
+        )
+        page = Page(rows[:per_page][::-1], len(rows) > per_page, True)
+    else:
+        rows = (
+            query.filter(key > tuple_(cursor_value, cursor_id))
+            .order_by(sort_column, id_column)
+            .limit(per_page + 1)
+            .all()
+        )
+        page = Page(rows[:per_page], True, len(rows) > per_page)
+
+    # Граничная строка удалена или страница опустела -- возвращаемся в начало
+    if not page.items:
+        return keyset_page(query, sort_column, id_column, None, per_page)
+    return page
+
+
+def search_terms(query: str) -> list[str]:
+    """Слова поискового запроса в нижнем регистре"""
+    return re.findall(r"\w+", query.lower())
+
+
+def _sort_upcoming(birthdays) -> list[UpcomingBirthday]:
+    return sorted(birthdays, key=lambda item: (item.celebration_date, item.full_name))
+
+
+def utcnow() -> datetime:
+    """Текущее время UTC без часового пояса (так оно хранится в БД)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def dialect_insert(session, table):
+    """INSERT с поддержкой ON CONFLICT для текущей СУБД.
+
+    Другие СУБД отклоняются при создании движка (db_engine.SUPPORTED_BACKENDS).
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect != 'sqlite':
+        # Сюда попадает только движок, созданный в обход init_engine/configure_engine
+        raise ValueError(f"СУБД '{dialect}' не поддерживается, см. db_engine.SUPPORTED_BACKENDS")
+    return sqlite.insert(table)
+
+
+def birthday_key(birth_date: date) -> int:
+    """Ключ дня рождения в формате MMDD (например, 0229 -> 229)"""
+    return birth_date.month * 100 + birth_date.day
+
+
+def celebration_date(birth_date: date, year: int) -> date:
+    """День, в который празднуется день рождения в указанном году"""
+    if birth_date.month == 2 and birth_date.day == 29 and not isleap(year):
+        return date(year, 2, 28)
+    return birth_date.replace(year=year)
+
+
+def next_celebration(birth_date: date, start: date) -> date:
+    """Ближайший день празднования, начиная с start включительно"""
+    day = celebration_date(birth_date, start.year)
+    return day if day >= start else celebration_date(birth_date, start.year + 1)
+
+
+def birthday_key_ranges(start: date, days: int) -> list[tuple[int, int]]:
+    """Диапазоны ключей birth_key для дней [start, start + days).
+
+    Ключ MMDD монотонен внутри года, поэтому период -- один диапазон или два,
+    если он переходит через Новый год. 29 февраля добавляется отдельно, если
+    в невисокосный год в период попадает 28 февраля.
+    """
+    if days >= 366:
+        return [(101, 1231)]
+    end = start + timedelta(days=days - 1)
+    if end.year == start.year:
+        ranges = [(birthday_key(start), birthday_key(end))]
+    else:
+        ranges = [(birthday_key(start), 1231), (101, birthday_key(end))]
+    for year in {start.year, end.year}:
+        feb28 = date(year, 2, 28)
+        if not isleap(year) and start <= feb28 <= end:
+            ranges.append((229, 229))
+    return ranges
+
+
 class Employee(Base):
     """Модель сотрудника предприятия"""
     __tablename__ = 'employees'
+    __table_args__ = (
+        # Сортировка списка отдела (id входит в индекс SQLite неявно как rowid)
+        Index('ix_employees_department_full_name', 'department_id', 'full_name'),
+        Index('ix_employees_department_head', 'department_id', 'is_head'),
+    )
 
     id = Column(Integer, primary_key=True)
     full_name = Column(String(150), nullable=False)
     birth_date = Column(Date, nullable=False)
     telegram_id = Column(Integer, unique=True)
     is_head = Column(Boolean, default=False)
-    department_id = Column(Integer, ForeignKey('departments.id'), nullable=False)
+    department_id = Column(Integer, ForeignKey('departments.id', ondelete='CASCADE'), nullable=False)
+    birth_key = Column(Integer, index=True)  # MMDD, поддерживается автоматически
+    external_id = Column(String(64), unique=True, index=True)  # Табельный номер в кадровой системе
+    content_hash = Column(String(64))  # Хэш данных сотрудника из последней выгрузки
+    timezone = Column(String(64))  # Часовой пояс IANA; если не задан -- пояс отдела
     department = relationship("Department", back_populates="employees")
 
+    @validates('birth_date')
+    def _sync_birth_key(self, key, value):
+        """Обновляет ключ дня рождения при изменении даты"""
+        self.birth_key = birthday_key(value) if value else None
+        return value
+
     @classmethod
     def get_by_department(cls, session, department_id: int, page: int = 1, per_page: int = 5):
         """Получить сотрудников отдела с пагинацией"""
@@ -30,6 +200,12 @@ class Employee(Base):
             .all()
         )
 
+    @classmethod
+    def get_page_by_department(cls, session, department_id: int, cursor=None, per_page: int = 5) -> Page:
+        """Страница сотрудников отдела по ключу (full_name, id)"""
+        query = session.query(cls).filter_by(department_id=department_id)
+        return keyset_page(query, cls.full_name, cls.id, cursor, per_page)
+
     @classmethod
     def get_count_by_department(cls, session, department_id: int) -> int:
         """Количество сотрудников в отделе"""
@@ -40,13 +216,175 @@ class Employee(Base):
         """Найти сотрудника по Telegram ID"""
         return session.query(cls).filter_by(telegram_id=tg_id).first()
 
+    @classmethod
+    def search(cls, session, query: str, limit: int = 10) -> list[SearchHit]:
+        """Поиск по началу слов ФИО и названия отдела.
+
+        В SQLite -- один запрос к индексу FTS5 employee_search (см. миграцию 8)
+        с ранжированием bm25, совпадения в ФИО важнее совпадений в отделе.
+        Каждое слово запроса должно совпасть с началом какого-либо слова.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        if session.get_bind().dialect.name == 'sqlite':
+            match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+            rows = session.execute(text(
+                "SELECT e.id, e.full_name, d.id, d.name FROM employee_search s "
+                "JOIN employees e ON e.id = s.rowid JOIN departments d ON d.id = e.department_id "
+                "WHERE employee_search MATCH :match "
+                "ORDER BY bm25(employee_search, 10.0, 1.0), e.full_name LIMIT :limit"
+            ), {'match': match, 'limit': limit})
+        else:
+            conditions = [
+                or_(*(
+                    condition
+                    for column in (cls.full_name, Department.name)
+                    for condition in (column.istartswith(term, autoescape=True),
+                                      column.icontains(f" {term}", autoescape=True))
+                ))
+                for term in terms
+            ]
+            rows = session.execute(
+                select(cls.id, cls.full_name, Department.id, Department.name)
+                .join(Department, Department.id == cls.department_id)
+                .where(and_(*conditions))
+                .order_by(cls.full_name)
+                .limit(limit)
+            )
+        return [SearchHit(*row) for row in rows]
+
+    @classmethod
+    def get_with_department(cls, session, emp_id: int) -> Optional["Employee"]:
+        """Получить сотрудника вместе с его отделом"""
+        return session.get(cls, emp_id, options=[joinedload(cls.department)])
+
+    @classmethod
+    def create(cls, session, **fields) -> "Employee":
+        """Создать сотрудника"""
+        employee = cls(**fields)
+        session.add(employee)
+        session.commit()
+        return employee
+
+    @classmethod
+    def update_fields(cls, session, emp_id: int, **fields) -> Optional["Employee"]:
+        """Обновить поля сотрудника"""
+        employee = session.get(cls, emp_id)
+        if employee is None:
+            return None
+        for name, value in fields.items():
+            setattr(employee, name, value)
+        session.commit()
+        return employee
+
+    @classmethod
+    def delete_by_id(cls, session, emp_id: int) -> int | None:
+        """Удалить сотрудника, вернуть ID его отдела"""
+        employee = session.get(cls, emp_id)
+        if employee is None:
+            return None
+        department_id = employee.department_id
+        session.delete(employee)
+        session.commit()
+        return department_id
+
+    @classmethod
+    def get_schedule_rows(cls, session, employee_ids=None, start: date | None = None,
+                          days: int | None = None) -> list[tuple[int, date, str | None]]:
+        """(id, дата рождения, часовой пояс сотрудника или его отдела) для планировщика поздравлений.
+
+        start и days ограничивают выборку днями рождения в [start, start + days)
+        (поиск по индексу birth_key).
+        """
+        query = (
+            session.query(cls.id, cls.birth_date, func.coalesce(cls.timezone, Department.timezone))
+            .join(Department, Department.id == cls.department_id)
+        )
+        if employee_ids is not None:
+            query = query.filter(cls.id.in_(employee_ids))
+        if start is not None:
+            ranges = birthday_key_ranges(start, days)
+            query = query.filter(or_(*(cls.birth_key.between(low, high) for low, high in ranges)))
+        return [tuple(row) for row in query.all()]
+
+    @classmethod
+    def get_access_rows(cls, session, employee_ids=None) -> list[tuple[int, int, int]]:
+        """(id, Telegram ID, ID отдела) сотрудников с указанным Telegram ID для проверки доступа"""
+        query = session.query(cls.id, cls.telegram_id, cls.department_id).filter(cls.telegram_id.is_not(None))
+        if employee_ids is not None:
+            query = query.filter(cls.id.in_(employee_ids))
+        return [tuple(row) for row in query.all()]
+
+    @classmethod
+    def get_by_ids(cls, session, employee_ids) -> list["Employee"]:
+        """Сотрудники с отделами по списку ID"""
+        return (
+            session.query(cls)
+            .options(joinedload(cls.department))
+            .filter(cls.id.in_(employee_ids))
+            .order_by(cls.department_id, cls.full_name)
+            .all()
+        )
+
+    @classmethod
+    def get_upcoming_birthdays(cls, session, start: date, days: int,
+                               department_id: int | None = None) -> list[UpcomingBirthday]:
+        """Дни рождения в ближайшие days дней (по индексу birth_key), по дате празднования"""
+        query = (
+            session.query(cls.id, cls.full_name, cls.department_id, Department.name, cls.birth_date)
+            .join(Department, Department.id == cls.department_id)
+            .filter(or_(*(cls.birth_key.between(low, high) for low, high in birthday_key_ranges(start, days))))
+        )
+        if department_id is not None:
+            query = query.filter(cls.department_id == department_id)
+        return _sort_upcoming(
+            UpcomingBirthday(*row, next_celebration(row[4], start)) for row in query.all()
+        )
+
+    @classmethod
+    def get_birthday_digest(cls, session, start: date, days: int) -> list[DigestRow]:
+        """Именинники периода для всех отделов вместе с начальниками одним запросом.
+
+        Каждый именинник повторяется для каждого начальника своего отдела,
+        у которого указан Telegram ID.
+        """
+        head = aliased(cls)
+        rows = (
+            session.query(head.id, head.telegram_id, cls.id, cls.full_name, cls.department_id, Department.name,
+                          cls.birth_date)
+            .join(Department, Department.id == cls.department_id)
+            .join(head, and_(head.department_id == cls.department_id, head.is_head.is_(True),
+                             head.telegram_id.isnot(None)))
+            .filter(or_(*(cls.birth_key.between(low, high) for low, high in birthday_key_ranges(start, days))))
+            .all()
+        )
+        digest = [
+            DigestRow(head_id, chat_id, UpcomingBirthday(*birthday, next_celebration(birthday[-1], start)))
+            for head_id, chat_id, *birthday in rows
+        ]
+        digest.sort(key=lambda row: (row.head_id, row.birthday.celebration_date, row.birthday.full_name))
+        return digest
+
+    @classmethod
+    def get_notifiable_by_departments(cls, session, department_ids) -> list["Employee"]:
+        """Сотрудники указанных отделов, которым можно отправить сообщение"""
+        return (
+            session.query(cls)
+            .filter(cls.department_id.in_(department_ids), cls.telegram_id.isnot(None))
+            .all()
+        )
+
 class Department(Base):
     """Модель отдела предприятия"""
     __tablename__ = 'departments'
 
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False, unique=True)
-    employees = relationship("Employee", back_populates="department", cascade="all, delete-orphan")
+    timezone = Column(String(64))  # Часовой пояс IANA; если не задан -- TIMEZONE из config
+    # Сотрудники удаляются каскадом на стороне БД, без загрузки в сессию
+    employees = relationship("Employee", back_populates="department", cascade="all, delete-orphan",
+                             passive_deletes=True)
 
     @classmethod
     def get_all(cls, session, page: int = 1, per_page: int = 5):
@@ -54,6 +392,64 @@ class Department(Base):
         offset = (page - 1) * per_page
         return session.query(cls).order_by(cls.name).offset(offset).limit(per_page).all()
     @classmethod
+    def get_page(cls, session, cursor=None, per_page: int = 5) -> Page:
+        """Страница отделов по ключу (name, id)"""
+        return keyset_page(session.query(cls), cls.name, cls.id, cursor, per_page)
+
+    @classmethod
+    def get_page_with_total(cls, session, cursor=None, per_page: int = 5) -> tuple[Page, int]:
+        """Страница отделов и общее количество отделов одним запросом"""
+        total = select(func.count()).select_from(aliased(cls)).scalar_subquery()
+        page = keyset_page(session.query(cls, total), cls.name, cls.id, cursor, per_page)
+        count = page.items[0][1] if page.items else 0
+        return page._replace(items=[row[0] for row in page.items]), count
+
+    @classmethod
+    def get_employee_listing(cls, session, department_id: int, cursor=None,
+                             per_page: int = 5) -> EmployeeListing | None:
+        """Отдел, страница его сотрудников, их количество и начальник одним запросом"""
+        staff = aliased(Employee)
+        total = (
+            select(func.count(staff.id))
+            .where(staff.department_id == cls.id)
+            .correlate(cls)
+            .scalar_subquery()
+        )
+        head = aliased(Employee)
+        head_name = (
+            select(head.full_name)
+            .where(head.department_id == cls.id, head.is_head.is_(True))
+            .correlate(cls)
+            .limit(1)
+            .scalar_subquery()
+        )
+        query = (
+            session.query(cls, Employee, total, head_name)
+            .select_from(cls)
+            .outerjoin(Employee, Employee.department_id == cls.id)
+            .filter(cls.id == department_id)
+        )
+        page = keyset_page(query, Employee.full_name, Employee.id, cursor, per_page)
+        if not page.items:
+            return None
+        department, _, count, head = page.items[0]
+        employees = [row[1] for row in page.items if row[1] is not None]
+        return EmployeeListing(department, page._replace(items=employees), count, head)
+
+    @classmethod
+    def get_with_employee_count(cls, session, department_id: int) -> tuple["Department", int] | None:
+        """Отдел и количество его сотрудников одним запросом"""
+        staff = aliased(Employee)
+        count = (
+            select(func.count(staff.id))
+            .where(staff.department_id == cls.id)
+            .correlate(cls)
+            .scalar_subquery()
+        )
+        row = session.query(cls, count).filter(cls.id == department_id).first()
+        return tuple(row) if row else None
+
+    @classmethod
     def get_head(cls, session, department_id: int) -> Employee | None:
         """Получить начальника отдела"""
         return (
@@ -66,12 +462,425 @@ class Department(Base):
         """Общее количество отделов"""
         return session.query(func.count(cls.id)).scalar()
 
+    @classmethod
+    def get_by_id(cls, session, department_id: int) -> Optional["Department"]:
+        """Получить отдел по ID"""
+        return session.get(cls, department_id)
+
+    @classmethod
+    def create(cls, session, name: str) -> Optional["Department"]:
+        """Создать отдел. Возвращает None, если отдел с таким названием уже есть"""
+        if session.query(cls).filter_by(name=name).first():
+            return None
+        department = cls(name=name)
+        session.add(department)
+        session.commit()
+        return department
+
+    @classmethod
+    def rename(cls, session, department_id: int, name: str) -> Optional["Department"]:
+        """Переименовать отдел"""
+        department = session.get(cls, department_id)
+        if department is None:
+            return None
+        department.name = name
+        session.commit()
+        return department
+
+    @classmethod
+    def delete_by_id(cls, session, department_id: int) -> int | None:
+        """Удалить отдел вместе с сотрудниками двумя запросами DELETE.
+
+        Возвращает количество удалённых сотрудников или None, если отдела нет.
+        Связанные строки (очередь outbox) удаляются каскадом ON DELETE CASCADE.
+        """
+        removed = session.execute(
+            delete(Employee).where(Employee.department_id == department_id),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        deleted = session.execute(
+            delete(cls).where(cls.id == department_id),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if not deleted:
+            session.rollback()
+            return None
+        session.commit()
+        return removed
+
+
+
+
+class OutboxMessage(Base):
+    """Исходящее сообщение рассылки, сохранённое до отправки.
+
+    Строки ставятся в очередь идемпотентно по ключу
+    (employee_id, greet_date, channel): повторный запуск рассылки за тот же
+    день не создаёт дублей. Обработчик забирает строки пачками под аренду
+    (claim_token + lease_until); подтвердить или вернуть строку может только
+    владелец аренды. Если процесс упал, аренда истекает и строки забирает
+    следующий запуск.
+    """
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        UniqueConstraint('employee_id', 'greet_date', 'channel', name='uq_outbox_idempotency'),
+        Index('ix_outbox_status_lease', 'status', 'lease_until'),
+    )
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey('employees.id', ondelete='CASCADE'), nullable=False)  # Получатель
+    greet_date = Column(Date, nullable=False)
+    channel = Column(String(32), nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    priority = Column(Integer, nullable=False, default=1)
+    status = Column(String(16), nullable=False, default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    claim_token = Column(String(36))
+    lease_until = Column(DateTime)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    sent_at = Column(DateTime)
+
+    @classmethod
+    def enqueue(cls, session, messages: list[dict]) -> int:
+        """Поставить сообщения в очередь, пропуская уже существующие. Возвращает число новых"""
+        if not messages:
+            return 0
+        now = utcnow()
+        result = session.execute(
+            dialect_insert(session, cls.__table__).on_conflict_do_nothing(),
+            [{'status': cls.PENDING, 'attempts': 0, 'created_at': now, **message} for message in messages]
+        )
+        session.commit()
+        return max(result.rowcount, 0)
+
+    @classmethod
+    def claim(cls, session, limit: int, lease_seconds: int,
+              fence: tuple[str, int] | None = None) -> tuple[str, list["OutboxMessage"]]:
+        """Забрать до limit ожидающих сообщений под аренду. Возвращает (токен аренды, сообщения).
+
+        fence -- (имя, token) аренды ведущей реплики: если она уже перешла
+        к другой реплике, ничего не забирается.
+        """
+        token = str(uuid.uuid4())
+        now = utcnow()
+        available = (cls.status == cls.PENDING) & or_(cls.lease_until.is_(None), cls.lease_until < now)
+        if fence is not None:
+            available = available & Lease.fence_condition(*fence)
+        candidates = select(cls.id).where(available).order_by(cls.priority, cls.id).limit(limit)
+        session.execute(
+            update(cls)
+            .where(cls.id.in_(candidates.scalar_subquery()), available)
+            .values(claim_token=token, lease_until=now + timedelta(seconds=lease_seconds),
+                    attempts=cls.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        claimed = session.query(cls).filter_by(claim_token=token).order_by(cls.priority, cls.id).all()
+        return token, claimed
+
+    @classmethod
+    def ack(cls, session, token: str, ids: list[int]) -> int:
+        """Отметить сообщения отправленными (только владельцем аренды)"""
+        if not ids:
+            return 0
+        result = session.execute(
+            update(cls)
+            .where(cls.id.in_(ids), cls.claim_token == token)
+            .values(status=cls.SENT, sent_at=utcnow(), claim_token=None, lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount
+
+    @classmethod
+    def release(cls, session, token: str, ids: list[int], retry_seconds: int, max_attempts: int) -> int:
+        """Вернуть неотправленные сообщения в очередь с задержкой или пометить ошибочными"""
+        if not ids:
+            return 0
+        owned = cls.id.in_(ids) & (cls.claim_token == token)
+        session.execute(
+            update(cls)
+            .where(owned, cls.attempts >= max_attempts)
+            .values(status=cls.FAILED, claim_token=None, lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        result = session.execute(
+            update(cls)
+            .where(owned)
+            .values(claim_token=None, lease_until=utcnow() + timedelta(seconds=retry_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount
+
+    @classmethod
+    def purge(cls, session, older_than: timedelta) -> int:
+        """Удалить отправленные и ошибочные сообщения старше указанного срока"""
+        result = session.execute(
+            delete(cls).where(cls.status != cls.PENDING, cls.created_at < utcnow() - older_than)
+        )
+        session.commit()
+        return result.rowcount
+
+
+class Celebration(Base):
+    """Отметка, что поздравления сотрудника за местную дату поставлены в очередь.
+
+    Пишется в одной транзакции с сообщениями outbox. Расписание при
+    перезагрузке и правке сотрудника ставит сегодняшний день рождения на
+    «сейчас», если время поздравления прошло; по отметке повторное
+    срабатывание пропускает уже поздравленных (в том числе без Telegram ID),
+    и коллеги не получают второе уведомление.
+    """
+    __tablename__ = 'celebrations'
+
+    employee_id = Column(Integer, ForeignKey('employees.id', ondelete='CASCADE'), primary_key=True)
+    greet_date = Column(Date, primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+    @classmethod
+    def get_done(cls, session, due) -> set[tuple[int, date]]:
+        """Пары (ID сотрудника, местная дата) из due, по которым поздравления уже были"""
+        due = set(due)
+        rows = session.execute(
+            select(cls.employee_id, cls.greet_date)
+            .where(cls.employee_id.in_({employee_id for employee_id, _ in due}))
+        ).all()
+        return {tuple(row) for row in rows} & due
+
+    @classmethod
+    def record(cls, session, due, messages: list[dict]) -> int:
+        """Отметить поздравленных и поставить сообщения в очередь одной транзакцией.
+
+        Возвращает число новых сообщений.
+        """
+        if due:
+            now = utcnow()
+            session.execute(
+                dialect_insert(session, cls.__table__).on_conflict_do_nothing(),
+                [{'employee_id': employee_id, 'greet_date': day, 'created_at': now} for employee_id, day in due]
+            )
+        if not messages:
+            session.commit()
+            return 0
+        return OutboxMessage.enqueue(session, messages)
+
+    @classmethod
+    def purge(cls, session, older_than: timedelta) -> int:
+        """Удалить отметки старше указанного срока"""
+        result = session.execute(delete(cls).where(cls.created_at < utcnow() - older_than))
+        session.commit()
+        return result.rowcount
+
+
+class Lease(Base):
+    """Именованная аренда для выбора ведущей реплики бота.
+
+    Держатель продлевает аренду до истечения expires_at. Если аренда
+    истекла, её может забрать другая реплика; при каждой смене держателя
+    увеличивается token (fencing token). Записи, сделанные от имени
+    аренды, проверяют token, поэтому реплика, потерявшая аренду (например,
+    после долгой паузы), не может ничего изменить.
+    Часы реплик должны быть синхронизированы (NTP).
+    """
+    __tablename__ = 'leases'
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False, default='')
+    token = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime, nullable=False)
+    renewed_at = Column(DateTime)
+
+    @classmethod
+    def acquire(cls, session, name: str, holder: str, ttl_seconds: float) -> int | None:
+        """Получить или продлить аренду. Возвращает fencing token или None, если аренда занята"""
+        now = utcnow()
+        session.execute(
+            dialect_insert(session, cls.__table__).on_conflict_do_nothing(),
+            [{'name': name, 'holder': '', 'token': 0, 'expires_at': now - timedelta(seconds=1)}]
+        )
+        held = (cls.holder == holder) & (cls.expires_at >= now)
+        updated = session.execute(
+            update(cls)
+            .where(cls.name == name, or_(held, cls.expires_at < now))
+            .values(
+                token=case((held, cls.token), else_=cls.token + 1),
+                holder=holder,
+                expires_at=now + timedelta(seconds=ttl_seconds),
+                renewed_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        if not updated:
+            return None
+        return session.execute(select(cls.token).where(cls.name == name)).scalar()
+
+    @classmethod
+    def release(cls, session, name: str, holder: str, token: int) -> bool:
+        """Освободить аренду досрочно (при остановке), чтобы другая реплика забрала её сразу"""
+        released = session.execute(
+            update(cls)
+            .where(cls.name == name, cls.holder == holder, cls.token == token)
+            .values(expires_at=utcnow() - timedelta(seconds=1))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        return bool(released)
+
+    @classmethod
+    def fence_condition(cls, name: str, token: int):
+        """Условие для WHERE: аренда name всё ещё действует с этим token"""
+        return (
+            select(cls.name)
+            .where(cls.name == name, cls.token == token, cls.expires_at >= utcnow())
+            .exists()
+        )
+
+
+class UserRole(Base):
+    """Роль пользователя бота, назначенная через бота (администраторы из ADMIN_IDS сюда не записываются)"""
+    __tablename__ = 'user_roles'
+
+    ADMIN = 'admin'
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    role = Column(String(16), primary_key=True)
+    granted_at = Column(DateTime, nullable=False, default=utcnow)
+
+    @classmethod
+    def get_ids(cls, session, role: str = ADMIN) -> list[int]:
+        """Telegram ID пользователей с ролью"""
+        return session.scalars(select(cls.telegram_id).where(cls.role == role)).all()
+
+    @classmethod
+    def grant(cls, session, telegram_id: int, role: str = ADMIN) -> bool:
+        """Назначить роль. False, если она уже была назначена"""
+        added = session.execute(
+            dialect_insert(session, cls.__table__).on_conflict_do_nothing(),
+            {'telegram_id': telegram_id, 'role': role, 'granted_at': utcnow()}
+        ).rowcount
+        session.commit()
+        return bool(added)
+
+    @classmethod
+    def revoke(cls, session, telegram_id: int, role: str = ADMIN) -> bool:
+        """Снять роль. False, если её не было"""
+        removed = session.execute(delete(cls).where(cls.telegram_id == telegram_id, cls.role == role)).rowcount
+        session.commit()
+        return bool(removed)
+
+
+class UserDataRecord(Base):
+    """Сохранённые context.user_data пользователя бота"""
+    __tablename__ = 'bot_user_data'
+
+    user_id = Column(BigInteger, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    def load(cls, session, user_id: int, since: datetime) -> bytes | None:
+        """Данные пользователя, если они обновлялись не раньше since"""
+        return session.execute(
+            select(cls.data).where(cls.user_id == user_id, cls.updated_at >= since)
+        ).scalar()
+
+
+class ConversationRecord(Base):
+    """Сохранённое состояние ConversationHandler"""
+    __tablename__ = 'bot_conversations'
+
+    name = Column(String(64), primary_key=True)
+    key = Column(String(64), primary_key=True)  # JSON-список (chat_id, user_id)
+    state = Column(Text, nullable=False)  # JSON
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    def load_active(cls, session, name: str, since: datetime) -> list[tuple[str, str]]:
+        """(ключ, состояние) диалогов, обновлявшихся не раньше since"""
+        return session.execute(
+            select(cls.key, cls.state).where(cls.name == name, cls.updated_at >= since)
+        ).all()
+
+
+def save_persistence_batch(session, users: dict, conversations: dict) -> None:
+    """Запись накопленных изменений одной транзакцией.
+
+    users: user_id -> данные (None -- удалить),
+    conversations: (name, key) -> состояние (None -- удалить).
+    """
+    now = utcnow()
+    user_rows = [{'user_id': uid, 'data': data, 'updated_at': now} for uid, data in users.items() if data is not None]
+    if user_rows:
+        statement = dialect_insert(session, UserDataRecord.__table__)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'data': statement.excluded.data, 'updated_at': statement.excluded.updated_at}
+        ), user_rows)
+    dropped_users = [uid for uid, data in users.items() if data is None]
+    if dropped_users:
+        session.execute(delete(UserDataRecord).where(UserDataRecord.user_id.in_(dropped_users)))
+
+    conversation_rows = [
+        {'name': name, 'key': key, 'state': state, 'updated_at': now}
+        for (name, key), state in conversations.items() if state is not None
+    ]
+    if conversation_rows:
+        statement = dialect_insert(session, ConversationRecord.__table__)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['name', 'key'],
+            set_={'state': statement.excluded.state, 'updated_at': statement.excluded.updated_at}
+        ), conversation_rows)
+    dropped_conversations = [name_key for name_key, state in conversations.items() if state is None]
+    if dropped_conversations:
+        session.execute(delete(ConversationRecord).where(
+            tuple_(ConversationRecord.name, ConversationRecord.key).in_(dropped_conversations)
+        ))
+    session.commit()
+
+
+def purge_persistence(session, older_than: timedelta) -> int:
+    """Удаление заброшенных диалогов и данных пользователей"""
+    cutoff = utcnow() - older_than
+    removed = session.execute(delete(UserDataRecord).where(UserDataRecord.updated_at < cutoff)).rowcount
+    removed += session.execute(delete(ConversationRecord).where(ConversationRecord.updated_at < cutoff)).rowcount
+    session.commit()
+    return removed
+
+
+# Движок создаётся при первом обращении, а не при импорте модуля.
+# Схема БД создаётся и обновляется отдельно: python migrations.py
+_engine = None
+
+# Сессия для работы с БД. Объекты остаются доступными после commit,
+# т.к. результаты запросов передаются из пула потоков БД в обработчики.
+_session_factory = sessionmaker(expire_on_commit=False)
+
+
+def init_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE, **kwargs):
+    """Создать (или пересоздать) движок БД с настройками профиля (см. db_engine)"""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+    _engine = create_engine(url, **{**engine_options(url, profile), **kwargs})
+    configure_engine(_engine, profile)
+    _session_factory.configure(bind=_engine)
+    return _engine
 
 
+def get_engine():
+    """Движок БД, создаётся при первом вызове"""
+    return _engine if _engine is not None else init_engine()
 
-# Инициализация БД
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
 
-# Сессия для работы с БД
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+def Session(**kwargs):
+    """Новая сессия БД"""
+    if _engine is None:
+        init_engine()
+    return _session_factory(**kwargs)
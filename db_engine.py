@@ -0,0 +1,130 @@
+# db_engine.py
+"""Профили движка БД.
+
+sqlite -- файл SQLite в режиме WAL: читатели не блокируются записью,
+          synchronous=NORMAL, mmap, увеличенный кэш страниц и ожидание
+          блокировки вместо немедленной ошибки "database is locked";
+          включена проверка внешних ключей (ON DELETE CASCADE).
+server -- сервер БД (PostgreSQL и т.п.): явный размер пула соединений,
+          переполнение, таймаут ожидания, pre-ping и пересоздание старых
+          соединений.
+
+Поддерживаются SQLite и PostgreSQL: очередь outbox, роли и сохранение
+диалогов пишутся через INSERT ... ON CONFLICT (database.dialect_insert),
+поэтому другая СУБД отклоняется сразу при создании движка.
+
+Профиль выбирается по DB_PROFILE (по умолчанию -- по схеме DATABASE_URL).
+Настройки проверяются при создании движка, фактическое состояние
+соединения -- при запуске бота (validate_engine).
+"""
+import logging
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from config import (
+    DB_PROFILE, DB_POOL_SIZE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_MS,
+    DB_CONNECTION_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SQLITE = "sqlite"
+PROFILE_SERVER = "server"
+PROFILES = ("auto", PROFILE_SQLITE, PROFILE_SERVER)
+SQLITE_SYNCHRONOUS_MODES = ("NORMAL", "FULL")
+SUPPORTED_BACKENDS = ("sqlite", "postgresql")  # СУБД с INSERT ... ON CONFLICT
+
+
+def resolve_profile(url, profile: str = DB_PROFILE) -> str:
+    """Профиль для адреса БД с проверкой соответствия"""
+    if profile not in PROFILES:
+        raise ValueError(f"DB_PROFILE должен быть одним из {PROFILES}, а не '{profile}'")
+    backend = make_url(url).get_backend_name()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"СУБД '{backend}' не поддерживается, используйте одну из {SUPPORTED_BACKENDS}")
+    if profile == "auto":
+        return PROFILE_SQLITE if backend == "sqlite" else PROFILE_SERVER
+    if (profile == PROFILE_SQLITE) != (backend == "sqlite"):
+        raise ValueError(f"Профиль '{profile}' не подходит для БД '{backend}'")
+    return profile
+
+
+def _is_memory(url) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def sqlite_pragmas() -> dict:
+    """PRAGMA, выполняемые на каждом новом соединении SQLite"""
+    if SQLITE_SYNCHRONOUS not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"SQLITE_SYNCHRONOUS должен быть одним из {SQLITE_SYNCHRONOUS_MODES}")
+    for name, value in (("SQLITE_MMAP_SIZE", SQLITE_MMAP_SIZE), ("SQLITE_CACHE_SIZE_KB", SQLITE_CACHE_SIZE_KB),
+                        ("SQLITE_BUSY_TIMEOUT_MS", SQLITE_BUSY_TIMEOUT_MS)):
+        if value < 0:
+            raise ValueError(f"{name} не может быть отрицательным")
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': SQLITE_SYNCHRONOUS,
+        'mmap_size': SQLITE_MMAP_SIZE,
+        # Отрицательное значение -- размер в КБ, а не в страницах
+        'cache_size': -SQLITE_CACHE_SIZE_KB,
+        'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+        # SQLite по умолчанию не проверяет внешние ключи и не выполняет ON DELETE CASCADE
+        'foreign_keys': 'ON',
+    }
+
+
+def server_pool_options() -> dict:
+    """Параметры пула соединений с сервером БД"""
+    if DB_CONNECTION_POOL_SIZE < 1:
+        raise ValueError("DB_CONNECTION_POOL_SIZE должен быть не меньше 1")
+    if DB_MAX_OVERFLOW < 0 or DB_POOL_TIMEOUT <= 0:
+        raise ValueError("DB_MAX_OVERFLOW не может быть отрицательным, DB_POOL_TIMEOUT должен быть больше 0")
+    if DB_CONNECTION_POOL_SIZE + DB_MAX_OVERFLOW < DB_POOL_SIZE:
+        # Иначе потоки async_db будут ждать соединения из пула
+        raise ValueError("DB_CONNECTION_POOL_SIZE + DB_MAX_OVERFLOW должно быть не меньше DB_POOL_SIZE")
+    return {
+        'pool_size': DB_CONNECTION_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+
+def engine_options(url, profile: str = DB_PROFILE) -> dict:
+    """Аргументы create_engine для профиля"""
+    if resolve_profile(url, profile) == PROFILE_SERVER:
+        return server_pool_options()
+    sqlite_pragmas()  # Проверка настроек до создания движка
+    return {}
+
+
+def configure_engine(engine, profile: str = DB_PROFILE) -> None:
+    """Подключить к движку настройку новых соединений"""
+    if resolve_profile(engine.url, profile) != PROFILE_SQLITE:
+        return
+    pragmas = sqlite_pragmas()
+    if _is_memory(engine.url):
+        # БД в памяти не поддерживает WAL и mmap
+        pragmas = {name: value for name, value in pragmas.items() if name not in ('journal_mode', 'mmap_size')}
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def validate_engine(engine, profile: str = DB_PROFILE) -> None:
+    """Проверка при запуске: соединение открывается и профиль применён"""
+    resolved = resolve_profile(engine.url, profile)
+    with engine.connect() as conn:
+        if resolved == PROFILE_SERVER:
+            conn.execute(text("SELECT 1"))
+        elif not _is_memory(engine.url):
+            journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+            if journal_mode.lower() != "wal":
+                raise RuntimeError(f"SQLite не переключилась в режим WAL (journal_mode={journal_mode})")
+    logger.info(f"Движок БД: профиль {resolved}, {engine.url.get_backend_name()}")
@@ -0,0 +1,261 @@
+# dispatcher.py
+import asyncio
+import itertools
+import logging
+import time
+from telegram import Bot
+from telegram.error import RetryAfter, BadRequest, Forbidden, NetworkError, TelegramError
+from telegram.ext import Application
+from config import (
+    DISPATCH_RATE, DISPATCH_BURST, DISPATCH_CONCURRENCY, DISPATCH_CHAT_INTERVAL, DISPATCH_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты сообщений: меньше -- раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+MAX_MESSAGE_LENGTH = 4096  # Ограничение Telegram на длину сообщения
+DISPATCHER_KEY = "dispatcher"  # Ключ в application.bot_data
+MAX_TRACKED_CHATS = 10000  # После этого забываем время отправки в давние чаты
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов «корзина токенов»"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Дождаться свободного токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Остановить выдачу токенов (после RetryAfter от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class DispatchStats:
+    """Статистика рассылки"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Отправлено сообщений в секунду"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"поставлено {self.submitted}, отправлено {self.sent}, ошибок {self.failed}, "
+            f"повторов {self.retries}, объединено {self.coalesced}, "
+            f"{self.elapsed:.1f} с ({self.throughput:.1f} сообщ./с)"
+        )
+
+
+class _Item:
+    """Сообщение в очереди (возможно, объединённое из нескольких)"""
+    __slots__ = ('chat_id', 'priority', 'texts', 'waiters')
+
+    def __init__(self, chat_id: int, priority: int):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.texts = []
+        self.waiters = []  # (future, статистика рассылки)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.texts)
+
+
+class Dispatcher:
+    """Очередь исходящих сообщений для массовых рассылок.
+
+    Соблюдает общий лимит Bot API (корзина токенов) и интервал между
+    сообщениями в один чат, ограничивает число одновременных запросов,
+    повторяет отправку после RetryAfter и сетевых ошибок. Ещё не
+    отправленные сообщения в один чат объединяются в одно.
+    """
+
+    def __init__(self, bot: Bot, rate: float = DISPATCH_RATE, burst: float = DISPATCH_BURST,
+                 concurrency: int = DISPATCH_CONCURRENCY, chat_interval: float = DISPATCH_CHAT_INTERVAL,
+                 max_retries: int = DISPATCH_MAX_RETRIES, backoff: float = 1.0):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.totals = DispatchStats()
+        self._bucket = TokenBucket(rate, burst)
+        self._queue = asyncio.PriorityQueue()
+        self._pending = {}  # chat_id -> ещё не взятое в работу сообщение
+        self._last_sent = {}  # chat_id -> время последней отправки
+        self._seq = itertools.count()
+        self._workers = []
+
+    def start(self) -> None:
+        """Запуск обработчиков очереди"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Дождаться отправки очереди и остановить обработчики"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Рассылка остановлена, не отправлено сообщений: {self._queue.qsize()}")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL,
+               stats: DispatchStats | None = None) -> asyncio.Future:
+        """Поставить сообщение в очередь. Future завершится True/False (отправлено или нет)"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        run_stats = stats or DispatchStats()
+        run_stats.submitted += 1
+        self.totals.submitted += 1
+
+        item = self._pending.get(chat_id)
+        if (item is not None and item.priority <= priority
+                and len(item.text) + len(text) + 2 <= MAX_MESSAGE_LENGTH):
+            run_stats.coalesced += 1
+            self.totals.coalesced += 1
+        else:
+            item = _Item(chat_id, priority)
+            self._pending[chat_id] = item
+            self._queue.put_nowait((priority, next(self._seq), item))
+        item.texts.append(text)
+        item.waiters.append((future, run_stats))
+        return future
+
+    async def send_all(self, messages, priority: int = PRIORITY_NORMAL) -> DispatchStats:
+        """Отправить сообщения (пары chat_id, текст или chat_id, текст, приоритет) и вернуть статистику"""
+        stats = DispatchStats()
+        futures = []
+        for message in messages:
+            chat_id, text, *rest = message
+            futures.append(self.submit(chat_id, text, rest[0] if rest else priority, stats))
+        await asyncio.gather(*futures)
+        stats.finished = time.monotonic()
+        return stats
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, item = await self._queue.get()
+            if self._pending.get(item.chat_id) is item:
+                del self._pending[item.chat_id]
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                logger.error(f"Ошибка рассылки в чат {item.chat_id}: {str(e)}", exc_info=True)
+                self._finish(item, False)
+            finally:
+                self._queue.task_done()
+
+    async def _wait_chat_interval(self, chat_id: int) -> None:
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            delay = last + self.chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _deliver(self, item: _Item) -> None:
+        for attempt in range(self.max_retries + 1):
+            await self._wait_chat_interval(item.chat_id)
+            await self._bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=item.chat_id, text=item.text)
+                self._mark_sent(item.chat_id)
+                self._finish(item, True)
+                return
+            except RetryAfter as e:
+                retry_after = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+                logger.warning(f"Превышен лимит Telegram, пауза {retry_after} с")
+                self._bucket.pause(retry_after)
+            except (BadRequest, Forbidden) as e:
+                # Пользователь заблокировал бота, чат не найден и т.п. -- повтор бесполезен
+                logger.warning(f"Сообщение в чат {item.chat_id} не доставлено: {str(e)}")
+                break
+            except NetworkError as e:
+                logger.warning(f"Сетевая ошибка при отправке в чат {item.chat_id}: {str(e)}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(self.backoff * 2 ** attempt, 60))
+            except TelegramError as e:
+                logger.warning(f"Сообщение в чат {item.chat_id} не доставлено: {str(e)}")
+                break
+            if attempt < self.max_retries:
+                self._count_retry(item)
+        self._finish(item, False)
+
+    def _mark_sent(self, chat_id: int) -> None:
+        now = time.monotonic()
+        self._last_sent[chat_id] = now
+        if len(self._last_sent) > MAX_TRACKED_CHATS:
+            # Интервал важен только для недавних отправок
+            self._last_sent = {
+                chat: sent for chat, sent in self._last_sent.items() if now - sent < self.chat_interval
+            }
+
+    def _count_retry(self, item: _Item) -> None:
+        self.totals.retries += 1
+        for run in {id(stats): stats for _, stats in item.waiters}.values():
+            run.retries += 1
+
+    def _finish(self, item: _Item, sent: bool) -> None:
+        for future, stats in item.waiters:
+            if sent:
+                stats.sent += 1
+                self.totals.sent += 1
+            else:
+                stats.failed += 1
+                self.totals.failed += 1
+            if not future.done():
+                future.set_result(sent)
+        item.waiters = []
+
+
+def setup_dispatcher(application: Application) -> Dispatcher:
+    """Создание диспетчера рассылок для приложения"""
+    dispatcher = Dispatcher(application.bot)
+    application.bot_data[DISPATCHER_KEY] = dispatcher
+    return dispatcher
+
+
+def get_dispatcher(application: Application) -> Dispatcher:
+    """Диспетчер рассылок приложения"""
+    return application.bot_data[DISPATCHER_KEY]
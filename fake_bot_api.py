@@ -0,0 +1,268 @@
+# fake_bot_api.py
+"""Локальная замена Bot API для нагрузочного тестирования.
+
+Поддерживает методы, которые использует бот при работе в режиме polling:
+getMe, deleteWebhook, getUpdates, sendMessage, editMessageText,
+editMessageReplyMarkup, answerCallbackQuery, deleteMessage и
+answerInlineQuery. Сообщения бота хранятся в памяти, поэтому имитатор
+пользователей (см. loadtest.py) может нажимать кнопки последнего
+сообщения в чате, а правки без изменений отклоняются так же, как в
+Telegram ("message is not modified").
+
+Чтобы бот обращался к этому серверу, укажите в config.py
+BOT_API_BASE_URL = "http://127.0.0.1:8081/bot".
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, deque
+from typing import Callable, Optional
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': "Поздравлятор", 'username': "fake_congratulator_bot",
+            'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': True}
+SCREEN_METHODS = frozenset({'sendMessage', 'editMessageText', 'editMessageReplyMarkup'})
+
+
+class BotApiError(Exception):
+    """Ошибка, которую Bot API вернул бы боту"""
+
+    def __init__(self, description: str, code: int = 400):
+        super().__init__(description)
+        self.description = description
+        self.code = code
+
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f"Пользователь {user_id}"}
+
+
+def _chat(chat_id: int) -> dict:
+    return {'id': chat_id, 'type': 'private', 'first_name': f"Пользователь {chat_id}"}
+
+
+class FakeBotApi:
+    """Состояние сервера: очередь обновлений и сообщения бота по чатам.
+
+    on_reply(chat_id, method) вызывается при каждом ответе бота в чат --
+    по нему имитатор измеряет время обработки обновлений.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency  # Искусственная задержка ответа, секунд (время до серверов Telegram)
+        self.calls = Counter()  # метод -> количество вызовов
+        self.errors = Counter()  # описание ошибки -> количество
+        self.on_reply: Optional[Callable[[int, str], None]] = None
+        self.messages = {}  # (chat_id, message_id) -> сообщение бота
+        self.last_message = {}  # chat_id -> message_id последнего сообщения бота
+        self._updates = deque()
+        self._update_event = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._callback_chats = {}  # callback_query_id -> chat_id
+        self._server: Optional[HTTPServer] = None
+        self.port = None
+        self._methods = {
+            'getMe': self._get_me,
+            'deleteWebhook': self._ok,
+            'setMyCommands': self._ok,
+            'getUpdates': self._get_updates,
+            'sendMessage': self._send_message,
+            'editMessageText': self._edit_message_text,
+            'editMessageReplyMarkup': self._edit_message_reply_markup,
+            'answerCallbackQuery': self._answer_callback_query,
+            'answerInlineQuery': self._ok,
+            'deleteMessage': self._delete_message,
+        }
+
+    # ---------- обновления от пользователей ----------
+
+    def push_message(self, user_id: int, text: str) -> int:
+        """Пользователь отправил боту текст. Возвращает update_id"""
+        message_id = self._new_message_id()
+        return self._push({'message': {
+            'message_id': message_id, 'date': int(time.time()), 'chat': _chat(user_id), 'from': _user(user_id),
+            'text': text,
+            **({'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]}
+               if text.startswith('/') else {}),
+        }})
+
+    def push_callback(self, user_id: int, data: str, message_id: Optional[int] = None) -> int:
+        """Пользователь нажал кнопку в сообщении бота (по умолчанию -- в последнем)"""
+        message_id = message_id or self.last_message.get(user_id)
+        message = self.messages.get((user_id, message_id))
+        if message is None:
+            raise KeyError(f"В чате {user_id} нет сообщения бота {message_id}")
+        query_id = str(self._next_update_id)
+        self._callback_chats[query_id] = user_id
+        return self._push({'callback_query': {
+            'id': query_id, 'from': _user(user_id), 'chat_instance': str(user_id), 'data': data,
+            'message': dict(message),  # Сообщение в момент нажатия: бот может изменить его позже
+        }})
+
+    def buttons(self, chat_id: int) -> list[str]:
+        """callback_data кнопок последнего сообщения бота в чате"""
+        message = self.messages.get((chat_id, self.last_message.get(chat_id)))
+        if message is None or 'reply_markup' not in message:
+            return []
+        return [
+            button['callback_data']
+            for row in message['reply_markup'].get('inline_keyboard', ())
+            for button in row if 'callback_data' in button
+        ]
+
+    def _push(self, update: dict) -> int:
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append({'update_id': update_id, **update})
+        self._update_event.set()
+        return update_id
+
+    def _new_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    # ---------- методы Bot API ----------
+
+    async def call(self, method: str, params: dict):
+        """Выполнить метод. Возвращает result или выбрасывает BotApiError"""
+        self.calls[method] += 1
+        handler = self._methods.get(method)
+        if handler is None:
+            raise BotApiError("Not Found: method not found", 404)
+        if self.latency and method != 'getUpdates':
+            await asyncio.sleep(self.latency)
+        return await handler(params)
+
+    async def _ok(self, params: dict):
+        return True
+
+    async def _get_me(self, params: dict):
+        return BOT_USER
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._update_event.clear()
+            try:
+                await asyncio.wait_for(self._update_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [update for _, update in zip(range(limit), self._updates)]
+
+    def _reply(self, chat_id: int, method: str) -> None:
+        if self.on_reply is not None:
+            self.on_reply(chat_id, method)
+
+    async def _send_message(self, params: dict):
+        chat_id = int(params['chat_id'])
+        message = {
+            'message_id': self._new_message_id(), 'date': int(time.time()), 'chat': _chat(chat_id),
+            'from': BOT_USER, 'text': params['text'],
+        }
+        if params.get('reply_markup'):
+            markup = json.loads(params['reply_markup'])
+            if 'inline_keyboard' in markup:
+                message['reply_markup'] = markup
+        self.messages[(chat_id, message['message_id'])] = message
+        self.last_message[chat_id] = message['message_id']
+        self._reply(chat_id, 'sendMessage')
+        return message
+
+    def _find_message(self, params: dict) -> dict:
+        key = (int(params.get('chat_id') or 0), int(params.get('message_id') or 0))
+        message = self.messages.get(key)
+        if message is None:
+            raise BotApiError("Bad Request: message to edit not found")
+        return message
+
+    async def _edit_message_text(self, params: dict):
+        message = self._find_message(params)
+        markup = json.loads(params['reply_markup']) if params.get('reply_markup') else None
+        if message['text'] == params['text'] and message.get('reply_markup') == markup:
+            raise BotApiError(
+                "Bad Request: message is not modified: specified new message content and reply markup "
+                "are exactly the same as a current content and reply markup of the message"
+            )
+        message['text'] = params['text']
+        if markup is None:
+            message.pop('reply_markup', None)
+        else:
+            message['reply_markup'] = markup
+        self._reply(message['chat']['id'], 'editMessageText')
+        return message
+
+    async def _edit_message_reply_markup(self, params: dict):
+        message = self._find_message(params)
+        markup = json.loads(params['reply_markup']) if params.get('reply_markup') else None
+        if message.get('reply_markup') == markup:
+            raise BotApiError("Bad Request: message is not modified")
+        message['reply_markup'] = markup
+        self._reply(message['chat']['id'], 'editMessageReplyMarkup')
+        return message
+
+    async def _answer_callback_query(self, params: dict):
+        chat_id = self._callback_chats.pop(str(params['callback_query_id']), None)
+        if chat_id is None:
+            raise BotApiError("Bad Request: query is too old and response timeout expired or query ID is invalid")
+        self._reply(chat_id, 'answerCallbackQuery')
+        return True
+
+    async def _delete_message(self, params: dict):
+        key = (int(params['chat_id']), int(params['message_id']))
+        if self.messages.pop(key, None) is None:
+            raise BotApiError("Bad Request: message to delete not found")
+        return True
+
+    # ---------- HTTP ----------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        """Запустить сервер. Возвращает base_url для бота"""
+        sockets = bind_sockets(port, host)
+        self.port = sockets[0].getsockname()[1]
+        self._server = HTTPServer(Application([(r"/bot[^/]+/(\w+)", _ApiHandler, {'api': self})]))
+        self._server.add_sockets(sockets)
+        logger.info(f"Bot API для тестов: http://{host}:{self.port}/bot")
+        return f"http://{host}:{self.port}/bot"
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+
+
+class _ApiHandler(RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    def _params(self) -> dict:
+        if self.request.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(self.request.body or b"{}")
+        # PTB передаёт параметры формой: строки как есть, остальное -- в JSON
+        params = {key: values[-1].decode() for key, values in self.request.body_arguments.items()}
+        params.update({key: values[-1].decode() for key, values in self.request.query_arguments.items()})
+        return params
+
+    async def post(self, method: str):
+        try:
+            result = await self.api.call(method, self._params())
+        except BotApiError as e:
+            # Без подробностей после второго двоеточия: "Bad Request: message is not modified"
+            self.api.errors[': '.join(e.description.split(': ')[:2])] += 1
+            self.set_status(e.code)
+            self.finish({'ok': False, 'error_code': e.code, 'description': e.description})
+            return
+        self.finish({'ok': True, 'result': result})
+
+    get = post
@@ -1,21 +1,37 @@
 # handlers.py
+import asyncio
 import logging
+import os
+import tempfile
 from datetime import datetime
+from zoneinfo import ZoneInfo
 import random
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove, InlineQueryResultArticle,
+    InputTextMessageContent
+)
 from telegram.ext import (
     ContextTypes,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
     ConversationHandler
 )
-from database import Session, Department, Employee
+from database import Department, Employee, search_terms
+import callbacks
+from callbacks import CallbackRouter, StaleCallbackHandler
+from async_db import run_db
+from cache import cache, cached_run_db, department_tag, employee_tag, DEPARTMENTS_TAG, SEARCH_TAG, BIRTHDAYS_TAG
+from rendering import render_screen, show_screen, render_cache, render_stats
 from keyboards import *
 from utils import is_admin, generate_confirm_code, validate_date
+from access import access
 from states import *
-from config import PAGE_SIZE
+from config import PAGE_SIZE, IMPORT_TIMEOUT, SEARCH_RESULTS_LIMIT, INLINE_CACHE_TIME, UPCOMING_DAYS, TIMEZONE
+from importer import import_file, ImportFileError
+from scheduler import upcoming_text, get_birthday_scheduler
 
 # Настройка логирования
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -39,43 +55,41 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return MAIN_MENU
 
 
-async def view_departments(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def view_departments(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     """Показ списка отделов с пагинацией"""
-    query = update.callback_query
-    page = int(query.data.split('_')[-1])
-
-    with Session() as session:
-        departments = Department.get_all(session, page, PAGE_SIZE)
-        total = Department.get_count(session)
-
-    buttons = []
-    for dept in departments:
-        buttons.append([InlineKeyboardButton(
-            dept.name,
-            callback_data=f"dept_{dept.id}"
-        )])
 
-    # Добавляем пагинацию
-    buttons.append(department_pagination(page, total))
-    buttons.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-
-    await query.edit_message_text(
-        "📂 Список отделов:",
-        reply_markup=InlineKeyboardMarkup(buttons)
-    )
+    async def build():
+        page, total = await cached_run_db(
+            ('departments', cursor), (DEPARTMENTS_TAG,),
+            Department.get_page_with_total, cursor, PAGE_SIZE
+        )
+        buttons = []
+        for dept in page.items:
+            buttons.append([InlineKeyboardButton(
+                dept.name,
+                callback_data=callbacks.DEPARTMENT.encode(dept.id)
+            )])
+
+        # Добавляем пагинацию
+        buttons.append(department_pagination(page))
+        buttons.append([InlineKeyboardButton("🏠 Главное меню", callback_data=callbacks.MAIN_MENU.encode())])
+        return f"📂 Список отделов (всего: {total}):", InlineKeyboardMarkup(buttons)
+
+    screen = await render_screen(('departments', cursor), (DEPARTMENTS_TAG,), build)
+    await show_screen(update, context, screen)
     return VIEW_DEPARTMENTS
 
 
-async def edit_department_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def edit_department_start(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int = None):
     """Старт редактирования отдела"""
     query = update.callback_query
-    dept_id = int(query.data.split('_')[2])
+    dept_id = dept_id or context.user_data.get('edit_dept')
     context.user_data['edit_dept'] = dept_id
 
     buttons = [
-        [InlineKeyboardButton("✏️ Переименовать", callback_data=f"edit_dept_name_{dept_id}")],
-        [InlineKeyboardButton("❌ Удалить отдел", callback_data=f"delete_dept_{dept_id}")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=f"dept_{dept_id}")]
+        [InlineKeyboardButton("✏️ Переименовать", callback_data=callbacks.RENAME_DEPARTMENT.encode(dept_id))],
+        [InlineKeyboardButton("❌ Удалить отдел", callback_data=callbacks.DELETE_DEPARTMENT.encode(dept_id))],
+        [InlineKeyboardButton("🔙 Назад", callback_data=callbacks.DEPARTMENT.encode(dept_id))]
     ]
 
     await query.message.edit_text(
@@ -94,7 +108,7 @@ async def add_department_start(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.callback_query.message.edit_text(
         "📝 Введите название нового отдела:",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data="main_menu")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.MAIN_MENU.encode())]
         ])
     )
     return ADD_DEPARTMENT
@@ -109,14 +123,10 @@ async def add_department_finish(update: Update, context: ContextTypes.DEFAULT_TY
 
         dept_name = update.message.text.strip()
 
-        with Session() as session:
-            if session.query(Department).filter_by(name=dept_name).first():
-                await update.message.reply_text("❌ Отдел с таким названием уже существует!")
-                return ADD_DEPARTMENT  # Повторно запрашиваем название
-
-            new_dept = Department(name=dept_name)
-            session.add(new_dept)
-            session.commit()
+        if await run_db(Department.create, dept_name) is None:
+            await update.message.reply_text("❌ Отдел с таким названием уже существует!")
+            return ADD_DEPARTMENT  # Повторно запрашиваем название
+        cache.invalidate(DEPARTMENTS_TAG)
 
         await update.message.reply_text(f"✅ Отдел '{dept_name}' успешно создан!")
         return await show_main_menu(update, context)  # Возвращаемся в главное меню
@@ -148,24 +158,23 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return CONFIRM_DELETE
 
 
-async def confirm_delete_department(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def confirm_delete_department(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int):
     """Подтверждение удаления отдела"""
     query = update.callback_query
-    dept_id = int(query.data.split('_')[2])
     context.user_data['delete_target'] = {'type': 'department', 'id': dept_id}
 
     confirm_code = generate_confirm_code()
     context.user_data['confirm_code'] = confirm_code
 
-    with Session() as session:
-        dept = session.get(Department, dept_id)
-        emp_count = Employee.get_count_by_department(session, dept_id)
+    dept, emp_count = await run_db(Department.get_with_employee_count, dept_id)
 
     await query.message.edit_text(
         f"❌ Вы действительно хотите удалить отдел {dept.name}?\n"
         f"Это приведёт к удалению {emp_count} сотрудников!\n"
         f"Для подтверждения введите код: {confirm_code}",
-        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Отмена", callback_data=f"dept_{dept_id}")]])
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 Отмена", callback_data=callbacks.DEPARTMENT.encode(dept_id))]
+        ])
     )
     return CONFIRM_DELETE
 
@@ -180,26 +189,34 @@ async def execute_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Неверный код подтверждения!")
         return await show_main_menu(update, context)
 
-    with Session() as session:
-        if delete_target['type'] == "department":
-            department = session.get(Department, delete_target['id'])
-            session.delete(department)
-        session.commit()
+    removed = None
+    if delete_target['type'] == "department":
+        removed = await run_db(Department.delete_by_id, delete_target['id'])
+
+    if removed is None:
+        # Отдел уже удалён (повторная отправка кода или другой администратор)
+        await update.message.reply_text("❌ Отдел не найден.")
+        return await show_main_menu(update, context)
+
+    cache.invalidate(DEPARTMENTS_TAG, SEARCH_TAG, BIRTHDAYS_TAG, department_tag(delete_target['id']))
+    access.remove_department(delete_target['id'])
+    if removed:
+        # Удалённые каскадом сотрудники не должны остаться в расписании поздравлений
+        await get_birthday_scheduler(context.application).reload()
 
-    await update.message.reply_text("✅ Отдел успешно удалён!")
+    await update.message.reply_text(f"✅ Отдел успешно удалён! Удалено сотрудников: {removed}")
     return await show_main_menu(update, context)
 
-async def edit_department_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def edit_department_name(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int):
     """Редактирование названия отдела"""
     query = update.callback_query
     await query.answer()  # Добавить подтверждение нажатия
-    dept_id = int(query.data.split('_')[3])  # Индекс 3 для паттерна edit_dept_name_123
     context.user_data['edit_dept'] = dept_id
 
     await query.message.edit_text(
         "📝 Введите новое название отдела:",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data=f"edit_dept_{dept_id}")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.EDIT_DEPARTMENT.encode(dept_id))]
         ])
     )
     return EDIT_DEPARTMENT_NAME  # Использовать отдельное состояние для ввода названия
@@ -208,25 +225,22 @@ async def save_department_name(update: Update, context: ContextTypes.DEFAULT_TYP
     new_name = update.message.text.strip()
     dept_id = context.user_data.get('edit_dept')
 
-    with Session() as session:
-        department = session.get(Department, dept_id)
-        department.name = new_name
-        session.commit()
+    await run_db(Department.rename, dept_id, new_name)
+    cache.invalidate(DEPARTMENTS_TAG, SEARCH_TAG, BIRTHDAYS_TAG, department_tag(dept_id))
 
     await update.message.reply_text(f"✅ Отдел переименован в '{new_name}'!")
     return await view_employees(update, context, dept_id=dept_id)  # Вернуться к списку сотрудников
 
-async def edit_employee_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def edit_employee_start(update: Update, context: ContextTypes.DEFAULT_TYPE, emp_id: int):
     """Старт редактирования сотрудника"""
     query = update.callback_query
     await query.answer()  # Добавить подтверждение нажатия
-    emp_id = int(query.data.split('_')[2])
     context.user_data['edit_emp'] = emp_id
 
     buttons = [
-        [InlineKeyboardButton("✏️ ФИО", callback_data=f"edit_emp_name_{emp_id}")],
-        [InlineKeyboardButton("📅 Дата рождения", callback_data=f"edit_emp_birth_{emp_id}")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=f"emp_{emp_id}")]  # Исправлен паттерн
+        [InlineKeyboardButton("✏️ ФИО", callback_data=callbacks.EDIT_EMPLOYEE_NAME.encode(emp_id))],
+        [InlineKeyboardButton("📅 Дата рождения", callback_data=callbacks.EDIT_EMPLOYEE_BIRTH.encode(emp_id))],
+        [InlineKeyboardButton("🔙 Назад", callback_data=callbacks.EMPLOYEE.encode(emp_id))]
     ]
 
     await query.message.edit_text(
@@ -236,47 +250,44 @@ async def edit_employee_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     return EDIT_EMPLOYEE_FIELD
 
 
-async def delete_employee(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def delete_employee(update: Update, context: ContextTypes.DEFAULT_TYPE, emp_id: int):
     """Удаление сотрудника"""
     query = update.callback_query
-    emp_id = int(query.data.split('_')[2])
 
-    with Session() as session:
-        employee = session.get(Employee, emp_id)
-        session.delete(employee)
-        session.commit()
+    dept_id = await run_db(Employee.delete_by_id, emp_id)
+    await get_birthday_scheduler(context.application).refresh([emp_id])
+    access.set_employee(emp_id, None, None)
+    cache.invalidate(SEARCH_TAG, BIRTHDAYS_TAG, employee_tag(emp_id), department_tag(dept_id))
 
     await query.answer("✅ Сотрудник удалён!")
-    return await view_employees(update, context, dept_id=employee.department_id)
+    return await view_employees(update, context, dept_id=dept_id)
 
 
 # ================== ОБРАБОТЧИКИ РЕДАКТИРОВАНИЯ СОТРУДНИКА ==================
-async def edit_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def edit_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE, emp_id: int):
     """Редактирование ФИО сотрудника"""
     query = update.callback_query
     await query.answer()
-    emp_id = int(query.data.split('_')[3])
     context.user_data['edit_emp'] = emp_id
 
     await query.message.edit_text(
         "✏️ Введите новое ФИО сотрудника:",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data=f"emp_{emp_id}")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.EMPLOYEE.encode(emp_id))]
         ])
     )
     return EDIT_EMPLOYEE_NAME  # Добавьте это состояние в states.py
 
-async def edit_employee_birth(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def edit_employee_birth(update: Update, context: ContextTypes.DEFAULT_TYPE, emp_id: int):
     """Редактирование даты рождения сотрудника"""
     query = update.callback_query
     await query.answer()
-    emp_id = int(query.data.split('_')[3])
     context.user_data['edit_emp'] = emp_id
 
     await query.message.edit_text(
         "📅 Введите новую дату рождения (ДД.ММ.ГГГГ):",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data=f"emp_{emp_id}")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.EMPLOYEE.encode(emp_id))]
         ])
     )
     return EDIT_EMPLOYEE_BIRTH  # Добавьте это состояние в states.py
@@ -286,10 +297,9 @@ async def save_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     new_name = update.message.text.strip()
     emp_id = context.user_data.get('edit_emp')
 
-    with Session() as session:
-        employee = session.get(Employee, emp_id)
-        employee.full_name = new_name
-        session.commit()
+    employee = await run_db(Employee.update_fields, emp_id, full_name=new_name)
+    if employee is not None:
+        cache.invalidate(SEARCH_TAG, BIRTHDAYS_TAG, employee_tag(emp_id), department_tag(employee.department_id))
 
     await update.message.reply_text("✅ ФИО обновлено!")
     return await view_employee_details(update, context)
@@ -302,10 +312,9 @@ async def save_employee_birth(update: Update, context: ContextTypes.DEFAULT_TYPE
         return EDIT_EMPLOYEE_BIRTH
 
     emp_id = context.user_data.get('edit_emp')
-    with Session() as session:
-        employee = session.get(Employee, emp_id)
-        employee.birth_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-        session.commit()
+    await run_db(Employee.update_fields, emp_id, birth_date=datetime.strptime(date_str, "%d.%m.%Y").date())
+    await get_birthday_scheduler(context.application).refresh([emp_id])
+    cache.invalidate(BIRTHDAYS_TAG, employee_tag(emp_id))
 
     await update.message.reply_text("✅ Дата рождения обновлена!")
     return await view_employee_details(update, context)
@@ -344,14 +353,13 @@ async def add_employee_general_start(update: Update, context: ContextTypes.DEFAU
         return ConversationHandler.END
 
     try:
-        with Session() as session:
-            departments = Department.get_all(session)
+        departments = await run_db(Department.get_all)
 
         buttons = [
-            [InlineKeyboardButton(dept.name, callback_data=f"add_emp_{dept.id}")]
+            [InlineKeyboardButton(dept.name, callback_data=callbacks.ADD_EMPLOYEE_TO.encode(dept.id))]
             for dept in departments
         ]
-        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="main_menu")])
+        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=callbacks.MAIN_MENU.encode())])
 
         # Используем answer_callback_query для подтверждения нажатия
         await update.callback_query.answer()
@@ -366,29 +374,29 @@ async def add_employee_general_start(update: Update, context: ContextTypes.DEFAU
         await update.callback_query.message.reply_text("⚠️ Ошибка при загрузке отделов.")
         return ConversationHandler.END
 
-async def add_employee_from_department(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def add_employee_from_department(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int):
     """Обработка кнопки 'Добавить сотрудника' внутри отдела"""
     query = update.callback_query
     await query.answer()
-    dept_id = int(query.data.split('_')[2])
     context.user_data['current_dept'] = dept_id
 
     await query.message.reply_text(
         "Введите ФИО сотрудника:",
-        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Отмена", callback_data=f"dept_{dept_id}")]])
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.DEPARTMENT.encode(dept_id))]
+        ])
     )
     return ADD_EMPLOYEE_NAME
 
-async def add_employee_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def add_employee_start(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int):
     """Начало ввода данных сотрудника"""
     query = update.callback_query
-    dept_id = int(query.data.split("_")[2])
     context.user_data["current_dept"] = dept_id
 
     await query.message.edit_text(
         "Введите ФИО сотрудника:",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data="main_menu")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.MAIN_MENU.encode())]
         ])
     )
     return ADD_EMPLOYEE_NAME
@@ -405,7 +413,7 @@ async def add_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "📅 Введите дату рождения сотрудника (ДД.ММ.ГГГГ):",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data="main_menu")]
+            [InlineKeyboardButton("❌ Отмена", callback_data=callbacks.MAIN_MENU.encode())]
         ])
     )
     return ADD_EMPLOYEE_BIRTH
@@ -441,15 +449,16 @@ async def add_employee_tg_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ADD_EMPLOYEE_TG_ID
 
     # Сохранение сотрудника
-    with Session() as session:
-        new_employee = Employee(
-            full_name=context_data['full_name'],
-            birth_date=context_data['birth_date'],
-            telegram_id=context_data.get('telegram_id'),
-            department_id=context.user_data['current_dept']
-        )
-        session.add(new_employee)
-        session.commit()
+    employee = await run_db(
+        Employee.create,
+        full_name=context_data['full_name'],
+        birth_date=context_data['birth_date'],
+        telegram_id=context_data.get('telegram_id'),
+        department_id=context.user_data['current_dept']
+    )
+    cache.invalidate(SEARCH_TAG, BIRTHDAYS_TAG, department_tag(context.user_data['current_dept']))
+    await get_birthday_scheduler(context.application).refresh([employee.id])
+    access.set_employee(employee.id, employee.telegram_id, employee.department_id)
 
     # Очищаем контекст
     context.user_data.clear()
@@ -462,164 +471,424 @@ async def add_employee_tg_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return await show_main_menu(update, context)
 
 
-async def view_employees(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int = None):
+async def view_employees(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int = None, cursor=None):
     query = update.callback_query
     if query:
         await query.answer()
-        dept_id = int(query.data.split('_')[1]) if not dept_id else dept_id
-    else:
+    if not dept_id:
         dept_id = context.user_data.get('current_dept')
+    admin = is_admin(update.effective_user.id)
 
-    with Session() as session:
-        department = session.get(Department, dept_id)
-        employees = Employee.get_by_department(session, dept_id, page=1)
-
-    buttons = []
-    for emp in employees:
-        prefix = "👑 " if emp.is_head else ""
-        buttons.append([InlineKeyboardButton(f"{prefix}{emp.full_name}", callback_data=f"emp_{emp.id}")])
-
-    if is_admin(update.effective_user.id):
-        buttons.append([
-            InlineKeyboardButton("✏️ Редактировать отдел", callback_data=f"edit_dept_{dept_id}"),
-            InlineKeyboardButton("➕ Добавить сотрудника", callback_data=f"add_emp_{dept_id}")
-        ])
+    async def build():
+        listing = await cached_run_db(
+            ('employees', dept_id, cursor), (department_tag(dept_id),),
+            Department.get_employee_listing, dept_id, cursor, PAGE_SIZE
+        )
+        if listing is None:
+            return None
+        department, page = listing.department, listing.page
+
+        buttons = []
+        for emp in page.items:
+            prefix = "👑 " if emp.is_head else ""
+            buttons.append([
+                InlineKeyboardButton(f"{prefix}{emp.full_name}", callback_data=callbacks.EMPLOYEE.encode(emp.id))
+            ])
+
+        pagination = employee_pagination(dept_id, page)
+        if pagination:
+            buttons.append(pagination)
+
+        if admin:
+            buttons.append([
+                InlineKeyboardButton("✏️ Редактировать отдел", callback_data=callbacks.EDIT_DEPARTMENT.encode(dept_id)),
+                InlineKeyboardButton("➕ Добавить сотрудника", callback_data=callbacks.ADD_EMPLOYEE_TO.encode(dept_id))
+            ])
 
-    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="view_departments_1")])
+        buttons.append([InlineKeyboardButton(
+            "🎂 Ближайшие дни рождения", callback_data=callbacks.UPCOMING_BIRTHDAYS.encode(dept_id)
+        )])
+        buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=callbacks.DEPARTMENTS.encode())])
 
-    if query:
-        await query.edit_message_text(
-            f"Отдел: {department.name}\nСотрудники:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=f"Отдел: {department.name}\nСотрудники:",
-            reply_markup=InlineKeyboardMarkup(buttons)
+        text = (
+            f"Отдел: {department.name}\n"
+            f"👑 Начальник: {listing.head_name or 'не назначен'}\n"
+            f"Сотрудники ({listing.total}):"
         )
+        return text, InlineKeyboardMarkup(buttons)
+
+    screen = await render_screen(('employees', dept_id, cursor, admin), (department_tag(dept_id),), build)
+    if screen is None:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="❌ Отдел не найден.")
+        return await show_main_menu(update, context)
+    await show_screen(update, context, screen)
     return VIEW_EMPLOYEES
 
 
-async def view_employee_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def load_employee_card(session, emp_id: int) -> tuple[str, int] | None:
+    """Текст карточки сотрудника и ID его отдела"""
+    employee = Employee.get_with_department(session, emp_id)
+    if employee is None:
+        return None
+    text = (
+        f"👤 {employee.full_name}\n"
+        f"🎂 Дата рождения: {employee.birth_date.strftime('%d.%m.%Y')}\n"
+        f"🏢 Отдел: {employee.department.name}\n"
+        f"🆔 Telegram ID: {employee.telegram_id or 'не указан'}"
+    )
+    return text, employee.department_id
+
+
+async def view_employee_details(update: Update, context: ContextTypes.DEFAULT_TYPE, emp_id: int = None):
     """Показ детальной информации о сотруднике"""
     query = update.callback_query
-    await query.answer()
-    emp_id = int(query.data.split('_')[1])
+    if query:
+        await query.answer()
+    if not emp_id:
+        # Возврат после редактирования сотрудника
+        emp_id = context.user_data.get('edit_emp')
 
     # Сохраняем ID сотрудника для возврата
     context.user_data['last_emp_id'] = emp_id  # Добавлено
 
-    with Session() as session:
-        employee = session.get(Employee, emp_id)
-        department = employee.department
+    card = await cached_run_db(
+        ('employee_card', emp_id),
+        lambda value: (employee_tag(emp_id), department_tag(value[1])),
+        load_employee_card, emp_id
+    )
+    if card is None:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="❌ Сотрудник не найден.")
+        return await show_main_menu(update, context)
+    text, dept_id = card
 
     # Сохраняем ID отдела для кнопки "Назад"
-    context.user_data['current_dept'] = department.id
+    context.user_data['current_dept'] = dept_id
 
-    text = (
-        f"👤 {employee.full_name}\n"
-        f"🎂 Дата рождения: {employee.birth_date.strftime('%d.%m.%Y')}\n"
-        f"🏢 Отдел: {department.name}\n"
-        f"🆔 Telegram ID: {employee.telegram_id or 'не указан'}"
-    )
+    admin = is_admin(update.effective_user.id)
 
-    keyboard = employee_details_keyboard(emp_id, is_admin(query.from_user.id))
-    await query.message.edit_text(text, reply_markup=keyboard)
+    async def build():
+        return text, employee_details_keyboard(emp_id, dept_id, admin)
+
+    screen = await render_screen(
+        ('employee_card', emp_id, admin), (employee_tag(emp_id), department_tag(dept_id)), build
+    )
+    await show_screen(update, context, screen)
     return VIEW_EMPLOYEE_DETAILS
 
+
+async def import_employees_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Массовый импорт сотрудников из присланного CSV/XLSX (только для администраторов).
+
+    Подпись «проверка» к файлу запускает пробный импорт без сохранения.
+    """
+    if not is_admin(update.effective_user.id):
+        return
+
+    document = update.message.document
+    extension = os.path.splitext(document.file_name or '')[1].lower()
+    if extension not in ('.csv', '.xlsx'):
+        await update.message.reply_text("❌ Поддерживаются только файлы .csv и .xlsx")
+        return
+    dry_run = (update.message.caption or '').strip().lower() in ('проверка', 'dry-run')
+
+    await update.message.reply_text("⏳ Обрабатываю файл...")
+    fd, path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+        report = await run_db(import_file, path, dry_run, timeout=IMPORT_TIMEOUT)
+    except ImportFileError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    except asyncio.TimeoutError:
+        # Пакеты, записанные до таймаута, остаются в БД
+        logger.warning(f"Импорт файла {document.file_name} прерван по таймауту {IMPORT_TIMEOUT} с")
+        report = None
+    finally:
+        os.remove(path)
+
+    if not dry_run:
+        cache.clear()
+        await get_birthday_scheduler(context.application).reload()
+        await access.reload()
+    if report is None:
+        await update.message.reply_text(
+            f"⚠️ Файл не обработан за {IMPORT_TIMEOUT} с, импорт прерван."
+            if dry_run else
+            f"⚠️ Импорт не завершился за {IMPORT_TIMEOUT} с и прерван, часть сотрудников уже сохранена. "
+            "Отправьте файл ещё раз: сохранённые сотрудники обновятся, а не продублируются."
+        )
+        return
+    await update.message.reply_text(report.summary())
+
+
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Статистика кэша (только для администраторов)"""
+    if not is_admin(update.effective_user.id):
+        return
+    stats = cache.stats()
+    await update.message.reply_text(
+        f"📊 Кэш: {stats['size']}/{stats['maxsize']} записей\n"
+        f"Попадания: {stats['hits']}, промахи: {stats['misses']} ({stats['hit_rate']:.1%})\n"
+        f"Вытеснено: {stats['evictions']}\n"
+        f"Экраны: {len(render_cache)} в кэше, {render_cache.stats()['hit_rate']:.1%} попаданий, "
+        f"правок отправлено: {render_stats.edits}, пропущено без изменений: {render_stats.skipped}"
+    )
+
+async def view_upcoming_birthdays(update: Update, context: ContextTypes.DEFAULT_TYPE, dept_id: int = None):
+    """Дни рождения в ближайшие UPCOMING_DAYS дней: по отделу или по всей компании"""
+    query = update.callback_query
+    await query.answer()
+    if dept_id is None and not is_admin(update.effective_user.id):
+        return
+    today = datetime.now(ZoneInfo(TIMEZONE)).date()
+
+    async def build():
+        birthdays = await cached_run_db(
+            ('upcoming', dept_id, today), (BIRTHDAYS_TAG,),
+            Employee.get_upcoming_birthdays, today, UPCOMING_DAYS, dept_id
+        )
+        title = f"🎂 Дни рождения в ближайшие {UPCOMING_DAYS} дней"
+        text = f"{title}:\n{upcoming_text(birthdays, dept_id is None)}" if birthdays else f"{title}: нет."
+        back = callbacks.MAIN_MENU.encode() if dept_id is None else callbacks.DEPARTMENT.encode(dept_id)
+        return text, InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data=back)]])
+
+    screen = await render_screen(('upcoming', dept_id, today), (BIRTHDAYS_TAG,), build)
+    await show_screen(update, context, screen)
+
+
+async def search_employees(query: str) -> list:
+    """Поиск сотрудников с кэшированием результатов"""
+    normalized = " ".join(search_terms(query))
+    if not normalized:
+        return []
+    return await cached_run_db(
+        ('search', normalized), (SEARCH_TAG,),
+        Employee.search, normalized, SEARCH_RESULTS_LIMIT
+    )
+
+
+async def find_employees(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск сотрудника по ФИО или отделу: /find <запрос> (только для администраторов)"""
+    if not is_admin(update.effective_user.id):
+        return
+    query = " ".join(context.args)
+    if not search_terms(query):
+        await update.message.reply_text("🔎 Использование: /find <ФИО или отдел>")
+        return
+
+    hits = await search_employees(query)
+    if not hits:
+        await update.message.reply_text("🔎 Никого не найдено.")
+        return
+    buttons = [
+        [InlineKeyboardButton(
+            f"{hit.full_name} — {hit.department_name}",
+            callback_data=callbacks.EMPLOYEE.encode(hit.id)
+        )]
+        for hit in hits
+    ]
+    await update.message.reply_text(f"🔎 Найдено: {len(hits)}", reply_markup=InlineKeyboardMarkup(buttons))
+
+
+async def inline_find_employees(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Инлайн-поиск сотрудников: @бот <запрос> (только для администраторов).
+
+    Инлайн-режим должен быть включён у бота через @BotFather (/setinline).
+    """
+    inline_query = update.inline_query
+    hits = await search_employees(inline_query.query) if is_admin(update.effective_user.id) else []
+    results = [
+        InlineQueryResultArticle(
+            id=str(hit.id),
+            title=hit.full_name,
+            description=hit.department_name,
+            input_message_content=InputTextMessageContent(f"👤 {hit.full_name}\n🏢 Отдел: {hit.department_name}")
+        )
+        for hit in hits
+    ]
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
+async def view_my_department(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сотрудники отдела пользователя (отдел берётся из снимка прав, без запроса к БД)"""
+    member = access.member(update.effective_user.id)
+    if member is None:
+        await update.callback_query.answer()
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="❌ Ваш Telegram ID не указан ни у одного сотрудника. Обратитесь к администратору."
+        )
+        return await show_main_menu(update, context)
+    context.user_data['current_dept'] = member.department_id
+    return await view_employees(update, context, dept_id=member.department_id)
+
+
+def _command_telegram_id(context: ContextTypes.DEFAULT_TYPE) -> int | None:
+    """Telegram ID из аргумента команды"""
+    if len(context.args) != 1:
+        return None
+    try:
+        return int(context.args[0])
+    except ValueError:
+        return None
+
+
+async def grant_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Назначить администратора: /grant_admin <Telegram ID> (только для администраторов)"""
+    if not is_admin(update.effective_user.id):
+        return
+    telegram_id = _command_telegram_id(context)
+    if telegram_id is None:
+        await update.message.reply_text("Использование: /grant_admin <Telegram ID>")
+        return
+    if await access.grant_admin(telegram_id):
+        await update.message.reply_text(f"✅ {telegram_id} назначен администратором")
+    else:
+        await update.message.reply_text(f"ℹ️ {telegram_id} уже администратор")
+
+
+async def revoke_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Снять администратора: /revoke_admin <Telegram ID> (только для администраторов)"""
+    if not is_admin(update.effective_user.id):
+        return
+    telegram_id = _command_telegram_id(context)
+    if telegram_id is None:
+        await update.message.reply_text("Использование: /revoke_admin <Telegram ID>")
+        return
+    if telegram_id in access.bootstrap_admins:
+        await update.message.reply_text("⚠️ Администраторы из ADMIN_IDS снимаются только в config.py")
+    elif await access.revoke_admin(telegram_id):
+        await update.message.reply_text(f"✅ {telegram_id} больше не администратор")
+    else:
+        await update.message.reply_text(f"ℹ️ {telegram_id} не был администратором")
+
+
+async def stale_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатие на кнопку из сообщения, отправленного до смены формата callback_data"""
+    await update.callback_query.answer("⌛ Меню устарело, откройте его заново: /start", show_alert=True)
+
 # ================== РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ ==================
 
 def get_handlers() -> list:
+    to_main_menu = {callbacks.MAIN_MENU: show_main_menu}
     return [
         ConversationHandler(
             entry_points=[
                 CommandHandler("start", start),
-                CallbackQueryHandler(add_employee_general_start, pattern=r"^add_employee$")
+                CallbackRouter({callbacks.ADD_EMPLOYEE: add_employee_general_start})
             ],
             states={
                 MAIN_MENU: [
-                    CallbackQueryHandler(view_departments, pattern=r"^view_departments_"),
-                    CallbackQueryHandler(add_department_start, pattern=r"^add_department$"),
-                    CallbackQueryHandler(add_employee_general_start, pattern=r"^add_employee$"),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter({
+                        callbacks.DEPARTMENTS: view_departments,
+                        callbacks.ADD_DEPARTMENT: add_department_start,
+                        callbacks.ADD_EMPLOYEE: add_employee_general_start,
+                        callbacks.UPCOMING_BIRTHDAYS: view_upcoming_birthdays,
+                        callbacks.MY_DEPARTMENT: view_my_department,
+                        **to_main_menu,
+                    })
                 ],
                 ADD_DEPARTMENT: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, add_department_finish),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter(to_main_menu)
                 ],
                 VIEW_DEPARTMENTS: [
-                    # Добавьте это:
-                    CallbackQueryHandler(view_employees, pattern=r"^dept_"),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter({
+                        callbacks.DEPARTMENT: view_employees,
+                        callbacks.DEPARTMENTS: view_departments,  # Пагинация отделов
+                        **to_main_menu,
+                    })
                 ],
                 EDIT_DEPARTMENT: [
-                    CallbackQueryHandler(edit_department_name, pattern=r"^edit_dept_name_"),
-                    CallbackQueryHandler(confirm_delete_department, pattern=r"^delete_dept_"),
-                    CallbackQueryHandler(view_employees, pattern=r"^dept_"),
+                    CallbackRouter({
+                        callbacks.RENAME_DEPARTMENT: edit_department_name,
+                        callbacks.DELETE_DEPARTMENT: confirm_delete_department,
+                        callbacks.DEPARTMENT: view_employees,
+                    })
                 ],
                 EDIT_DEPARTMENT_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, save_department_name),
-                    CallbackQueryHandler(lambda update, context: edit_department_start(update, context)),
+                    CallbackRouter({callbacks.EDIT_DEPARTMENT: edit_department_start}),
                 ],
                 VIEW_EMPLOYEES: [
-                    CallbackQueryHandler(view_employee_details, pattern=r"^emp_"),
-                    CallbackQueryHandler(add_employee_start, pattern=r"^add_emp_"),  # Обработка добавления сотрудника
-                    CallbackQueryHandler(edit_department_start, pattern=r"^edit_dept_"),  # Редактирование отдела
-                    CallbackQueryHandler(view_departments, pattern=r"^view_departments_"),  # Кнопка "Назад"
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter({
+                        callbacks.EMPLOYEE: view_employee_details,
+                        callbacks.DEPARTMENT: view_employees,  # Пагинация сотрудников
+                        callbacks.ADD_EMPLOYEE_TO: add_employee_start,
+                        callbacks.EDIT_DEPARTMENT: edit_department_start,
+                        callbacks.DEPARTMENTS: view_departments,  # Кнопка "Назад"
+                        callbacks.UPCOMING_BIRTHDAYS: view_upcoming_birthdays,
+                        **to_main_menu,
+                    })
                 ],
                 VIEW_EMPLOYEE_DETAILS: [
-                    CallbackQueryHandler(edit_employee_start, pattern=r"^edit_emp_"),
-                    CallbackQueryHandler(delete_employee, pattern=r"^del_emp_"),
-                    CallbackQueryHandler(
-                        view_employee_details,  # Изменено с lambda-функции
-                        pattern=r"^emp_"
-                    ),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter({
+                        callbacks.EDIT_EMPLOYEE: edit_employee_start,
+                        callbacks.DELETE_EMPLOYEE: delete_employee,
+                        callbacks.EMPLOYEE: view_employee_details,
+                        callbacks.DEPARTMENT: view_employees,  # Кнопка "Назад"
+                        **to_main_menu,
+                    })
                 ],
 
                 ADD_EMPLOYEE_START: [
-                    CallbackQueryHandler(add_employee_from_department, pattern=r"^add_emp_"),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter({callbacks.ADD_EMPLOYEE_TO: add_employee_from_department, **to_main_menu})
                 ],
                 ADD_EMPLOYEE_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, add_employee_name),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter(to_main_menu)
                 ],
                 ADD_EMPLOYEE_BIRTH: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, add_employee_birth),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter(to_main_menu)
                 ],
                 ADD_EMPLOYEE_TG_ID: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, add_employee_tg_id),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter(to_main_menu)
                 ],
                 EDIT_EMPLOYEE_FIELD: [
-                    CallbackQueryHandler(edit_employee_name, pattern=r"^edit_emp_name_"),
-                    CallbackQueryHandler(edit_employee_birth, pattern=r"^edit_emp_birth_"),
-                    CallbackQueryHandler(view_employee_details, pattern=r"^emp_"),  # Обработка кнопки "Назад"
+                    CallbackRouter({
+                        callbacks.EDIT_EMPLOYEE_NAME: edit_employee_name,
+                        callbacks.EDIT_EMPLOYEE_BIRTH: edit_employee_birth,
+                        callbacks.EMPLOYEE: view_employee_details,  # Кнопка "Назад"
+                    })
                 ],
                 EDIT_EMPLOYEE_NAME: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, save_employee_name),
-                    CallbackQueryHandler(lambda update, ctx: view_employee_details(update, ctx)),
+                    CallbackRouter({callbacks.EMPLOYEE: view_employee_details}),
                 ],
                 EDIT_EMPLOYEE_BIRTH: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, save_employee_birth),
-                    CallbackQueryHandler(lambda update, ctx: view_employee_details(update, ctx)),
+                    CallbackRouter({callbacks.EMPLOYEE: view_employee_details}),
                 ],
                 CONFIRM_DELETE: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, execute_delete),
-                    CallbackQueryHandler(show_main_menu, pattern=r"^main_menu$")
+                    CallbackRouter(to_main_menu)
                 ],
             },
-            fallbacks=[CommandHandler("start", start)]
+            fallbacks=[CommandHandler("start", start)],
+            name="main",
+            persistent=True
         ),
-        CallbackQueryHandler(view_employees, pattern=r"^dept_"),
-        CallbackQueryHandler(edit_department_start, pattern=r"^edit_dept_"),
-        CallbackQueryHandler(confirm_delete_department, pattern=r"^delete_dept_"),
-        CallbackQueryHandler(add_employee_from_department, pattern=r"^add_emp_"),
-        CallbackQueryHandler(edit_employee_start, pattern=r"^edit_emp_"),
-        CallbackQueryHandler(delete_employee, pattern=r"^del_emp_"),
-        CallbackQueryHandler(view_employee_details, pattern=r"^emp_")  # Для возврата из редактирования
-    ]
\ No newline at end of file
+        # Кнопки, нажатые вне текущего состояния диалога
+        CallbackRouter({
+            callbacks.DEPARTMENT: view_employees,
+            callbacks.EDIT_DEPARTMENT: edit_department_start,
+            callbacks.DELETE_DEPARTMENT: confirm_delete_department,
+            callbacks.ADD_EMPLOYEE_TO: add_employee_from_department,
+            callbacks.EDIT_EMPLOYEE: edit_employee_start,
+            callbacks.DELETE_EMPLOYEE: delete_employee,
+            callbacks.EMPLOYEE: view_employee_details,  # Для возврата из редактирования
+            callbacks.UPCOMING_BIRTHDAYS: view_upcoming_birthdays,
+            callbacks.MY_DEPARTMENT: view_my_department,
+        }),
+        StaleCallbackHandler(stale_callback),
+        CommandHandler("cache_stats", cache_stats),
+        CommandHandler("find", find_employees),
+        CommandHandler("grant_admin", grant_admin),
+        CommandHandler("revoke_admin", revoke_admin),
+        InlineQueryHandler(inline_find_employees),
+        MessageHandler(filters.Document.ALL, import_employees_document)
+    ]
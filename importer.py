@@ -0,0 +1,347 @@
+# importer.py
+"""Массовый импорт сотрудников из CSV/XLSX.
+
+Файл читается потоково и обрабатывается пакетами по IMPORT_BATCH_SIZE строк,
+поэтому потребление памяти не зависит от размера файла.
+
+Запуск из командной строки:
+    python importer.py roster.csv [--dry-run]
+"""
+import argparse
+import codecs
+import csv
+import os
+import zipfile
+from datetime import datetime, date
+from itertools import islice
+from sqlalchemy import insert, update, select, tuple_
+from database import Department, Employee, birthday_key
+from utils import validate_date
+from config import IMPORT_BATCH_SIZE
+
+# Заголовки колонок -> поля сотрудника
+COLUMN_ALIASES = {
+    'full_name': 'full_name', 'фио': 'full_name',
+    'birth_date': 'birth_date', 'дата рождения': 'birth_date',
+    'department': 'department', 'отдел': 'department',
+    'telegram_id': 'telegram_id', 'telegram id': 'telegram_id',
+    'is_head': 'is_head', 'начальник': 'is_head',
+    'external_id': 'external_id', 'табельный номер': 'external_id',
+}
+REQUIRED_COLUMNS = {'full_name', 'birth_date', 'department'}
+TRUE_VALUES = {'1', 'true', 'yes', 'да', '+'}
+MAX_REPORTED_ERRORS = 50  # Сколько отклонённых строк перечислять в отчёте
+CSV_ENCODING_SAMPLE = 64 * 1024  # Сколько байт CSV проверять при определении кодировки
+
+
+class ImportFileError(ValueError):
+    """Файл не может быть импортирован целиком"""
+
+
+class ImportReport:
+    """Итоги импорта"""
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.departments_created = 0
+        self.errors = []  # (номер строки, причина), не больше MAX_REPORTED_ERRORS
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, reason))
+
+    def summary(self) -> str:
+        """Текстовый отчёт для администратора"""
+        lines = [
+            "🔎 Проверка файла (изменения не сохранены)" if self.dry_run else "📥 Импорт завершён",
+            f"➕ Создано: {self.created}",
+            f"✏️ Обновлено: {self.updated}",
+            f"🏢 Новых отделов: {self.departments_created}",
+            f"❌ Отклонено: {self.rejected}",
+        ]
+        lines.extend(f"  строка {line}: {reason}" for line, reason in self.errors)
+        if self.rejected > len(self.errors):
+            lines.append(f"  ... и ещё {self.rejected - len(self.errors)}")
+        return "\n".join(lines)
+
+
+def _normalize_header(header) -> list:
+    columns = [COLUMN_ALIASES.get(str(name or '').strip().lower()) for name in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ImportFileError(f"В файле нет колонок: {', '.join(sorted(missing))}")
+    return columns
+
+
+def _cell_to_str(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def detect_csv_encoding(path: str) -> str:
+    """UTF-8 (с BOM или без) или cp1251 -- кодировка выгрузок Excel в русской Windows"""
+    with open(path, 'rb') as file:
+        sample = file.read(CSV_ENCODING_SAMPLE)
+    try:
+        # Последний символ образца может быть обрезан посередине
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8-sig'
+
+
+def iter_csv_rows(path: str):
+    """Строки CSV-файла: (номер строки, {поле: значение})"""
+    encoding = detect_csv_encoding(path)
+    with open(path, newline='', encoding=encoding) as file:
+        try:
+            sample = file.read(4096)
+            file.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t') if sample else csv.excel
+            except csv.Error:
+                dialect = csv.excel  # без разделителя не найдутся обязательные колонки
+            reader = csv.reader(file, dialect)
+            columns = _normalize_header(next(reader, []))
+            for line, values in enumerate(reader, start=2):
+                if any(values):
+                    yield line, {col: _cell_to_str(v) for col, v in zip(columns, values) if col}
+        except UnicodeDecodeError as e:
+            raise ImportFileError("Не удалось прочитать CSV: сохраните файл в кодировке UTF-8") from e
+        except csv.Error as e:
+            raise ImportFileError(f"Ошибка формата CSV: {e}") from e
+
+
+def iter_xlsx_rows(path: str):
+    """Строки первого листа XLSX-файла: (номер строки, {поле: значение})"""
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError as e:
+        raise ImportFileError("Для импорта XLSX установите пакет openpyxl") from e
+
+    try:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        # KeyError -- ZIP-архив без частей книги Excel
+        raise ImportFileError("Файл не является книгой Excel (.xlsx) или повреждён") from e
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _normalize_header(next(rows, []))
+        for line, values in enumerate(rows, start=2):
+            if any(v is not None for v in values):
+                yield line, {col: _cell_to_str(v) for col, v in zip(columns, values) if col}
+    finally:
+        workbook.close()
+
+
+def iter_rows(path: str):
+    """Строки файла в зависимости от расширения"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(path)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(path)
+    raise ImportFileError("Поддерживаются только файлы .csv и .xlsx")
+
+
+def parse_row(row: dict) -> dict:
+    """Проверка строки по правилам ввода бота. Бросает ValueError с причиной"""
+    full_name = row.get('full_name', '')
+    department = row.get('department', '')
+    birth = row.get('birth_date', '')
+    if not full_name:
+        raise ValueError("не указано ФИО")
+    if not department:
+        raise ValueError("не указан отдел")
+    if not validate_date(birth):
+        raise ValueError(f"неверная дата рождения '{birth}', ожидается ДД.ММ.ГГГГ")
+
+    telegram_id = row.get('telegram_id') or None
+    if telegram_id is not None:
+        if not telegram_id.lstrip('-').isdigit():
+            raise ValueError(f"неверный Telegram ID '{telegram_id}'")
+        telegram_id = int(telegram_id)
+
+    external_id = row.get('external_id') or None
+    if external_id is not None and len(external_id) > 64:
+        raise ValueError("табельный номер длиннее 64 символов")
+
+    birth_date = datetime.strptime(birth, "%d.%m.%Y").date()
+    return {
+        'full_name': full_name[:150],
+        'birth_date': birth_date,
+        'birth_key': birthday_key(birth_date),
+        'department': department[:100],
+        'telegram_id': telegram_id,
+        'is_head': row.get('is_head', '').lower() in TRUE_VALUES,
+        'external_id': external_id,
+    }
+
+
+def resolve_departments(session, names: set, known: dict, report: ImportReport, dry_run: bool = False) -> None:
+    """Дополняет known (название -> ID), создавая недостающие отделы.
+
+    При dry_run отделы не создаются: новым достаются отрицательные ID-заглушки.
+    """
+    missing = names - known.keys()
+    if not missing:
+        return
+    known.update(session.execute(
+        select(Department.name, Department.id).where(Department.name.in_(missing))
+    ).all())
+    new_names = missing - known.keys()
+    if new_names and dry_run:
+        placeholders = [dept_id for dept_id in known.values() if dept_id < 0]
+        start = min(placeholders, default=0)
+        known.update((name, start - i) for i, name in enumerate(sorted(new_names), start=1))
+        report.departments_created += len(new_names)
+    elif new_names:
+        session.execute(insert(Department), [{'name': name} for name in new_names])
+        report.departments_created += len(new_names)
+        known.update(session.execute(
+            select(Department.name, Department.id).where(Department.name.in_(new_names))
+        ).all())
+
+
+def _apply_batch(session, batch: list, departments: dict, report: ImportReport, dry_run: bool = False) -> None:
+    """Вставка и обновление пакета строк двумя executemany (при dry_run -- только подсчёт)"""
+    resolve_departments(session, {row['department'] for _, row in batch}, departments, report, dry_run)
+    for _, row in batch:
+        row['department_id'] = departments[row.pop('department')]
+
+    # Существующие сотрудники: по табельному номеру, затем по Telegram ID,
+    # а без него -- по (отдел, ФИО, дата рождения). Сотрудник с другим
+    # табельным номером -- другой человек из кадровой системы.
+    by_external = {}
+    ext_ids = [row['external_id'] for _, row in batch if row['external_id'] is not None]
+    if ext_ids:
+        by_external = dict(session.execute(
+            select(Employee.external_id, Employee.id).where(Employee.external_id.in_(ext_ids))
+        ).all())
+    by_telegram = {}
+    tg_ids = [row['telegram_id'] for _, row in batch if row['telegram_id'] is not None]
+    if tg_ids:
+        by_telegram = {r.telegram_id: r for r in session.execute(
+            select(Employee.telegram_id, Employee.id, Employee.external_id).where(Employee.telegram_id.in_(tg_ids))
+        )}
+    by_identity = {}
+    identities = [
+        (row['department_id'], row['full_name'], row['birth_date'])
+        for _, row in batch if row['telegram_id'] is None
+    ]
+    if identities:
+        rows = session.execute(
+            select(Employee.department_id, Employee.full_name, Employee.birth_date, Employee.id, Employee.external_id)
+            .where(tuple_(Employee.department_id, Employee.full_name, Employee.birth_date).in_(identities))
+        ).all()
+        by_identity = {(r.department_id, r.full_name, r.birth_date): r for r in rows}
+
+    inserts, updates = [], []
+    for line, row in batch:
+        external_id = row['external_id']
+        if row['telegram_id'] is not None:
+            holder = by_telegram.get(row['telegram_id'])
+            emp_id = by_external.get(external_id, holder and holder.id)
+            if holder is not None and (holder.id != emp_id or (
+                    holder.external_id is not None and external_id not in (None, holder.external_id))):
+                report.reject(line, f"Telegram ID {row['telegram_id']} занят другим сотрудником")
+                continue
+        else:
+            match = by_identity.get((row['department_id'], row['full_name'], row['birth_date']))
+            if match is not None and match.external_id is not None and external_id not in (None, match.external_id):
+                match = None
+            emp_id = by_external.get(external_id, match and match.id)
+            row.pop('telegram_id')  # не затираем Telegram ID, указанный в боте
+        if emp_id is None:
+            inserts.append(row)
+        else:
+            if external_id is None:
+                row.pop('external_id')  # не затираем табельный номер из синхронизации
+            updates.append({'id': emp_id, **row})
+
+    if inserts and not dry_run:
+        session.execute(insert(Employee), inserts)
+    if updates and not dry_run:
+        session.execute(update(Employee), updates)
+    report.created += len(inserts)
+    report.updated += len(updates)
+
+
+def import_rows(session, rows, dry_run: bool = False, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """Импорт строк (номер строки, {поле: значение}) пакетами.
+
+    При dry_run в БД ничего не записывается: строки проверяются и
+    сопоставляются с существующими сотрудниками только чтением, чтобы
+    проверка большого файла не держала блокировку записи SQLite и не
+    мешала боту. Повторы одного сотрудника без Telegram ID в разных
+    пакетах при проверке считаются созданными дважды.
+    """
+    report = ImportReport(dry_run)
+    departments = {}
+    seen_telegram_ids = set()
+    seen_external_ids = set()
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            batch = []
+            for line, raw in chunk:
+                try:
+                    row = parse_row(raw)
+                except ValueError as e:
+                    report.reject(line, str(e))
+                    continue
+                if row['telegram_id'] is not None and row['telegram_id'] in seen_telegram_ids:
+                    report.reject(line, f"Telegram ID {row['telegram_id']} уже встречался в файле")
+                    continue
+                if row['external_id'] is not None and row['external_id'] in seen_external_ids:
+                    report.reject(line, f"табельный номер {row['external_id']} уже встречался в файле")
+                    continue
+                seen_telegram_ids.add(row['telegram_id'])
+                seen_external_ids.add(row['external_id'])
+                batch.append((line, row))
+            if batch:
+                _apply_batch(session, batch, departments, report, dry_run)
+                if dry_run:
+                    session.rollback()  # Завершаем читающую транзакцию
+                else:
+                    session.commit()
+    finally:
+        if dry_run:
+            session.rollback()
+    return report
+
+
+def import_file(session, path: str, dry_run: bool = False) -> ImportReport:
+    """Импорт файла CSV/XLSX"""
+    return import_rows(session, iter_rows(path), dry_run=dry_run)
+
+
+def main() -> None:
+    """Точка входа командной строки"""
+    from database import Session
+
+    parser = argparse.ArgumentParser(description="Массовый импорт сотрудников из CSV/XLSX")
+    parser.add_argument('path', help="Файл .csv или .xlsx")
+    parser.add_argument('--dry-run', action='store_true', help="Только проверить файл, не сохраняя изменения")
+    args = parser.parse_args()
+
+    with Session() as session:
+        report = import_file(session, args.path, dry_run=args.dry_run)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
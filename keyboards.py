@@ -1,37 +1,52 @@
 # keyboards.py
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from config import PAGE_SIZE
-from database import Department, Employee
+from database import Department, Employee, Page
+import callbacks
 
 def admin_main_menu() -> InlineKeyboardMarkup:
     """Главное меню администратора"""
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("➕ Добавить отдел", callback_data="add_department"),
-         InlineKeyboardButton("👥 Добавить сотрудника", callback_data="add_employee")],  # Проверьте callback_data
-        [InlineKeyboardButton("📂 Просмотреть отделы", callback_data="view_departments_1")]
+        [InlineKeyboardButton("➕ Добавить отдел", callback_data=callbacks.ADD_DEPARTMENT.encode()),
+         InlineKeyboardButton("👥 Добавить сотрудника", callback_data=callbacks.ADD_EMPLOYEE.encode())],
+        [InlineKeyboardButton("📂 Просмотреть отделы", callback_data=callbacks.DEPARTMENTS.encode())],
+        [InlineKeyboardButton("🎂 Ближайшие дни рождения", callback_data=callbacks.UPCOMING_BIRTHDAYS.encode())]
     ])
 
-def department_pagination(page: int, total: int) -> list:
+def department_pagination(page: Page) -> list:
     """Кнопки пагинации для списка отделов"""
     buttons = []
-    if page > 1:
-        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"view_departments_{page-1}"))
-    if page * PAGE_SIZE < total:
-        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"view_departments_{page+1}"))
+    if page.has_prev:
+        data = callbacks.DEPARTMENTS.encode(('p', page.items[0].id))
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=data))
+    if page.has_next:
+        data = callbacks.DEPARTMENTS.encode(('n', page.items[-1].id))
+        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=data))
     return buttons
 
-def employee_details_keyboard(emp_id: int, is_admin: bool) -> InlineKeyboardMarkup:
+def employee_pagination(dept_id: int, page: Page) -> list:
+    """Кнопки пагинации для списка сотрудников отдела"""
+    buttons = []
+    if page.has_prev:
+        data = callbacks.DEPARTMENT.encode(dept_id, ('p', page.items[0].id))
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=data))
+    if page.has_next:
+        data = callbacks.DEPARTMENT.encode(dept_id, ('n', page.items[-1].id))
+        buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=data))
+    return buttons
+
+def employee_details_keyboard(emp_id: int, dept_id: int, is_admin: bool) -> InlineKeyboardMarkup:
     """Клавиатура для деталей сотрудника"""
     buttons = []
     if is_admin:
         buttons.extend([
-            [InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_emp_{emp_id}")],
-            [InlineKeyboardButton("🗑️ Удалить", callback_data=f"del_emp_{emp_id}")]
+            [InlineKeyboardButton("✏️ Редактировать", callback_data=callbacks.EDIT_EMPLOYEE.encode(emp_id))],
+            [InlineKeyboardButton("🗑️ Удалить", callback_data=callbacks.DELETE_EMPLOYEE.encode(emp_id))]
         ])
-    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_department")])
+    buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=callbacks.DEPARTMENT.encode(dept_id))])
     return InlineKeyboardMarkup(buttons)
 
 def user_main_menu(user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("👥 Мои сотрудники", callback_data="view_my_department")]
+        [InlineKeyboardButton("👥 Мои сотрудники", callback_data=callbacks.MY_DEPARTMENT.encode())]
     ])
\ No newline at end of file
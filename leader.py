@@ -0,0 +1,117 @@
+# leader.py
+import functools
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable
+from telegram.ext import Application, ContextTypes
+from database import Lease
+from async_db import run_db
+from config import LEADER_LEASE_TTL, LEADER_HEARTBEAT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "scheduler"  # Аренда на плановые рассылки
+HEARTBEAT_JOB_NAME = "leader_heartbeat"
+LEADER_KEY = "leader"  # Ключ в application.bot_data
+
+
+class LeaderElector:
+    """Выбор ведущей реплики через аренду в общей БД.
+
+    Все реплики обрабатывают обновления пользователей, но плановые рассылки
+    (поздравления, сводки, отправка очереди outbox) выполняет только
+    держатель аренды. Аренда продлевается каждые LEADER_HEARTBEAT_INTERVAL
+    секунд; если ведущая реплика остановилась, другая забирает аренду не
+    позже чем через LEADER_LEASE_TTL секунд.
+    """
+
+    def __init__(self, name: str = LEASE_NAME, ttl: float = LEADER_LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.token = None  # fencing token, пока реплика ведущая
+        self._on_elected = []
+        self._on_demoted = []
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+
+    @property
+    def fence(self) -> tuple[str, int] | None:
+        """(имя аренды, token) для проверки в запросах к БД"""
+        return (self.name, self.token) if self.token is not None else None
+
+    def on_elected(self, callback: Callable[[], Awaitable]) -> None:
+        """Вызывать callback() при получении аренды"""
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callable[[], Awaitable]) -> None:
+        """Вызывать callback() при потере аренды"""
+        self._on_demoted.append(callback)
+
+    async def heartbeat(self, context: ContextTypes.DEFAULT_TYPE | None = None) -> None:
+        """Получить или продлить аренду"""
+        try:
+            token = await run_db(Lease.acquire, self.name, self.holder, self.ttl)
+        except Exception as e:
+            # Без связи с БД нельзя быть уверенным в аренде
+            logger.error(f"Не удалось продлить аренду '{self.name}': {e}")
+            token = None
+        await self._set_token(token)
+
+    async def release(self) -> None:
+        """Отдать аренду при остановке"""
+        if self.token is None:
+            return
+        token, self.token = self.token, None
+        await run_db(Lease.release, self.name, self.holder, token)
+        logger.info(f"Аренда '{self.name}' освобождена")
+
+    async def _set_token(self, token: int | None) -> None:
+        previous, self.token = self.token, token
+        if token is not None and previous != token:
+            if previous is not None:
+                # Аренду успели перехватить и вернуть: всё, что было начато со старым token, недействительно
+                await self._notify(self._on_demoted)
+            logger.info(f"Реплика {self.holder} стала ведущей (token {token})")
+            await self._notify(self._on_elected)
+        elif token is None and previous is not None:
+            logger.warning(f"Реплика {self.holder} потеряла аренду '{self.name}'")
+            await self._notify(self._on_demoted)
+
+    @staticmethod
+    async def _notify(callbacks) -> None:
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Ошибка при смене ведущей реплики: {e}", exc_info=True)
+
+
+def leader_only(job_callback):
+    """Задача JobQueue выполняется только на ведущей реплике"""
+    @functools.wraps(job_callback)
+    async def wrapper(context: ContextTypes.DEFAULT_TYPE):
+        elector = context.application.bot_data.get(LEADER_KEY)
+        if elector is not None and not elector.is_leader:
+            return None
+        return await job_callback(context)
+    return wrapper
+
+
+def get_leader(application: Application) -> LeaderElector | None:
+    """Выбор ведущей реплики приложения (None, если не настроен)"""
+    return application.bot_data.get(LEADER_KEY)
+
+
+def setup_leader(application: Application) -> LeaderElector:
+    """Регистрация продления аренды в JobQueue"""
+    elector = LeaderElector()
+    application.bot_data[LEADER_KEY] = elector
+    application.job_queue.run_repeating(
+        elector.heartbeat, interval=LEADER_HEARTBEAT_INTERVAL, first=0, name=HEARTBEAT_JOB_NAME
+    )
+    return elector
@@ -0,0 +1,289 @@
+# loadtest.py
+"""Нагрузочное тестирование бота без Telegram.
+
+    python loadtest.py --spawn --users 2000 --rate 200 --duration 60
+    python loadtest.py --spawn --rate 100 --record clicks.jsonl
+    python loadtest.py --spawn --replay clicks.jsonl --rate 300
+
+Запускает локальный Bot API (fake_bot_api.py) и имитирует пользователей:
+каждый начинает с /start и дальше нажимает случайные кнопки последнего
+сообщения бота. Новое действие отправляется с частотой --rate тому
+пользователю, который дольше всех ждёт своей очереди; пока бот не ответил
+пользователю, тот ничего не нажимает. Время ответа -- от отправки
+обновления до первого sendMessage/editMessageText в этот чат.
+
+С --spawn бот запускается отдельным процессом (main.main) на временной БД
+с синтетической организацией (см. bench.py); без него запустите бота
+сами, указав в config.py BOT_API_BASE_URL = "http://127.0.0.1:8081/bot".
+Чтобы нагрузить администраторские экраны, назначьте имитируемых
+пользователей (--first-user-id ...) администраторами: ADMIN_IDS или
+/grant_admin. Метрики бота во время
+теста доступны на METRICS_PORT (см. metrics.py).
+
+Поток действий можно записать (--record) и воспроизвести (--replay):
+JSON Lines вида {"user": 1000001, "text": "/start"} или
+{"user": 1000001, "data": "1de:5"}; "data": "*" -- случайная кнопка.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from typing import Iterator, NamedTuple, Optional
+from fake_bot_api import FakeBotApi, SCREEN_METHODS
+
+RANDOM_BUTTON = "*"
+RESTART_SHARE = 0.05  # Доля действий, когда пользователь начинает заново с /start
+NOT_MODIFIED = "Bad Request: message is not modified"
+
+
+class Event(NamedTuple):
+    """Действие пользователя: текст или нажатие кнопки"""
+    user: int
+    text: Optional[str] = None
+    data: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({'user': self.user, 'text': self.text} if self.text is not None
+                          else {'user': self.user, 'data': self.data}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> "Event":
+        raw = json.loads(line)
+        return cls(int(raw['user']), raw.get('text'), raw.get('data'))
+
+
+def read_events(path: str) -> Iterator[Event]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield Event.from_json(line)
+
+
+class LoadReport(NamedTuple):
+    """Итоги прогона"""
+    duration: float
+    sent: int
+    completed: int
+    timeouts: int
+    busy_ticks: int  # Тики, когда не нашлось свободного пользователя (мало пользователей для --rate)
+    latencies: list  # секунды
+    api_calls: Counter
+    api_errors: Counter
+
+    @property
+    def errors(self) -> int:
+        """Обновления без ответа и ошибки Bot API (кроме правок без изменений)"""
+        return self.timeouts + sum(count for error, count in self.api_errors.items() if error != NOT_MODIFIED)
+
+    def percentile(self, p: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method='inclusive')[p - 1]
+
+    def summary(self) -> str:
+        lines = [
+            f"Отправлено обновлений: {self.sent} за {self.duration:.1f} с",
+            f"Обработано: {self.completed} ({self.completed / self.duration if self.duration else 0:.1f} в секунду)",
+            f"Время ответа: p50 {self.percentile(50) * 1000:.1f} мс, p99 {self.percentile(99) * 1000:.1f} мс",
+            f"Без ответа: {self.timeouts}",
+            f"Ошибки: {self.errors} ({self.errors / self.sent if self.sent else 0:.2%})",
+        ]
+        if self.busy_ticks:
+            lines.append(f"Пропущено тиков (все пользователи ждут ответа): {self.busy_ticks}")
+        lines.append("Вызовы Bot API: " + ", ".join(f"{m} {n}" for m, n in self.api_calls.most_common()))
+        lines.extend(f"  {error}: {count}" for error, count in self.api_errors.most_common())
+        return "\n".join(lines)
+
+
+class LoadTest:
+    """Имитатор пользователей поверх FakeBotApi"""
+
+    def __init__(self, api: FakeBotApi, timeout: float = 10.0, rng: Optional[random.Random] = None,
+                 record=None):
+        self.api = api
+        self.timeout = timeout
+        self.rng = rng or random.Random()
+        self.record = record  # Файл для записи потока действий
+        self.pending = {}  # пользователь -> время отправки обновления
+        self.latencies = []
+        self.sent = 0
+        self.timeouts = 0
+        self.busy_ticks = 0
+        self._idle = deque()
+        self._started = set()
+        api.on_reply = self._on_reply
+
+    def _on_reply(self, chat_id: int, method: str) -> None:
+        if method not in SCREEN_METHODS:
+            return
+        sent_at = self.pending.pop(chat_id, None)
+        if sent_at is not None:
+            self.latencies.append(time.perf_counter() - sent_at)
+            self._idle.append(chat_id)
+
+    def _expire(self) -> None:
+        deadline = time.perf_counter() - self.timeout
+        for user in [user for user, sent_at in self.pending.items() if sent_at < deadline]:
+            del self.pending[user]
+            self.timeouts += 1
+            self._idle.append(user)
+
+    def send(self, event: Event) -> None:
+        """Отправить действие боту (случайная кнопка выбирается по текущему сообщению)"""
+        if event.data == RANDOM_BUTTON:
+            buttons = self.api.buttons(event.user)
+            event = event._replace(data=self.rng.choice(buttons)) if buttons else Event(event.user, "/start")
+        if event.text is not None:
+            self.api.push_message(event.user, event.text)
+        else:
+            try:
+                self.api.push_callback(event.user, event.data)
+            except KeyError:
+                event = Event(event.user, "/start")
+                self.api.push_message(event.user, event.text)
+        self._started.add(event.user)
+        self.pending[event.user] = time.perf_counter()
+        self.sent += 1
+        if self.record is not None:
+            self.record.write(event.to_json() + "\n")
+
+    def _next_synthetic(self) -> Optional[Event]:
+        if not self._idle:
+            return None
+        user = self._idle.popleft()
+        if user not in self._started or self.rng.random() < RESTART_SHARE:
+            return Event(user, "/start")
+        return Event(user, data=RANDOM_BUTTON)
+
+    async def run(self, rate: float, duration: float, users=(), events: Optional[Iterator[Event]] = None) -> LoadReport:
+        """Отправлять действия с частотой rate в течение duration секунд.
+
+        events -- записанный поток; без него действия генерируются для users.
+        """
+        self._idle.extend(self.rng.sample(list(users), len(users)))
+        interval = 1 / rate
+        started = time.perf_counter()
+        next_at = started
+        replayed = None
+        while time.perf_counter() - started < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += interval
+            self._expire()
+            if events is None:
+                event = self._next_synthetic()
+            else:
+                replayed = replayed or next(events, None)
+                if replayed is None:
+                    break
+                # Следующее действие пользователя -- только после ответа на предыдущее
+                event, replayed = (replayed, None) if replayed.user not in self.pending else (None, replayed)
+            if event is None:
+                self.busy_ticks += 1
+                continue
+            self.send(event)
+        elapsed = time.perf_counter() - started
+
+        # Дожидаемся ответов на уже отправленные обновления
+        deadline = time.perf_counter() + self.timeout
+        while self.pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        self._expire()
+        self.timeouts += len(self.pending)
+        self.pending.clear()
+        return LoadReport(
+            duration=elapsed, sent=self.sent, completed=len(self.latencies), timeouts=self.timeouts,
+            busy_ticks=self.busy_ticks, latencies=self.latencies,
+            api_calls=Counter(self.api.calls), api_errors=Counter(self.api.errors),
+        )
+
+
+def spawn_bot(base_url: str, database_url: str) -> subprocess.Popen:
+    """Запустить бота отдельным процессом с указанными Bot API и БД"""
+    code = (
+        "import database, migrations, main; "
+        f"database.init_engine({database_url!r}); migrations.migrate(); main.main(base_url={base_url!r})"
+    )
+    return subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_for_bot(api: FakeBotApi, process: Optional[subprocess.Popen], timeout: float = 60) -> None:
+    """Дождаться, пока бот начнёт запрашивать обновления"""
+    deadline = time.perf_counter() + timeout
+    while not api.calls['getUpdates']:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Бот завершился с кодом {process.returncode}")
+        if time.perf_counter() > deadline:
+            raise SystemExit("Бот не подключился к Bot API")
+        await asyncio.sleep(0.1)
+
+
+async def run(args) -> LoadReport:
+    api = FakeBotApi(latency=args.api_latency / 1000)
+    base_url = await api.start(args.host, args.port)
+    process = None
+    record = open(args.record, 'w', encoding='utf-8') if args.record else None
+    try:
+        if args.spawn:
+            process = spawn_bot(base_url, args.database_url)
+        print(f"Ожидание бота на {base_url}...")
+        await wait_for_bot(api, process)
+        test = LoadTest(api, timeout=args.timeout, rng=random.Random(args.seed), record=record)
+        users = range(args.first_user_id, args.first_user_id + args.users)
+        events = read_events(args.replay) if args.replay else None
+        return await test.run(args.rate, args.duration, users, events)
+    finally:
+        if record is not None:
+            record.close()
+        if process is not None:
+            process.terminate()
+            # Сервер продолжает отвечать, пока бот завершает работу
+            deadline = time.perf_counter() + 30
+            while process.poll() is None and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+            if process.poll() is None:
+                process.kill()
+        await api.stop()
+
+
+def main(argv=None) -> None:
+    """Точка входа командной строки"""
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование бота на локальном Bot API")
+    parser.add_argument('--users', type=int, default=1000, help="Количество имитируемых пользователей")
+    parser.add_argument('--first-user-id', type=int, default=1000000, help="Telegram ID первого пользователя")
+    parser.add_argument('--rate', type=float, default=50, help="Действий пользователей в секунду")
+    parser.add_argument('--duration', type=float, default=30, help="Длительность теста, секунд")
+    parser.add_argument('--timeout', type=float, default=10, help="Через сколько секунд без ответа обновление считается ошибкой")
+    parser.add_argument('--api-latency', type=float, default=0, help="Задержка ответов Bot API, мс")
+    parser.add_argument('--seed', type=int, default=1, help="Зерно генератора действий")
+    parser.add_argument('--replay', help="Воспроизвести поток действий из файла JSON Lines")
+    parser.add_argument('--record', help="Записать отправленные действия в файл JSON Lines")
+    parser.add_argument('--host', default="127.0.0.1", help="Адрес локального Bot API")
+    parser.add_argument('--port', type=int, default=8081, help="Порт локального Bot API")
+    parser.add_argument('--spawn', action='store_true', help="Запустить бота отдельным процессом")
+    parser.add_argument('--db', help="Файл SQLite для бота с --spawn (по умолчанию временный)")
+    parser.add_argument('--departments', type=int, default=100, help="Отделов в синтетической БД")
+    parser.add_argument('--employees', type=int, default=10000, help="Сотрудников в синтетической БД")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.database_url = f"sqlite:///{args.db or os.path.join(tmp, 'loadtest.db')}"
+        if args.spawn:
+            from bench import prepare_database
+            import database
+            prepare_database(args.database_url, args.departments, args.employees, args.seed)
+            database.get_engine().dispose()
+        report = asyncio.run(run(args))
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
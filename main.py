@@ -2,7 +2,25 @@ import logging
 from telegram import Update
 from telegram.ext import Application, ContextTypes
 from handlers import get_handlers
-from config import TOKEN, LOG_LEVEL
+from scheduler import setup_scheduler
+from dispatcher import setup_dispatcher, get_dispatcher
+from outbox import setup_outbox
+from leader import setup_leader, get_leader
+from access import access, setup_access
+from metrics import MetricsServer, InstrumentedRequest, instrument_handlers, registry, cache_collector
+from orm_audit import audited
+from cache import cache
+from rendering import render_cache
+import async_db
+from update_processor import PerUserUpdateProcessor
+from persistence import DatabasePersistence, setup_persistence
+from migrations import check_schema
+from database import get_engine
+from db_engine import validate_engine
+from config import (
+    TOKEN, LOG_LEVEL, UPDATE_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+    CONCURRENT_UPDATES, METRICS_PORT, ORM_AUDIT_SAMPLE_RATE, BOT_API_BASE_URL
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,25 +32,103 @@ logger = logging.getLogger(__name__)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок"""
-    logger.error(f"Ошибка: {context.error}")
+    logger.error(f"Ошибка: {context.error}", exc_info=context.error)
     if update and update.message:
         await update.message.reply_text("⚠️ Произошла ошибка. Попробуйте позже.")
 
 
-def main() -> None:
-    """Запуск бота"""
-    application = Application.builder().token(TOKEN).build()
+async def post_init(application: Application) -> None:
+    """Загрузка прав доступа и запуск HTTP-сервера метрик"""
+    await access.reload()
+    if METRICS_PORT:
+        server = MetricsServer()
+        await server.start()
+        application.bot_data["metrics_server"] = server
+
+
+async def post_shutdown(application: Application) -> None:
+    """Освобождение ресурсов при остановке"""
+    server = application.bot_data.get("metrics_server")
+    if server is not None:
+        await server.stop()
+    await get_dispatcher(application).stop()
+    # Отдаём аренду сразу, чтобы другая реплика не ждала истечения TTL
+    await get_leader(application).release()
+    async_db.shutdown()
+
+
+def validate_update_mode() -> None:
+    """Проверка настроек получения обновлений"""
+    if UPDATE_MODE not in ("polling", "webhook"):
+        raise ValueError(f"UPDATE_MODE должен быть 'polling' или 'webhook', а не '{UPDATE_MODE}'")
+    if UPDATE_MODE == "webhook" and not WEBHOOK_URL.startswith("https://"):
+        raise ValueError("Для режима webhook укажите WEBHOOK_URL, начинающийся с https://")
+    if CONCURRENT_UPDATES < 1:
+        raise ValueError("CONCURRENT_UPDATES должен быть не меньше 1")
+
+
+def build_application(base_url: str = BOT_API_BASE_URL) -> Application:
+    """Приложение со всеми обработчиками и задачами (base_url -- адрес Bot API, см. fake_bot_api.py)"""
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(base_url)
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .persistence(DatabasePersistence())
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Регистрируем обработчики
-    for handler in get_handlers():
+    handlers = instrument_handlers(get_handlers())
+    if ORM_AUDIT_SAMPLE_RATE:
+        # Выборочная проверка обработчиков на ленивые загрузки и N+1
+        instrument_handlers(handlers, audited)
+    for handler in handlers:
         application.add_handler(handler)
 
     # Регистрируем обработчик ошибок
     application.add_error_handler(error_handler)
 
+    # Плановые рассылки выполняет только ведущая реплика
+    setup_leader(application)
+
+    # Ежедневные поздравления с днём рождения через диспетчер рассылок
+    setup_dispatcher(application)
+    setup_outbox(application)
+    setup_scheduler(application)
+
+    # Вытеснение бездействующих пользователей из памяти
+    setup_persistence(application)
+
+    # Права доступа и отделы пользователей в памяти
+    setup_access(application)
+    return application
+
+
+def main(base_url: str = BOT_API_BASE_URL) -> None:
+    """Запуск бота"""
+    validate_update_mode()
+    validate_engine(get_engine())
+    check_schema()
+    application = build_application(base_url)
+    registry.add_collector(cache_collector({"data": cache, "screens": render_cache}))
+
     # Запускаем бота
-    logger.info("Бот запущен!")
-    application.run_polling()
+    logger.info(f"Бот запущен! Режим: {UPDATE_MODE}")
+    if UPDATE_MODE == "webhook":
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,359 @@
+# metrics.py
+"""Метрики бота в формате Prometheus.
+
+Собираются без внешних зависимостей:
+- время работы каждого обработчика и количество SQL-запросов на обновление
+  (обёртка instrument_handlers над обработчиками из get_handlers);
+- время SQL-запросов и журнал медленных запросов (события движка, см. database.py);
+- время запросов к Bot API по методам (InstrumentedRequest).
+
+Метрики отдаются по HTTP на METRICS_HOST:METRICS_PORT (GET /metrics).
+Запись метрики -- несколько операций с числами под блокировкой, поэтому
+накладные расходы по сравнению с сетью и БД незаметны.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from telegram.ext import BaseHandler, ConversationHandler
+from telegram.request import HTTPXRequest
+from callbacks import CallbackRouter
+from config import METRICS_HOST, METRICS_PORT, SLOW_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """Монотонно растущий счётчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}  # значения меток -> счётчик
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [счётчики корзин..., +Inf, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def sum(self, *label_values) -> float:
+        series = self._series.get(label_values)
+        return series[-1] if series else 0.0
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик и функций, вычисляющих значения в момент запроса"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """collector() возвращает строки в формате Prometheus (например, размеры кэшей)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.error(f"Ошибка при сборе метрик: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Время обработки обновления", ("handler",)
+))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)
+))
+UPDATE_QUERIES = registry.register(Histogram(
+    "bot_update_db_queries", "SQL-запросов на одно обновление", ("handler",), COUNT_BUCKETS
+))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "bot_db_query_duration_seconds", "Время выполнения SQL-запроса", buckets=QUERY_BUCKETS
+))
+DB_SLOW_QUERIES = registry.register(Counter(
+    "bot_db_slow_queries_total", f"SQL-запросы дольше {SLOW_QUERY_SECONDS} с"
+))
+BOT_API_LATENCY = registry.register(Histogram(
+    "bot_api_request_duration_seconds", "Время запроса к Bot API", ("method",)
+))
+BOT_API_ERRORS = registry.register(Counter(
+    "bot_api_errors_total", "Неуспешные запросы к Bot API", ("method",)
+))
+
+
+def cache_collector(caches: dict) -> Callable[[], list[str]]:
+    """Размеры и попадания кэшей {имя: TTLCache} (см. cache.py)"""
+    def collect() -> list[str]:
+        stats = {name: c.stats() for name, c in caches.items()}
+        lines = []
+        for metric, key, kind, documentation in (
+            ("bot_cache_entries", 'size', "gauge", "Записей в кэше"),
+            ("bot_cache_hits_total", 'hits', "counter", "Попадания в кэш"),
+            ("bot_cache_misses_total", 'misses', "counter", "Промахи кэша"),
+            ("bot_cache_evictions_total", 'evictions', "counter", "Вытесненные записи кэша"),
+        ):
+            lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+            lines += [f'{metric}{{cache="{name}"}} {values[key]}' for name, values in stats.items()]
+        return lines
+    return collect
+
+
+# ---------- обработчики ----------
+
+class UpdateStats:
+    """Счётчики текущего обновления (передаются в потоки БД через контекст)"""
+    __slots__ = ('handler', 'queries')
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.queries = 0
+
+
+_current_update: contextvars.ContextVar[Optional[UpdateStats]] = contextvars.ContextVar(
+    "current_update", default=None
+)
+
+
+def current_update() -> Optional[UpdateStats]:
+    """Счётчики обновления, обрабатываемого в текущем контексте"""
+    return _current_update.get()
+
+
+def instrument(callback: Callable, name: Optional[str] = None) -> Callable:
+    """Обёртка обработчика: время работы, исключения и количество SQL-запросов"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        stats = UpdateStats(name)
+        token = _current_update.set(stats)
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+            UPDATE_QUERIES.observe(stats.queries, name)
+            _current_update.reset(token)
+
+    return wrapper
+
+
+def instrument_handlers(handlers: list[BaseHandler], wrap: Callable = instrument) -> list[BaseHandler]:
+    """Обернуть функции всех обработчиков, включая состояния диалогов и таблицы CallbackRouter.
+
+    wrap(callback) -- обёртка (по умолчанию instrument); повторно одной и той же
+    обёрткой функция не оборачивается.
+    """
+    def apply(callback: Callable) -> Callable:
+        applied = getattr(callback, 'wrapped_by', frozenset())
+        if wrap in applied:
+            return callback
+        wrapper = wrap(callback)
+        wrapper.wrapped_by = applied | {wrap}
+        return wrapper
+
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points, wrap)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers, wrap)
+            instrument_handlers(handler.fallbacks, wrap)
+        elif isinstance(handler, CallbackRouter):
+            # У каждого действия своя функция
+            handler.routes = {code: apply(callback) for code, callback in handler.routes.items()}
+        else:
+            handler.callback = apply(handler.callback)
+    return handlers
+
+
+# ---------- база данных ----------
+
+def record_query(statement: str, duration: float) -> None:
+    """Учёт выполненного SQL-запроса (вызывается из событий движка в потоках БД)"""
+    DB_QUERY_LATENCY.observe(duration)
+    stats = _current_update.get()
+    if stats is not None:
+        stats.queries += 1
+    if duration >= SLOW_QUERY_SECONDS:
+        DB_SLOW_QUERIES.inc()
+        handler = stats.handler if stats is not None else "-"
+        logger.warning(f"Медленный запрос ({duration * 1000:.0f} мс, обработчик {handler}): {statement[:1000]}")
+
+
+# Подписка на уровне класса Engine: учитываются все движки, в т.ч. пересозданные
+# init_engine, а database.py не зависит от metrics (и python-telegram-bot)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Запросы одного соединения выполняются последовательно
+    conn.info['query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(statement, time.perf_counter() - conn.info.pop('query_start', time.perf_counter()))
+
+
+# ---------- Bot API ----------
+
+# .../bot<токен>/<метод>; остальное (скачивание файлов) -- одна метка FILE_LABEL,
+# чтобы пути файлов не порождали неограниченное число меток
+_API_METHOD = re.compile(r"/bot[^/]+/(\w+)$")
+FILE_LABEL = "file"
+
+
+def api_method_label(url: str) -> str:
+    """Метка метода Bot API для метрик"""
+    match = _API_METHOD.search(url)
+    return match.group(1) if match else FILE_LABEL
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с учётом времени и ошибок запросов по методам Bot API"""
+    __slots__ = ()
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> tuple[int, bytes]:
+        api_method = api_method_label(url)
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            BOT_API_ERRORS.inc(api_method)
+            raise
+        finally:
+            BOT_API_LATENCY.observe(time.perf_counter() - start, api_method)
+        if code >= 400:
+            BOT_API_ERRORS.inc(api_method)
+        return code, payload
+
+
+# ---------- HTTP ----------
+
+class MetricsServer:
+    """Минимальный HTTP-сервер для опроса Prometheus (только GET /metrics)"""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Заголовки запроса не нужны, но их надо дочитать
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split('?')[0] == "/metrics":
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
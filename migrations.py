@@ -0,0 +1,307 @@
+# migrations.py
+"""Версионные миграции схемы БД.
+
+Выполняются явно при развёртывании, а не при импорте моделей:
+    python migrations.py            # применить недостающие миграции
+    python migrations.py --status   # показать текущую версию
+
+Номер применённой версии хранится в таблице schema_version. Каждая
+миграция выполняется в своей транзакции. Миграции проверяют наличие
+колонок и индексов, поэтому БД, созданная до появления миграций
+(через create_all), обновляется без ошибок.
+"""
+import argparse
+import logging
+from datetime import date
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Boolean, Date, DateTime, ForeignKey, inspect, text
+)
+from sqlalchemy.schema import CreateTable
+from database import (
+    Department, Employee, OutboxMessage, Celebration, Lease, UserRole, UserDataRecord, ConversationRecord,
+    birthday_key, get_engine, utcnow
+)
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = 'schema_version'
+
+
+# ---------- вспомогательные функции ----------
+
+def _columns(conn, table: str) -> set:
+    return {col['name'] for col in inspect(conn).get_columns(table)}
+
+
+def _indexes(conn, table: str) -> set:
+    return {index['name'] for index in inspect(conn).get_indexes(table)}
+
+
+def _add_column(conn, table: str, name: str, column_type: str) -> bool:
+    if name in _columns(conn, table):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+    return True
+
+
+def _create_index(conn, table, name: str) -> None:
+    """Создать индекс модели, если его ещё нет"""
+    if name not in _indexes(conn, table.name):
+        next(index for index in table.indexes if index.name == name).create(conn)
+
+
+def _create_table(conn, table) -> None:
+    table.create(conn, checkfirst=True)
+
+
+# ---------- миграции ----------
+
+def _initial_schema(conn) -> None:
+    """Исходная схема: отделы и сотрудники (в том виде, как до миграций)"""
+    metadata = MetaData()
+    Table(
+        'departments', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(100), nullable=False, unique=True),
+    )
+    Table(
+        'employees', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('full_name', String(150), nullable=False),
+        Column('birth_date', Date, nullable=False),
+        Column('telegram_id', Integer, unique=True),
+        Column('is_head', Boolean, default=False),
+        Column('department_id', Integer, ForeignKey('departments.id'), nullable=False),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _birth_key(conn) -> None:
+    """Ключ дня рождения MMDD для поиска именинников по индексу"""
+    if _add_column(conn, 'employees', 'birth_key', 'INTEGER'):
+        rows = conn.execute(text("SELECT id, birth_date FROM employees")).all()
+        if rows:
+            conn.execute(
+                text("UPDATE employees SET birth_key = :key WHERE id = :id"),
+                [{'id': row.id, 'key': birthday_key(date.fromisoformat(str(row.birth_date)))} for row in rows]
+            )
+    _create_index(conn, Employee.__table__, 'ix_employees_birth_key')
+
+
+def _external_id(conn) -> None:
+    """Табельный номер и хэш данных для синхронизации с кадровой системой"""
+    _add_column(conn, 'employees', 'external_id', 'VARCHAR(64)')
+    _add_column(conn, 'employees', 'content_hash', 'VARCHAR(64)')
+    _create_index(conn, Employee.__table__, 'ix_employees_external_id')
+
+
+def _outbox(conn) -> None:
+    """Очередь исходящих сообщений"""
+    _create_table(conn, OutboxMessage.__table__)
+
+
+def _persistence(conn) -> None:
+    """Состояние диалогов и user_data"""
+    _create_table(conn, UserDataRecord.__table__)
+    _create_table(conn, ConversationRecord.__table__)
+
+
+def _list_indexes(conn) -> None:
+    """Индексы для списка сотрудников отдела и поиска начальника"""
+    _create_index(conn, Employee.__table__, 'ix_employees_department_full_name')
+    _create_index(conn, Employee.__table__, 'ix_employees_department_head')
+
+
+def _rebuild_sqlite_table(conn, table) -> None:
+    """Пересоздать таблицу SQLite по модели с сохранением данных.
+
+    SQLite не умеет менять внешние ключи через ALTER TABLE, поэтому таблица
+    копируется (порядок действий из документации SQLite, раздел "ALTER TABLE").
+    Вызывается при выключенной проверке внешних ключей (см. migrate).
+    Триггеры таблицы удаляются вместе с ней и должны быть созданы заново.
+    """
+    metadata = MetaData()
+    for dependency in table.foreign_keys:
+        dependency.column.table.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"{table.name}_new")
+    new_table.indexes.clear()  # Имена индексов в SQLite глобальны, создаются после переименования
+    # Колонки, добавленные в модель более поздними миграциями, остаются пустыми
+    existing = _columns(conn, table.name)
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+
+    conn.execute(CreateTable(new_table))
+    conn.execute(text(f"INSERT INTO {new_table.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _department_cascade(conn) -> None:
+    """ON DELETE CASCADE для сотрудников отдела"""
+    table = Employee.__table__
+    if conn.dialect.name == 'sqlite':
+        _rebuild_sqlite_table(conn, table)
+        return
+    for foreign_key in inspect(conn).get_foreign_keys(table.name):
+        if foreign_key['referred_table'] == Department.__tablename__ and foreign_key['name']:
+            conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT {foreign_key['name']}"))
+    conn.execute(text(
+        f"ALTER TABLE {table.name} ADD CONSTRAINT fk_employees_department_id FOREIGN KEY (department_id) "
+        f"REFERENCES {Department.__tablename__} (id) ON DELETE CASCADE"
+    ))
+
+
+_EMPLOYEE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER employee_search_insert AFTER INSERT ON employees BEGIN
+        INSERT INTO employee_search (rowid, full_name, department)
+        VALUES (new.id, new.full_name, (SELECT name FROM departments WHERE id = new.department_id));
+    END""",
+    """CREATE TRIGGER employee_search_delete AFTER DELETE ON employees BEGIN
+        DELETE FROM employee_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER employee_search_update AFTER UPDATE OF full_name, department_id ON employees BEGIN
+        DELETE FROM employee_search WHERE rowid = old.id;
+        INSERT INTO employee_search (rowid, full_name, department)
+        VALUES (new.id, new.full_name, (SELECT name FROM departments WHERE id = new.department_id));
+    END""",
+    """CREATE TRIGGER employee_search_department AFTER UPDATE OF name ON departments BEGIN
+        UPDATE employee_search SET department = new.name
+        WHERE rowid IN (SELECT id FROM employees WHERE department_id = new.id);
+    END""",
+]
+
+
+def _employee_search(conn) -> None:
+    """Полнотекстовый индекс FTS5 по ФИО и названию отдела (только SQLite).
+
+    Индекс поддерживается триггерами, поэтому его обновляют и обработчики
+    бота, и массовый импорт/синхронизация. На сервере БД поиск выполняется
+    без отдельного индекса (см. Employee.search).
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS employee_search USING fts5("
+        "full_name, department, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    ))
+    for trigger in _EMPLOYEE_SEARCH_TRIGGERS:
+        conn.execute(text(trigger.replace("CREATE TRIGGER", "CREATE TRIGGER IF NOT EXISTS", 1)))
+    conn.execute(text("DELETE FROM employee_search"))
+    conn.execute(text(
+        "INSERT INTO employee_search (rowid, full_name, department) "
+        "SELECT e.id, e.full_name, d.name FROM employees e JOIN departments d ON d.id = e.department_id"
+    ))
+
+
+def _timezones(conn) -> None:
+    """Часовые пояса отделов и сотрудников"""
+    _add_column(conn, 'departments', 'timezone', 'VARCHAR(64)')
+    _add_column(conn, 'employees', 'timezone', 'VARCHAR(64)')
+
+
+def _leases(conn) -> None:
+    """Аренды для выбора ведущей реплики"""
+    _create_table(conn, Lease.__table__)
+
+
+
+def _user_roles(conn) -> None:
+    """Роли пользователей бота"""
+    _create_table(conn, UserRole.__table__)
+
+
+def _celebrations(conn) -> None:
+    """Отметки о поздравлениях: повторное срабатывание за ту же дату ничего не отправляет"""
+    _create_table(conn, Celebration.__table__)
+
+
+# (версия, описание, функция). Новые миграции добавляются только в конец.
+MIGRATIONS = [
+    (1, "Исходная схема", _initial_schema),
+    (2, "birth_key", _birth_key),
+    (3, "external_id и content_hash", _external_id),
+    (4, "Таблица outbox", _outbox),
+    (5, "Таблицы состояния диалогов", _persistence),
+    (6, "Индексы списков сотрудников", _list_indexes),
+    (7, "Каскадное удаление сотрудников отдела", _department_cascade),
+    (8, "Полнотекстовый поиск сотрудников", _employee_search),
+    (9, "Часовые пояса", _timezones),
+    (10, "Таблица аренд", _leases),
+    (11, "Роли пользователей", _user_roles),
+    (12, "Отметки о поздравлениях", _celebrations),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_version_metadata = MetaData()
+_version_table = Table(
+    VERSION_TABLE, _version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def current_version(engine=None) -> int:
+    """Версия схемы БД (0 -- миграции не применялись)"""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_TABLE):
+            return 0
+        return conn.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar() or 0
+
+
+def migrate(engine=None) -> list[int]:
+    """Применить недостающие миграции. Возвращает номера применённых"""
+    engine = engine or get_engine()
+    _version_metadata.create_all(engine, checkfirst=True)
+    applied = []
+    version = current_version(engine)
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.connect() as conn:
+            if conn.dialect.name == 'sqlite':
+                # Пересоздание таблиц не должно запускать каскады; PRAGMA работает только вне транзакции
+                conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+                conn.commit()
+            with conn.begin():
+                upgrade(conn)
+                if conn.dialect.name == 'sqlite' and conn.exec_driver_sql("PRAGMA foreign_key_check").first():
+                    raise RuntimeError(f"Миграция {number} нарушила внешние ключи")
+                conn.execute(_version_table.insert().values(
+                    version=number, description=description, applied_at=utcnow()
+                ))
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+                conn.commit()
+        logger.info(f"Применена миграция {number}: {description}")
+        applied.append(number)
+    return applied
+
+
+def check_schema(engine=None) -> None:
+    """Проверка при запуске бота, что все миграции применены"""
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Схема БД устарела (версия {version}, нужна {LATEST_VERSION}). Выполните: python migrations.py"
+        )
+
+
+def main() -> None:
+    """Точка входа командной строки"""
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument('--status', action='store_true', help="Только показать версию схемы")
+    args = parser.parse_args()
+
+    if args.status:
+        print(f"Версия схемы: {current_version()} из {LATEST_VERSION}")
+        return
+    applied = migrate()
+    print(f"Применено миграций: {len(applied)}. Версия схемы: {current_version()}")
+
+
+if __name__ == "__main__":
+    main()
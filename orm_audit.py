@@ -0,0 +1,169 @@
+# orm_audit.py
+"""Поиск лишних запросов в обработчиках.
+
+Для обработчика, попавшего в выборку (ORM_AUDIT_SAMPLE_RATE), собирается
+отчёт об обращениях к БД за время обработки обновления:
+- ленивые загрузки связей (employee.department и т.п.) -- лишний запрос
+  на каждый объект;
+- N+1: одна и та же связь или один и тот же SQL-запрос выполняются
+  ORM_AUDIT_N1_THRESHOLD и более раз за обновление;
+- обращения к незагруженным атрибутам объектов после закрытия сессии
+  (DetachedInstanceError) -- учитываются при создании исключения, даже
+  если обработчик его перехватил.
+
+Найденные проблемы пишутся в журнал и в метрики (см. metrics.py). В тестах
+тот же отчёт доступен через контекстный менеджер audit().
+"""
+import contextlib
+import contextvars
+import functools
+import logging
+import random
+from collections import Counter as Tally
+from typing import Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm.exc import DetachedInstanceError
+from metrics import Counter, registry
+from config import ORM_AUDIT_SAMPLE_RATE, ORM_AUDIT_N1_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+LAZY_LOADS = registry.register(Counter(
+    "bot_orm_lazy_loads_total", "Ленивые загрузки связей в проверенных обновлениях", ("handler",)
+))
+N_PLUS_ONE = registry.register(Counter(
+    "bot_orm_n_plus_one_total", "Обновления с повторяющимися запросами (N+1)", ("handler",)
+))
+DETACHED = registry.register(Counter(
+    "bot_orm_detached_access_total", "Обращения к объектам после закрытия сессии", ("handler",)
+))
+
+
+class OrmAuditError(AssertionError):
+    """Проверка в строгом режиме нашла проблемы"""
+
+
+class AuditReport:
+    """Обращения к БД за время обработки одного обновления"""
+
+    def __init__(self, handler: str, threshold: int = ORM_AUDIT_N1_THRESHOLD):
+        self.handler = handler
+        self.threshold = threshold
+        self.statements = Tally()  # SQL -> сколько раз выполнен
+        self.lazy_loads = Tally()  # "Класс.связь" -> сколько раз загружена лениво
+        self.detached = []  # тексты DetachedInstanceError
+
+    @property
+    def queries(self) -> int:
+        return sum(self.statements.values())
+
+    @property
+    def n_plus_one(self) -> list[str]:
+        """Связи и запросы, повторённые threshold и более раз"""
+        repeated = [f"{key} x{count}" for key, count in self.lazy_loads.items() if count >= self.threshold]
+        repeated += [
+            f"{' '.join(statement.split())[:200]} x{count}"
+            for statement, count in self.statements.items() if count >= self.threshold
+        ]
+        return repeated
+
+    @property
+    def problems(self) -> list[str]:
+        problems = [f"ленивая загрузка {key} x{count}" for key, count in self.lazy_loads.items()]
+        problems += [f"N+1: {item}" for item in self.n_plus_one]
+        problems += [f"объект вне сессии: {message}" for message in self.detached]
+        return problems
+
+    def publish(self) -> None:
+        """Записать найденные проблемы в журнал и метрики"""
+        if self.lazy_loads:
+            LAZY_LOADS.inc(self.handler, amount=sum(self.lazy_loads.values()))
+        if self.n_plus_one:
+            N_PLUS_ONE.inc(self.handler)
+        if self.detached:
+            DETACHED.inc(self.handler, amount=len(self.detached))
+        problems = self.problems
+        if problems:
+            logger.warning(
+                f"Обработчик {self.handler}: {self.queries} запросов, проблемы: " + "; ".join(problems)
+            )
+
+
+_current_audit: contextvars.ContextVar[Optional[AuditReport]] = contextvars.ContextVar(
+    "current_audit", default=None
+)
+_installed = False
+
+
+def install() -> None:
+    """Подписаться на события SQLAlchemy (для всех движков и сессий)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(OrmSession, "do_orm_execute", _do_orm_execute)
+    # У SQLAlchemy нет события для обращения вне сессии: оборачиваем конструктор исключения
+    DetachedInstanceError.__init__ = _recording_init(DetachedInstanceError.__init__)
+    _installed = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    report = _current_audit.get()
+    if report is not None:
+        report.statements[statement] += 1
+
+
+def _recording_init(init):
+    @functools.wraps(init)
+    def wrapper(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        report = _current_audit.get()
+        if report is not None:
+            report.detached.append(str(self))
+
+    return wrapper
+
+
+def _do_orm_execute(orm_execute_state):
+    report = _current_audit.get()
+    if report is not None and orm_execute_state.is_relationship_load:
+        path = orm_execute_state.loader_strategy_path
+        report.lazy_loads[str(path[-1]) if len(path) else "?"] += 1
+
+
+@contextlib.contextmanager
+def audit(handler: str = "test", strict: bool = False, threshold: int = ORM_AUDIT_N1_THRESHOLD):
+    """Собрать отчёт для блока кода (запросы в run_db тоже учитываются).
+
+    strict -- выбросить OrmAuditError, если найдены проблемы (для тестов).
+    """
+    install()
+    report = AuditReport(handler, threshold)
+    token = _current_audit.set(report)
+    try:
+        yield report
+    finally:
+        _current_audit.reset(token)
+    if strict and report.problems:
+        raise OrmAuditError("; ".join(report.problems))
+
+
+def audited(callback: Callable, name: Optional[str] = None, sample_rate: float = ORM_AUDIT_SAMPLE_RATE) -> Callable:
+    """Обёртка обработчика: проверка доли sample_rate обновлений"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        if random.random() >= sample_rate:
+            return await callback(*args, **kwargs)
+        report = None
+        try:
+            with audit(name) as report:
+                return await callback(*args, **kwargs)
+        finally:
+            if report is not None:
+                report.publish()
+
+    return wrapper
@@ -0,0 +1,68 @@
+# outbox.py
+import asyncio
+import logging
+from datetime import time, timedelta
+from telegram.ext import Application, ContextTypes
+from database import OutboxMessage, Celebration
+from async_db import run_db
+from dispatcher import get_dispatcher, DispatchStats
+from leader import get_leader, leader_only
+from config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, OUTBOX_POLL_INTERVAL, OUTBOX_RETRY_SECONDS,
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETENTION_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+DRAIN_JOB_NAME = "outbox_drain"
+PURGE_JOB_NAME = "outbox_purge"
+
+_drain_lock = asyncio.Lock()
+
+
+async def drain_outbox(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отправка очереди outbox пачками под аренду.
+
+    Сообщение подтверждается сразу после отправки своей пачки, поэтому при
+    падении процесса повторно могут уйти только сообщения последней пачки,
+    а неотправленные сообщения будут забраны после истечения аренды.
+    Выполняется только на ведущей реплике; пачки забираются с проверкой
+    её fencing token.
+    """
+    if _drain_lock.locked():
+        return
+    leader = get_leader(context.application)
+    if leader is not None and not leader.is_leader:
+        return
+    async with _drain_lock:
+        dispatcher = get_dispatcher(context.application)
+        stats = DispatchStats()
+        while True:
+            fence = leader.fence if leader is not None else None
+            token, batch = await run_db(OutboxMessage.claim, OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, fence)
+            if not batch:
+                break
+            results = await asyncio.gather(*(
+                dispatcher.submit(message.chat_id, message.text, message.priority, stats)
+                for message in batch
+            ))
+            sent = [message.id for message, ok in zip(batch, results) if ok]
+            failed = [message.id for message, ok in zip(batch, results) if not ok]
+            await run_db(OutboxMessage.ack, token, sent)
+            await run_db(OutboxMessage.release, token, failed, OUTBOX_RETRY_SECONDS, OUTBOX_MAX_ATTEMPTS)
+        if stats.submitted:
+            logger.info(f"Очередь рассылки: {stats}")
+
+
+async def purge_outbox(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Удаление старых обработанных сообщений и отметок о поздравлениях"""
+    removed = await run_db(OutboxMessage.purge, timedelta(days=OUTBOX_RETENTION_DAYS))
+    removed += await run_db(Celebration.purge, timedelta(days=OUTBOX_RETENTION_DAYS))
+    if removed:
+        logger.info(f"Удалено старых сообщений рассылки: {removed}")
+
+
+def setup_outbox(application: Application) -> None:
+    """Фоновая отправка очереди outbox (в том числе оставшейся после перезапуска)"""
+    application.job_queue.run_repeating(drain_outbox, interval=OUTBOX_POLL_INTERVAL, first=5, name=DRAIN_JOB_NAME)
+    application.job_queue.run_daily(leader_only(purge_outbox), time=time(3, 0), name=PURGE_JOB_NAME)
@@ -0,0 +1,230 @@
+# persistence.py
+import asyncio
+import json
+import logging
+import pickle
+import time
+from datetime import timedelta
+from telegram.ext import Application, BasePersistence, ContextTypes, ConversationHandler, PersistenceInput
+from database import UserDataRecord, ConversationRecord, save_persistence_batch, purge_persistence, utcnow
+from async_db import run_db
+from config import PERSISTENCE_TTL, PERSISTENCE_MEMORY_IDLE, PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_FLUSH_DELAY
+
+logger = logging.getLogger(__name__)
+
+EVICTION_JOB_NAME = "persistence_eviction"
+
+
+class DatabasePersistence(BasePersistence):
+    """Хранение состояния диалогов и context.user_data в БД бота.
+
+    - user_data загружается лениво: при первом обращении пользователя после
+      запуска (refresh_user_data), а не целиком при старте;
+    - изменения копятся в памяти и записываются одной транзакцией через
+      PERSISTENCE_FLUSH_DELAY секунд после первого изменения;
+    - данные пользователей, бездействующих дольше PERSISTENCE_MEMORY_IDLE,
+      выгружаются из памяти (оставаясь в БД), а диалоги и данные старше
+      PERSISTENCE_TTL удаляются совсем -- и из БД, и из памяти.
+    Состояния диалогов PTB загружает при запуске целиком (лениво их
+    загрузить нельзя), поэтому в памяти держатся все диалоги моложе
+    PERSISTENCE_TTL, а не только активные за PERSISTENCE_MEMORY_IDLE.
+    bot_data и chat_data не сохраняются.
+    """
+
+    def __init__(self, ttl: float = PERSISTENCE_TTL, flush_delay: float = PERSISTENCE_FLUSH_DELAY,
+                 update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self._pending_users = {}  # user_id -> pickle данных или None (удалить)
+        self._pending_conversations = {}  # (name, key) -> JSON состояния или None (удалить)
+        self._loaded_users = set()
+        self._unloading_users = set()  # выгружаются из памяти, запись в БД сохраняется
+        self._reloaded_users = {}  # user_id -> user_data, загруженные заново до завершения выгрузки
+        self._last_access = {}  # user_id -> время последнего обращения
+        self._conversation_access = {}  # (name, key) -> время последнего изменения состояния
+        self._flush_task = None
+
+    def _since(self):
+        return utcnow() - timedelta(seconds=self.ttl)
+
+    # ---------- загрузка ----------
+
+    async def get_user_data(self) -> dict:
+        return {}  # загружается лениво в refresh_user_data
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await run_db(ConversationRecord.load_active, name, self._since())
+        conversations = {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+        now = time.monotonic()
+        self._conversation_access.update(((name, key), now) for key in conversations)
+        return conversations
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        self._last_access[user_id] = time.monotonic()
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        if user_id in self._unloading_users:
+            # Application уже убрал данные из памяти, но drop_user_data ещё впереди
+            self._reloaded_users[user_id] = user_data
+        if user_id in self._pending_users:
+            return  # в памяти более свежие данные, чем в БД
+        stored = await run_db(UserDataRecord.load, user_id, self._since())
+        if stored is not None:
+            user_data.update(pickle.loads(stored))
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # ---------- запись ----------
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._loaded_users.add(user_id)
+        self._pending_users[user_id] = pickle.dumps(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._unloading_users:
+            self._unloading_users.discard(user_id)
+            live = self._reloaded_users.pop(user_id, None)
+            if live is not None:
+                # Пользователь вернулся до завершения выгрузки: данные снова в памяти,
+                # а их изменения Application не сохранил (удаление важнее обновления)
+                await self.update_user_data(user_id, live)
+            return
+        self._loaded_users.discard(user_id)
+        self._last_access.pop(user_id, None)
+        self._pending_users[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        if new_state is None:
+            self._conversation_access.pop((name, key), None)
+        else:
+            self._conversation_access[(name, key)] = time.monotonic()
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self._write()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния диалогов: {str(e)}", exc_info=True)
+
+    async def _write(self) -> None:
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not users and not conversations:
+            return
+        try:
+            await run_db(save_persistence_batch, users, conversations)
+        except Exception:
+            # Не теряем изменения: вернём их в очередь, если их не перезаписали
+            for user_id, data in users.items():
+                self._pending_users.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._pending_conversations.setdefault(key, state)
+            raise
+
+    # ---------- вытеснение ----------
+
+    def unload_idle_users(self, idle_seconds: float) -> list[int]:
+        """Пользователи, бездействующие дольше idle_seconds, помечаются к выгрузке из памяти.
+
+        Вызывающий сразу убирает их данные из Application (drop_user_data),
+        поэтому следующее обращение снова загрузит их из БД.
+        """
+        now = time.monotonic()
+        idle = [uid for uid, last in self._last_access.items()
+                if now - last > idle_seconds and uid not in self._pending_users]
+        self._unloading_users.update(idle)
+        for user_id in idle:
+            self._loaded_users.discard(user_id)
+            self._last_access.pop(user_id, None)
+        return idle
+
+    def expired_conversations(self, ttl: float) -> list[tuple[str, tuple]]:
+        """(name, key) диалогов, состояние которых не менялось дольше ttl"""
+        now = time.monotonic()
+        return [conversation for conversation, last in self._conversation_access.items() if now - last > ttl]
+
+
+async def drop_conversations(application: Application, conversations: list[tuple[str, tuple]]) -> int:
+    """Удалить состояния диалогов из памяти ConversationHandler и из БД.
+
+    PTB не даёт публичного способа забыть диалог, поэтому используется
+    _conversations; удаление передаётся в update_conversation, чтобы
+    диалог перестал отслеживаться и его запись (если она ещё есть)
+    удалилась при следующем сохранении.
+    """
+    persistence = application.persistence
+    handlers = {
+        handler.name: handler
+        for group in application.handlers.values() for handler in group
+        if isinstance(handler, ConversationHandler) and handler.persistent
+    }
+    dropped = 0
+    for name, key in conversations:
+        handler = handlers.get(name)
+        if handler is not None and handler._conversations.pop(key, None) is not None:
+            dropped += 1
+        await persistence.update_conversation(name, key, None)
+    return dropped
+
+
+async def evict_idle_users(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выгрузка из памяти данных бездействующих пользователей и удаление заброшенных диалогов"""
+    application = context.application
+    persistence = application.persistence
+    for user_id in persistence.unload_idle_users(PERSISTENCE_MEMORY_IDLE):
+        application.drop_user_data(user_id)
+    removed = await run_db(purge_persistence, timedelta(seconds=PERSISTENCE_TTL))
+    dropped = await drop_conversations(application, persistence.expired_conversations(PERSISTENCE_TTL))
+    if removed or dropped:
+        logger.info(f"Удалено заброшенных диалогов и данных пользователей: {removed}, диалогов в памяти: {dropped}")
+
+
+def setup_persistence(application: Application) -> None:
+    """Периодическое вытеснение бездействующих пользователей"""
+    application.job_queue.run_repeating(
+        evict_idle_users, interval=min(PERSISTENCE_MEMORY_IDLE, 3600), first=60, name=EVICTION_JOB_NAME
+    )
@@ -0,0 +1,85 @@
+# rendering.py
+import hashlib
+from typing import Awaitable, Callable, NamedTuple, Optional
+from telegram import InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from cache import TTLCache, cache
+from config import RENDER_CACHE_SIZE, CACHE_TTL
+
+
+class Screen(NamedTuple):
+    """Готовый экран: текст, клавиатура и хэш их содержимого"""
+    text: str
+    markup: Optional[InlineKeyboardMarkup]
+    digest: str
+
+
+class RenderStats:
+    """Счётчики отправок экранов"""
+
+    def __init__(self):
+        self.edits = 0
+        self.skipped = 0  # Правки, не отправленные в Bot API: содержимое не изменилось
+
+
+# Кэш готовых экранов. Ключ включает версии данных из общего кэша, поэтому
+# после инвалидации старые экраны просто перестают находиться и вытесняются
+render_cache = TTLCache(maxsize=RENDER_CACHE_SIZE, ttl=CACHE_TTL)
+render_stats = RenderStats()
+
+
+def content_digest(text: Optional[str], markup: Optional[InlineKeyboardMarkup]) -> str:
+    """Хэш текста и кнопок сообщения"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((text or "").encode())
+    for row in (markup.inline_keyboard if markup else ()):
+        digest.update(b"\n")
+        for button in row:
+            digest.update(f"\t{button.text}\x1f{button.callback_data or ''}\x1f{button.url or ''}".encode())
+    return digest.hexdigest()
+
+
+async def render_screen(key, tags, build: Callable[[], Awaitable[Optional[tuple]]]) -> Optional[Screen]:
+    """Экран из кэша или build() -> (текст, клавиатура).
+
+    key описывает экран (имя, страница, флаг администратора), tags --
+    теги данных, из которых он построен. Если build() вернул None
+    (например, отдел удалён), ничего не кэшируется.
+    """
+    versioned_key = (key, cache.versions(tags))
+    found, screen = render_cache.get(versioned_key)
+    if found:
+        return screen
+    built = await build()
+    if built is None:
+        return None
+    text, markup = built
+    screen = Screen(text, markup, content_digest(text, markup))
+    render_cache.set(versioned_key, screen)
+    return screen
+
+
+async def show_screen(update: Update, context, screen: Screen) -> bool:
+    """Показать экран: правкой сообщения с нажатой кнопкой или новым сообщением.
+
+    Правка не отправляется, если сообщение уже содержит тот же текст и
+    клавиатуру. Возвращает True, если запрос к Bot API был выполнен.
+    """
+    query = update.callback_query
+    if query is None:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text=screen.text, reply_markup=screen.markup)
+        return True
+
+    message = query.message
+    if message is not None and content_digest(message.text, message.reply_markup) == screen.digest:
+        render_stats.skipped += 1
+        return False
+    try:
+        await query.edit_message_text(screen.text, reply_markup=screen.markup)
+    except BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+        render_stats.skipped += 1
+        return False
+    render_stats.edits += 1
+    return True
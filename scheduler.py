@@ -0,0 +1,333 @@
+# scheduler.py
+import heapq
+import itertools
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from telegram.ext import Application, ContextTypes
+from database import Employee, OutboxMessage, Celebration, DigestRow, UpcomingBirthday, next_celebration
+from async_db import run_db
+from dispatcher import PRIORITY_HIGH, PRIORITY_NORMAL
+from outbox import drain_outbox
+from leader import get_leader, leader_only
+from config import TIMEZONE, BIRTHDAY_CHECK_TIME, DIGEST_WEEKDAY, DIGEST_TIME, DIGEST_DAYS
+
+logger = logging.getLogger(__name__)
+
+BIRTHDAY_JOB_NAME = "birthday_congratulations"
+DIGEST_JOB_NAME = "birthday_digest"
+RELOAD_JOB_NAME = "birthday_schedule_reload"
+SCHEDULER_KEY = "birthday_scheduler"  # Ключ в application.bot_data
+# Окно расписания в днях от вчерашней даты TIMEZONE: местная дата в любом
+# часовом поясе отличается от неё не больше чем на сутки, а следующая
+# загрузка (ежедневная в 00:05) наступает раньше, чем закончится окно
+SCHEDULE_WINDOW_DAYS = 4
+
+# Каналы рассылки (часть ключа идемпотентности в очереди outbox)
+CHANNEL_GREETING = "greeting"
+CHANNEL_COLLEAGUES = "colleagues"
+CHANNEL_DIGEST = "digest"
+
+
+def greeting_text(employee: Employee) -> str:
+    """Текст поздравления для именинника"""
+    return f"🎉 {employee.full_name}, поздравляем вас с днём рождения!"
+
+
+def colleagues_text(celebrants: list[Employee]) -> str:
+    """Текст уведомления коллегам об именинниках отдела"""
+    names = "\n".join(f"🎂 {emp.full_name}" for emp in celebrants)
+    return f"🎉 Сегодня день рождения у ваших коллег:\n{names}"
+
+
+def colleagues_channel(celebrants: list[Employee]) -> str:
+    """Канал уведомления коллегам: colleagues:<ID первого именинника>"""
+    return f"{CHANNEL_COLLEAGUES}:{min(emp.id for emp in celebrants)}"
+
+
+def build_messages(celebrants: list[Employee], colleagues: list[Employee]) -> list[dict]:
+    """Сообщения для очереди рассылки (строки OutboxMessage без даты).
+
+    Каждый получатель получает одно сообщение на пакет, даже если в его
+    отделе несколько именинников. Канал уведомления коллегам содержит ID
+    первого именинника из сообщения: именинники отдела в разных часовых
+    поясах (или с датой, исправленной на сегодня после рассылки) приходят
+    разными пакетами, и уведомление второго пакета не должно совпасть по
+    ключу идемпотентности с первым. Личные поздравления отправляются раньше
+    уведомлений коллегам.
+    """
+    by_department = {}
+    for emp in celebrants:
+        by_department.setdefault(emp.department_id, []).append(emp)
+
+    messages = []
+    celebrant_ids = {emp.id for emp in celebrants}
+    # Именинник получает личное поздравление вместо уведомления о коллегах
+    for emp in celebrants:
+        if emp.telegram_id:
+            messages.append({
+                'employee_id': emp.id, 'chat_id': emp.telegram_id, 'channel': CHANNEL_GREETING,
+                'text': greeting_text(emp), 'priority': PRIORITY_HIGH,
+            })
+    for colleague in colleagues:
+        others = [emp for emp in by_department.get(colleague.department_id, []) if emp.id != colleague.id]
+        if others and colleague.id not in celebrant_ids:
+            messages.append({
+                'employee_id': colleague.id, 'chat_id': colleague.telegram_id,
+                'channel': colleagues_channel(others),
+                'text': colleagues_text(others), 'priority': PRIORITY_NORMAL,
+            })
+    return messages
+
+
+def upcoming_text(birthdays: list[UpcomingBirthday], with_department: bool = True) -> str:
+    """Список ближайших дней рождения: дата, ФИО и (при необходимости) отдел"""
+    lines = []
+    for item in birthdays:
+        line = f"🎂 {item.celebration_date.strftime('%d.%m')} — {item.full_name}"
+        if with_department:
+            line += f" ({item.department_name})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def build_digest_messages(rows: list[DigestRow]) -> list[dict]:
+    """Сообщения еженедельной сводки: одно на начальника отдела"""
+    by_head = {}
+    for row in rows:
+        by_head.setdefault((row.head_id, row.head_chat_id), []).append(row.birthday)
+    return [
+        {
+            'employee_id': head_id, 'chat_id': chat_id, 'channel': CHANNEL_DIGEST,
+            'text': "📅 Дни рождения в вашем отделе на этой неделе:\n" + upcoming_text(birthdays, False),
+            'priority': PRIORITY_NORMAL,
+        }
+        for (head_id, chat_id), birthdays in by_head.items()
+    ]
+
+
+async def send_birthday_digest(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Еженедельная сводка дней рождения для начальников отделов.
+
+    Все отделы обрабатываются одним запросом (Employee.get_birthday_digest).
+    Сообщения идут через очередь outbox с датой начала периода, поэтому
+    повторный запуск в тот же день не дублирует сводку.
+    """
+    today = datetime.now(ZoneInfo(TIMEZONE)).date()
+    rows = await run_db(Employee.get_birthday_digest, today, DIGEST_DAYS)
+    messages = [{**message, 'greet_date': today} for message in build_digest_messages(rows)]
+    if not messages:
+        return
+    queued = await run_db(OutboxMessage.enqueue, messages)
+    logger.info(f"Еженедельная сводка: {len(messages)} начальников, новых сообщений в очереди: {queued}")
+
+    await drain_outbox(context)
+
+
+def load_celebration_data(session, due) -> tuple[list, list[Employee], list[Employee]]:
+    """Ещё не поздравленные из due [(ID, местная дата)], их данные и коллеги, которым можно отправить сообщение"""
+    done = Celebration.get_done(session, due)
+    due = [item for item in due if item not in done]
+    celebrants = Employee.get_by_ids(session, [employee_id for employee_id, _ in due]) if due else []
+    if not celebrants:
+        return due, [], []
+    department_ids = {emp.department_id for emp in celebrants}
+    return due, celebrants, Employee.get_notifiable_by_departments(session, department_ids)
+
+
+def resolve_timezone(name: str | None) -> ZoneInfo:
+    """Часовой пояс по имени IANA; неизвестный или пустой -- TIMEZONE из config"""
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Неизвестный часовой пояс '{name}', используется {TIMEZONE}")
+    return ZoneInfo(TIMEZONE)
+
+
+def next_fire_time(birth_date: date, tz: ZoneInfo, fire_time: time, now: datetime,
+                   start: date | None = None) -> tuple[datetime, date]:
+    """Момент поздравления и местная дата ближайшего дня рождения, начиная с start.
+
+    Если день рождения сегодня, а время поздравления уже прошло (бот был
+    остановлен), поздравление отправляется сразу.
+    """
+    day = next_celebration(birth_date, start or now.astimezone(tz).date())
+    fire_at = datetime.combine(day, fire_time, tzinfo=tz)
+    return max(fire_at, now), day
+
+
+class BirthdayScheduler:
+    """Планировщик поздравлений в местное время каждого сотрудника.
+
+    Хранит min-кучу (момент поздравления, порядковый номер, ID сотрудника,
+    местная дата) и держит взведённым один таймер JobQueue -- на вершину кучи.
+    При изменении сотрудника в кучу добавляется новая запись, а старая
+    считается устаревшей и пропускается при извлечении. Полная загрузка
+    берёт только дни рождения ближайших SCHEDULE_WINDOW_DAYS.
+
+    При нескольких репликах расписание ведёт только ведущая (см. leader.py):
+    остальные не загружают кучу и не взводят таймер.
+    """
+
+    def __init__(self, application: Application, fire_time: time | None = None):
+        self.application = application
+        self.fire_time = fire_time or time(*map(int, BIRTHDAY_CHECK_TIME.split(':')))
+        self._heap = []
+        self._current = {}  # ID сотрудника -> порядковый номер актуальной записи
+        self._employees = {}  # ID сотрудника -> (дата рождения, часовой пояс)
+        self._sequence = itertools.count()
+        self._job = None
+        self._armed_at = None
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    @property
+    def active(self) -> bool:
+        """Расписание ведёт эта реплика"""
+        leader = get_leader(self.application)
+        return leader is None or leader.is_leader
+
+    def schedule(self, employee_id: int, birth_date: date, tz_name: str | None,
+                 now: datetime | None = None, start: date | None = None) -> datetime:
+        """Добавить (или перенести) поздравление сотрудника"""
+        tz = resolve_timezone(tz_name)
+        fire_at, day = next_fire_time(birth_date, tz, self.fire_time, now or datetime.now(timezone.utc), start)
+        sequence = next(self._sequence)
+        heapq.heappush(self._heap, (fire_at, sequence, employee_id, day))
+        self._current[employee_id] = sequence
+        self._employees[employee_id] = (birth_date, tz_name)
+        return fire_at
+
+    def unschedule(self, employee_id: int) -> None:
+        """Убрать сотрудника из расписания"""
+        self._current.pop(employee_id, None)
+        self._employees.pop(employee_id, None)
+
+    def peek(self) -> datetime | None:
+        """Ближайший момент поздравления"""
+        while self._heap and self._current.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)  # Устаревшая запись
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list[tuple[int, date]]:
+        """Извлечь наступившие поздравления: [(ID сотрудника, местная дата)]"""
+        due = []
+        while self.peek() is not None and self._heap[0][0] <= now:
+            _, _, employee_id, day = heapq.heappop(self._heap)
+            del self._current[employee_id]
+            due.append((employee_id, day))
+        return due
+
+    def rebuild(self, rows, now: datetime | None = None) -> None:
+        """Построить кучу заново по строкам (ID, дата рождения, часовой пояс)"""
+        self._heap.clear()
+        self._current.clear()
+        self._employees.clear()
+        for employee_id, birth_date, tz_name in rows:
+            self.schedule(employee_id, birth_date, tz_name, now)
+
+    async def reload(self, context: ContextTypes.DEFAULT_TYPE | None = None) -> None:
+        """Загрузка расписания из БД (при запуске, получении аренды и раз в сутки).
+
+        Загружаются только дни рождения в ближайшие SCHEDULE_WINDOW_DAYS
+        (по индексу birth_key), а не все сотрудники.
+        """
+        if not self.active:
+            return
+        start = datetime.now(ZoneInfo(TIMEZONE)).date() - timedelta(days=1)
+        self.rebuild(await run_db(Employee.get_schedule_rows, None, start, SCHEDULE_WINDOW_DAYS))
+        logger.info(f"Расписание поздравлений: {len(self)} сотрудников, ближайшее: {self.peek()}")
+        self._arm()
+
+    async def refresh(self, employee_ids) -> None:
+        """Обновить расписание для изменённых, добавленных или удалённых сотрудников"""
+        if not self.active:
+            return
+        employee_ids = set(employee_ids)
+        rows = await run_db(Employee.get_schedule_rows, employee_ids)
+        for employee_id in employee_ids - {row[0] for row in rows}:
+            self.unschedule(employee_id)
+        for employee_id, birth_date, tz_name in rows:
+            self.schedule(employee_id, birth_date, tz_name)
+        self._arm()
+
+    async def stop(self) -> None:
+        """Снять таймер и очистить расписание (реплика перестала быть ведущей)"""
+        self.rebuild([])
+        self._arm()
+
+    def _arm(self) -> None:
+        """Взвести единственный таймер на ближайшее поздравление"""
+        fire_at = self.peek() if self.active else None
+        if fire_at == self._armed_at and self._job is not None:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        self._armed_at = fire_at
+        if fire_at is not None:
+            self._job = self.application.job_queue.run_once(self._fire, when=fire_at, name=BIRTHDAY_JOB_NAME)
+
+    async def _fire(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self._job = None
+        self._armed_at = None
+        if not self.active:
+            return
+        due = self.pop_due(datetime.now(timezone.utc))
+        try:
+            await self._congratulate(context, due)
+        finally:
+            # Следующее поздравление -- через год, начиная со следующего дня
+            for employee_id, day in due:
+                if employee_id in self._employees and employee_id not in self._current:
+                    self.schedule(employee_id, *self._employees[employee_id], start=day + timedelta(days=1))
+            self._arm()
+
+    async def _congratulate(self, context: ContextTypes.DEFAULT_TYPE, due: list[tuple[int, date]]) -> None:
+        """Поставить поздравления в очередь outbox и отправить её.
+
+        Повторный запуск за ту же местную дату ничего не дублирует.
+        """
+        if not due:
+            return
+        due, celebrants, colleagues = await run_db(load_celebration_data, due)
+        if not due:
+            return
+        days = dict(due)
+        messages = []
+        for day in sorted(set(days.values())):
+            group = [emp for emp in celebrants if days[emp.id] == day]
+            messages.extend({**message, 'greet_date': day} for message in build_messages(group, colleagues))
+        queued = await run_db(Celebration.record, due, messages)
+        logger.info(f"Именинников: {len(celebrants)}, новых сообщений в очереди: {queued}")
+
+        await drain_outbox(context)
+
+
+def get_birthday_scheduler(application: Application) -> BirthdayScheduler:
+    """Планировщик поздравлений приложения"""
+    return application.bot_data[SCHEDULER_KEY]
+
+
+def setup_scheduler(application: Application) -> BirthdayScheduler:
+    """Планировщик поздравлений и еженедельная сводка для начальников отделов"""
+    scheduler = BirthdayScheduler(application)
+    application.bot_data[SCHEDULER_KEY] = scheduler
+    leader = get_leader(application)
+    if leader is not None:
+        leader.on_elected(scheduler.reload)
+        leader.on_demoted(scheduler.stop)
+    application.job_queue.run_once(scheduler.reload, when=0, name=RELOAD_JOB_NAME)
+    # Подхватывает изменения, сделанные в обход бота (синхронизация с кадровой системой)
+    application.job_queue.run_daily(scheduler.reload, time=time(0, 5, tzinfo=ZoneInfo(TIMEZONE)), name=RELOAD_JOB_NAME)
+
+    hour, minute = map(int, DIGEST_TIME.split(':'))
+    application.job_queue.run_daily(
+        leader_only(send_birthday_digest),
+        time=time(hour, minute, tzinfo=ZoneInfo(TIMEZONE)),
+        days=((DIGEST_WEEKDAY + 1) % 7,),  # В JobQueue 0 -- воскресенье
+        name=DIGEST_JOB_NAME
+    )
+    return scheduler
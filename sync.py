@@ -0,0 +1,228 @@
+# sync.py
+"""Инкрементальная синхронизация сотрудников с выгрузкой кадровой системы.
+
+Каждый сотрудник выгрузки идентифицируется стабильным табельным номером
+(external_id). Для него хранится хэш данных из последней выгрузки, поэтому
+в БД записываются только новые, изменённые и исчезнувшие сотрудники.
+Сотрудники без external_id (добавленные через бота) синхронизацией не
+затрагиваются.
+
+Запуск из командной строки:
+    python sync.py snapshot.csv [--dry-run]
+"""
+import argparse
+import hashlib
+from itertools import islice
+from sqlalchemy import select, insert, update, delete
+from database import Employee
+from importer import iter_rows, parse_row, resolve_departments, MAX_REPORTED_ERRORS
+
+CHUNK_SIZE = 500  # Размер пакета для запросов с IN (...)
+
+
+class SyncReport:
+    """Итоги синхронизации"""
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.inserted = 0
+        self.updated = 0
+        self.moved = 0  # из них переведены в другой отдел
+        self.deleted = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.departments_created = 0
+        self.errors = []
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, reason))
+
+    @property
+    def changes(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+    def summary(self) -> str:
+        """Текстовый отчёт"""
+        lines = [
+            "🔎 Проверка выгрузки (изменения не сохранены)" if self.dry_run else "🔄 Синхронизация завершена",
+            f"➕ Добавлено: {self.inserted}",
+            f"✏️ Изменено: {self.updated} (переводов между отделами: {self.moved})",
+            f"🗑️ Удалено: {self.deleted}",
+            f"= Без изменений: {self.unchanged}",
+            f"🏢 Новых отделов: {self.departments_created}",
+            f"❌ Отклонено: {self.rejected}",
+        ]
+        lines.extend(f"  строка {line}: {reason}" for line, reason in self.errors)
+        return "\n".join(lines)
+
+
+def content_hash(row: dict) -> str:
+    """Хэш данных сотрудника из выгрузки"""
+    payload = "\x1f".join(str(row[field]) for field in (
+        'full_name', 'birth_date', 'department', 'telegram_id', 'is_head'
+    ))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _chunks(items, size: int = CHUNK_SIZE):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def compute_delta(session, rows, report: SyncReport) -> tuple[list, list, list]:
+    """Сравнение выгрузки с БД: (новые строки, изменённые строки, ID удаляемых)"""
+    # external_id -> (id, хэш); только узкие колонки, без загрузки объектов
+    existing = {
+        row.external_id: (row.id, row.content_hash)
+        for row in session.execute(
+            select(Employee.external_id, Employee.id, Employee.content_hash)
+            .where(Employee.external_id.isnot(None))
+        )
+    }
+    seen = set()
+    inserts, updates = [], []
+    for line, raw in rows:
+        external_id = raw.get('external_id', '')
+        if not external_id:
+            report.reject(line, "не указан табельный номер")
+            continue
+        if external_id in seen:
+            report.reject(line, f"табельный номер {external_id} уже встречался в файле")
+            continue
+        seen.add(external_id)
+        try:
+            row = parse_row(raw)
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+
+        row['content_hash'] = content_hash(row)
+        current = existing.get(external_id)
+        if current is None:
+            inserts.append((line, row))
+        elif current[1] != row['content_hash']:
+            updates.append((line, {'id': current[0], **row}))
+        else:
+            report.unchanged += 1
+
+    deleted_ids = [emp_id for ext_id, (emp_id, _) in existing.items() if ext_id not in seen]
+    return inserts, updates, deleted_ids
+
+
+def _reject_telegram_conflicts(session, inserts: list, updates: list, deleted_ids: list,
+                               report: SyncReport) -> tuple[list, list]:
+    """Отклоняет строки, чей Telegram ID занят сотрудником вне синхронизации
+    или уже встретился в выгрузке выше (как seen_telegram_ids в importer)"""
+    wanted = [row['telegram_id'] for _, row in inserts + updates if row['telegram_id'] is not None]
+    taken = {}
+    for chunk in _chunks(wanted):
+        taken.update(session.execute(
+            select(Employee.telegram_id, Employee.id).where(Employee.telegram_id.in_(chunk))
+        ).all())
+
+    # Отклонённая строка изменения оставляет сотруднику прежний Telegram ID,
+    # поэтому проверку повторяем, пока не перестанут появляться новые отказы
+    rows = sorted(inserts + updates, key=lambda item: item[0])
+    rejected = {}  # номер строки -> причина
+    while True:
+        released = {row['id'] for line, row in updates if line not in rejected} | set(deleted_ids)
+        claimed = set()
+        found = False
+        for line, row in rows:
+            telegram_id = row['telegram_id']
+            if line in rejected or telegram_id is None:
+                continue
+            holder = taken.get(telegram_id)
+            if telegram_id in claimed:
+                rejected[line] = f"Telegram ID {telegram_id} уже встречался в файле"
+            elif holder is not None and holder not in released and holder != row.get('id'):
+                rejected[line] = f"Telegram ID {telegram_id} занят другим сотрудником"
+            else:
+                claimed.add(telegram_id)
+                continue
+            found = True
+        if not found:
+            break
+
+    for line in sorted(rejected):
+        report.reject(line, rejected[line])
+    return ([(l, r) for l, r in inserts if l not in rejected],
+            [(l, r) for l, r in updates if l not in rejected])
+
+
+def apply_delta(session, inserts: list, updates: list, deleted_ids: list, report: SyncReport) -> None:
+    """Применение изменений в текущей транзакции"""
+    inserts, updates = _reject_telegram_conflicts(session, inserts, updates, deleted_ids, report)
+
+    departments = {}
+    resolve_departments(session, {row['department'] for _, row in inserts + updates}, departments, report)
+    for _, row in inserts + updates:
+        row['department_id'] = departments[row.pop('department')]
+
+    # Переводы между отделами
+    for chunk in _chunks(updates):
+        current = dict(session.execute(
+            select(Employee.id, Employee.department_id).where(Employee.id.in_([row['id'] for _, row in chunk]))
+        ).all())
+        report.moved += sum(1 for _, row in chunk if current.get(row['id']) != row['department_id'])
+
+    for chunk in _chunks(deleted_ids):
+        session.execute(delete(Employee).where(Employee.id.in_(chunk)))
+    # Освобождаем Telegram ID изменяемых сотрудников, чтобы обмен ID
+    # между сотрудниками не нарушал уникальность посреди обновления
+    for chunk in _chunks(updates):
+        session.execute(
+            update(Employee)
+            .where(Employee.id.in_([row['id'] for _, row in chunk]))
+            .values(telegram_id=None)
+        )
+    if updates:
+        session.execute(update(Employee), [row for _, row in updates])
+    if inserts:
+        session.execute(insert(Employee), [row for _, row in inserts])
+
+    report.deleted += len(deleted_ids)
+    report.updated += len(updates)
+    report.inserted += len(inserts)
+
+
+def sync_rows(session, rows, dry_run: bool = False) -> SyncReport:
+    """Синхронизация с выгрузкой одной транзакцией"""
+    report = SyncReport(dry_run)
+    try:
+        inserts, updates, deleted_ids = compute_delta(session, rows, report)
+        apply_delta(session, inserts, updates, deleted_ids, report)
+        if dry_run:
+            session.rollback()
+        else:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return report
+
+
+def sync_file(session, path: str, dry_run: bool = False) -> SyncReport:
+    """Синхронизация с файлом выгрузки CSV/XLSX"""
+    return sync_rows(session, iter_rows(path), dry_run=dry_run)
+
+
+def main() -> None:
+    """Точка входа командной строки"""
+    from database import Session
+
+    parser = argparse.ArgumentParser(description="Синхронизация сотрудников с выгрузкой кадровой системы")
+    parser.add_argument('path', help="Файл выгрузки .csv или .xlsx с колонкой external_id")
+    parser.add_argument('--dry-run', action='store_true', help="Только посчитать изменения")
+    args = parser.parse_args()
+
+    with Session() as session:
+        report = sync_file(session, args.path, dry_run=args.dry_run)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import date
+from access import AccessSnapshot, Member
+from database import Department, Employee, UserRole
+
+
+def test_snapshot_updates():
+    snapshot = AccessSnapshot(bootstrap_admins=[1])
+    snapshot.load([2], [(10, 100, 5), (11, 101, 5), (12, 102, 6)])
+    assert snapshot.is_admin(1) and snapshot.is_admin(2) and not snapshot.is_admin(100)
+    assert snapshot.member(100) == Member(10, 5)
+
+    # Сотруднику сменили Telegram ID и отдел
+    snapshot.set_employee(10, 200, 6)
+    assert snapshot.member(100) is None and snapshot.member(200) == Member(10, 6)
+
+    # Telegram ID перешёл к другому сотруднику: удаление прежнего владельца его не трогает
+    snapshot.set_employee(11, 200, 5)
+    snapshot.set_employee(10, None, None)
+    assert snapshot.member(200) == Member(11, 5)
+
+    snapshot.remove_department(5)
+    assert snapshot.member(200) is None and len(snapshot) == 1
+
+    # Полная загрузка не снимает администраторов из ADMIN_IDS
+    snapshot.load([], [])
+    assert snapshot.is_admin(1) and not snapshot.is_admin(2)
+
+
+def test_reload_refresh_and_roles(temp_db):
+    with temp_db() as session:
+        session.add(Department(name="IT", employees=[
+            Employee(full_name="Иванов", birth_date=date(1990, 1, 1), telegram_id=100),
+            Employee(full_name="Петров", birth_date=date(1990, 1, 2)),
+        ]))
+        session.add(UserRole(telegram_id=7, role=UserRole.ADMIN))
+        session.commit()
+        dept_id = session.query(Department.id).scalar()
+        ivanov, petrov = (e.id for e in session.query(Employee).order_by(Employee.id))
+
+    snapshot = AccessSnapshot(bootstrap_admins=[1])
+
+    async def scenario():
+        await snapshot.reload()
+        assert snapshot.is_admin(7) and snapshot.member(100) == Member(ivanov, dept_id)
+
+        with temp_db() as session:
+            session.get(Employee, petrov).telegram_id = 101
+            session.delete(session.get(Employee, ivanov))
+            session.commit()
+        await snapshot.refresh([ivanov, petrov])
+        assert snapshot.member(100) is None and snapshot.member(101) == Member(petrov, dept_id)
+
+        assert await snapshot.grant_admin(8) and not await snapshot.grant_admin(8)
+        assert await snapshot.revoke_admin(7)
+        assert not await snapshot.revoke_admin(1) and snapshot.is_admin(1)
+
+    asyncio.run(scenario())
+    assert snapshot.is_admin(8) and not snapshot.is_admin(7)
+    with temp_db() as session:
+        assert UserRole.get_ids(session) == [8]
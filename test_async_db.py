@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import time
+import pytest
+from async_db import run_db
+from database import Department
+
+
+def test_run_db_uses_db_thread_pool():
+    thread_name = asyncio.run(run_db(lambda session: threading.current_thread().name))
+    assert thread_name.startswith("db")
+
+
+def test_run_db_timeout():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_db(lambda session: time.sleep(0.5), timeout=0.05))
+
+
+def test_run_db_timeout_skips_late_commit(temp_db):
+    def slow_create(session):
+        time.sleep(0.2)
+        Department.create(session, "Поздний")
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await run_db(slow_create, timeout=0.05)
+        await asyncio.sleep(0.3)  # функция доработала в потоке
+        return await run_db(Department.get_all)
+
+    assert asyncio.run(scenario()) == []
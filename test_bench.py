@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+from bench import compare
+
+
+def result(median, queries=1):
+    return {'median_ms': median, 'p95_ms': median, 'min_ms': median, 'queries': queries}
+
+
+def test_compare_flags_slower_cases_and_extra_queries():
+    params = {'departments': 10, 'employees': 100, 'seed': 1}
+    baseline = {'params': params, 'results': {'a': result(1.0), 'b': result(1.0), 'c': result(0.01), 'd': result(1.0)}}
+    current = {'params': params, 'results': {'a': result(1.2), 'b': result(1.5), 'c': result(0.05), 'd': result(1.0, 2)}}
+    regressions = compare(current, baseline, threshold=0.25)
+    assert [line.split(':')[0] for line in regressions] == ['b', 'd']
+    # Базовая линия с другими параметрами не сравнивается
+    assert compare({**current, 'params': {**params, 'seed': 2}}, baseline) == []
+
+
+def test_bench_runs_and_saves_baseline(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    args = [sys.executable, os.path.join(os.path.dirname(__file__), "bench.py"), "--departments", "5", "--employees", "50", "--repeat", "2",
+            "--warmup", "0", "--db", str(tmp_path / "bench.db"), "--baseline", str(baseline)]
+    subprocess.run(args + ["--save"], check=True, capture_output=True)
+    saved = json.loads(baseline.read_text(encoding='utf-8'))
+    assert saved['params'] == {'departments': 5, 'employees': 50, 'seed': 1}
+    assert saved['results']['handler.view_employees[warm]']['queries'] == 0
+    assert saved['results']['employee.get_by_telegram_id']['queries'] == 1
+    # Повторный запуск использует уже сгенерированную БД и сравнивает с базовой линией
+    rerun = subprocess.run(args + ["--only", "department.get_all"], capture_output=True, text=True)
+    assert "Генерация" not in rerun.stdout
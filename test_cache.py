@@ -0,0 +1,40 @@
+from cache import TTLCache
+
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3)  # вытесняет 'b' -- к нему обращались раньше всех
+    assert cache.get('b') == (False, None)
+    assert cache.get('c') == (True, 3)
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    cache = TTLCache(maxsize=10, ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') == (False, None)
+    assert len(cache) == 0
+
+
+def test_invalidate_by_tag():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(('employees', 1, None), 'page', tags=('department:1',))
+    cache.set(('employee_card', 5), 'card', tags=('employee:5', 'department:1'))
+    cache.set(('employees', 2, None), 'other', tags=('department:2',))
+
+    cache.invalidate('department:1')
+    assert cache.get(('employees', 1, None))[0] is False
+    assert cache.get(('employee_card', 5))[0] is False
+    assert cache.get(('employees', 2, None)) == (True, 'other')
+
+
+def test_stale_load_is_not_stored():
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate('department:1')  # запись в БД во время загрузки
+    cache.set('key', 'stale', generation=generation)
+    assert cache.get('key')[0] is False
@@ -0,0 +1,52 @@
+import asyncio
+from unittest.mock import MagicMock
+import pytest
+from telegram import Update
+import callbacks
+from callbacks import CallbackRouter, StaleCallbackHandler, decode
+from handlers import get_handlers
+
+
+def make_update(data):
+    update = MagicMock(spec=Update)
+    update.callback_query.data = data
+    return update
+
+
+def test_roundtrip_and_size():
+    data = callbacks.DEPARTMENT.encode(2 ** 40, ('p', 2 ** 62))
+    assert len(data.encode()) <= callbacks.MAX_CALLBACK_BYTES
+    assert decode(data) == (callbacks.DEPARTMENT, {'dept_id': 2 ** 40, 'cursor': ('p', 2 ** 62)})
+    assert decode(callbacks.DEPARTMENT.encode(5)) == (callbacks.DEPARTMENT, {'dept_id': 5, 'cursor': None})
+    assert decode(callbacks.MAIN_MENU.encode()) == (callbacks.MAIN_MENU, {})
+
+
+@pytest.mark.parametrize("data", ["dept_5", "edit_dept_name_5", "main_menu", "1zz", "1de:x!", "1ev:1:2", None])
+def test_legacy_and_garbage_are_not_decoded(data):
+    assert decode(data) is None
+
+
+def test_router_dispatches_typed_args():
+    calls = []
+
+    async def view(update, context, emp_id):
+        calls.append(emp_id)
+        return "ok"
+
+    router = CallbackRouter({callbacks.EMPLOYEE: view})
+    update = make_update(callbacks.EMPLOYEE.encode(42))
+    check = router.check_update(update)
+    assert router.check_update(make_update(callbacks.EDIT_EMPLOYEE.encode(42))) is None
+
+    result = asyncio.run(router.handle_update(update, MagicMock(), check, MagicMock()))
+    assert result == "ok" and calls == [42]
+
+
+def test_stale_buttons_are_caught():
+    handler = StaleCallbackHandler(lambda update, context: None)
+    assert handler.check_update(make_update("emp_5"))
+    assert not handler.check_update(make_update(callbacks.EMPLOYEE.encode(5)))
+
+
+def test_handlers_register():
+    assert get_handlers()
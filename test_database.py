@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 from datetime import date
 from database import Session, Department, Employee
 
@@ -47,10 +50,18 @@ def test_database():
         print(f"Первая страница: {[dept.name for dept in depts_page]}")
 
         # Проверка каскадного удаления
-        session.delete(hr)
-        session.commit()
+        removed = Department.delete_by_id(session, hr.id)
+        print(f"\nУдалено сотрудников вместе с отделом HR: {removed}")
         hr_employees = session.query(Employee).filter_by(department_id=hr.id).all()
         print(f"\nСотрудники отдела HR после удаления: {len(hr_employees)}")
 
 if __name__ == "__main__":
-    test_database()
\ No newline at end of file
+    test_database()
+
+
+def test_import_does_not_load_telegram():
+    # database используется CLI (migrations.py, sync.py) и не должен тянуть python-telegram-bot
+    code = "import sys, database, migrations, sync; print('telegram' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.stdout.strip() == "False"
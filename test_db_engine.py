@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine, text
+from db_engine import resolve_profile, engine_options, configure_engine, validate_engine
+
+
+def test_resolve_profile():
+    assert resolve_profile("sqlite:///bot.db", "auto") == "sqlite"
+    assert resolve_profile("postgresql://bot@localhost/bot", "auto") == "server"
+    with pytest.raises(ValueError):
+        resolve_profile("postgresql://bot@localhost/bot", "sqlite")
+    with pytest.raises(ValueError):
+        resolve_profile("sqlite:///bot.db", "fast")
+    with pytest.raises(ValueError, match="mysql"):
+        engine_options("mysql://bot@localhost/bot")
+
+
+def test_server_profile_has_pool_options():
+    options = engine_options("postgresql://bot@localhost/bot", "auto")
+    assert options['pool_pre_ping'] is True
+    assert options['pool_size'] >= 1
+
+
+def test_sqlite_profile_wal(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+    configure_engine(engine, "sqlite")
+    validate_engine(engine, "sqlite")
+    with engine.begin() as conn:
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    # Незавершённая запись не блокирует чтение
+    writer = engine.connect()
+    writer.execute(text("INSERT INTO t VALUES (2)"))
+    with engine.connect() as reader:
+        assert reader.execute(text("SELECT COUNT(*) FROM t")).scalar() == 1
+    writer.rollback()
+    writer.close()
+    engine.dispose()
@@ -0,0 +1,65 @@
+import asyncio
+from telegram.error import RetryAfter, Forbidden
+from dispatcher import Dispatcher, TokenBucket, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+
+    async def send_message(self, chat_id, text):
+        queue = self.errors.get(chat_id)
+        if queue:
+            raise queue.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def test_coalesces_messages_to_one_chat():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = Dispatcher(bot, rate=1000, burst=1000, concurrency=1, chat_interval=0)
+        stats = await dispatcher.send_all([(1, "a"), (1, "b"), (2, "c")])
+        await dispatcher.stop()
+        return bot, stats
+
+    bot, stats = asyncio.run(scenario())
+    assert sorted(bot.sent) == [(1, "a\n\nb"), (2, "c")]
+    assert (stats.submitted, stats.sent, stats.coalesced) == (3, 3, 1)
+
+
+def test_priority_order():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = Dispatcher(bot, rate=1000, burst=1000, concurrency=1, chat_interval=0)
+        futures = [dispatcher.submit(1, "low", PRIORITY_LOW), dispatcher.submit(2, "high", PRIORITY_HIGH)]
+        await asyncio.gather(*futures)
+        await dispatcher.stop()
+        return bot
+
+    assert [chat for chat, _ in asyncio.run(scenario()).sent] == [2, 1]
+
+
+def test_retry_after_and_permanent_failure():
+    async def scenario():
+        bot = FakeBot({1: [RetryAfter(0)], 2: [Forbidden("blocked")]})
+        dispatcher = Dispatcher(bot, rate=1000, burst=1000, concurrency=2, chat_interval=0)
+        stats = await dispatcher.send_all([(1, "a"), (2, "b")])
+        await dispatcher.stop()
+        return bot, stats
+
+    bot, stats = asyncio.run(scenario())
+    assert bot.sent == [(1, "a")]
+    assert (stats.sent, stats.failed, stats.retries) == (1, 1, 1)
+
+
+def test_token_bucket_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(6):
+            await bucket.acquire()
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 0.04
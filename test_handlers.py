@@ -0,0 +1,29 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from database import Department, Session
+from handlers import execute_delete
+
+
+def fake_update(text):
+    message = SimpleNamespace(text=text, reply_text=AsyncMock())
+    return SimpleNamespace(message=message, effective_user=SimpleNamespace(id=1), effective_chat=SimpleNamespace(id=1))
+
+
+def test_repeated_delete_reports_missing_department():
+    with Session() as session:
+        department = Department(name="Удаляемый")
+        session.add(department)
+        session.commit()
+        dept_id = department.id
+
+    context = SimpleNamespace(
+        user_data={'confirm_code': "1234", 'delete_target': {'type': 'department', 'id': dept_id}},
+        bot=SimpleNamespace(send_message=AsyncMock()), application=None
+    )
+    first, second = fake_update("1234"), fake_update("1234")
+    asyncio.run(execute_delete(first, context))
+    # Повторная отправка того же кода: отдела уже нет
+    asyncio.run(execute_delete(second, context))
+    assert first.message.reply_text.call_args.args[0].startswith("✅ Отдел успешно удалён!")
+    assert second.message.reply_text.call_args.args[0] == "❌ Отдел не найден."
@@ -0,0 +1,98 @@
+from datetime import date
+import pytest
+from database import Department, Employee
+from importer import import_rows, iter_csv_rows, iter_xlsx_rows, ImportFileError
+from sync import sync_rows
+
+
+def rows(*items):
+    return [(line, row) for line, row in enumerate(items, start=2)]
+
+
+def test_import_creates_updates_and_rejects(session):
+    it = Department(name="IT")
+    session.add_all([
+        Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1, department=it),
+        Employee(full_name="Петров", birth_date=date(1985, 1, 2), department=it),
+    ])
+    session.commit()
+
+    report = import_rows(session, rows(
+        {'full_name': "Иванов Иван", 'birth_date': "15.05.1990", 'department': "IT", 'telegram_id': "1"},
+        {'full_name': "Петров", 'birth_date': "02.01.1985", 'department': "IT", 'is_head': "да"},
+        {'full_name': "Сидоров", 'birth_date': "29.02.1988", 'department': "HR", 'telegram_id': "3"},
+        {'full_name': "Кузнецов", 'birth_date': "31.02.1990", 'department': "HR"},
+        {'full_name': "Дубль", 'birth_date': "01.01.1990", 'department': "HR", 'telegram_id': "3"},
+    ), batch_size=2)
+
+    assert (report.created, report.updated, report.rejected, report.departments_created) == (1, 2, 2, 1)
+    assert [line for line, _ in report.errors] == [5, 6]
+    assert session.query(Employee).filter_by(telegram_id=1).one().full_name == "Иванов Иван"
+    assert session.query(Employee).filter_by(full_name="Петров").one().is_head
+    sidorov = session.query(Employee).filter_by(full_name="Сидоров").one()
+    assert sidorov.department.name == "HR" and sidorov.birth_key == 229
+
+
+def test_dry_run_does_not_write(session):
+    session.add(Employee(full_name="Петров", birth_date=date(1985, 1, 2), telegram_id=2,
+                         department=Department(name="HR")))
+    session.commit()
+    report = import_rows(session, rows(
+        {'full_name': "Иванов", 'birth_date': "15.05.1990", 'department': "IT"},
+        {'full_name': "Сидоров", 'birth_date': "03.03.1980", 'department': "IT"},
+        {'full_name': "Петров П.", 'birth_date': "02.01.1985", 'department': "HR", 'telegram_id': "2"},
+    ), dry_run=True, batch_size=1)
+    assert (report.created, report.updated, report.departments_created) == (2, 1, 1)
+    assert session.query(Employee).count() == 1
+    assert session.query(Department).count() == 1
+    assert session.query(Employee).one().full_name == "Петров"
+
+
+
+def test_import_keeps_external_id_for_sync(session):
+    session.add(Employee(full_name="Петров", birth_date=date(1985, 1, 2), telegram_id=2, external_id="A2",
+                         department=Department(name="IT")))
+    session.commit()
+    hr_file = rows(
+        {'external_id': "A1", 'full_name': "Иванов", 'birth_date': "15.05.1990", 'department': "IT", 'telegram_id': "1"},
+        {'external_id': "A2", 'full_name': "Петров П.", 'birth_date': "02.01.1985", 'department': "IT"},
+        {'external_id': "A1", 'full_name': "Дубль", 'birth_date': "01.01.1990", 'department': "IT"},
+        {'external_id': "A3", 'full_name': "Сидоров", 'birth_date': "03.03.1980", 'department': "IT", 'telegram_id': "2"},
+    )
+    report = import_rows(session, hr_file)
+    assert (report.created, report.updated, report.rejected) == (1, 1, 2)
+    assert [line for line, _ in report.errors] == [4, 5]
+    assert {e.external_id: e.full_name for e in session.query(Employee)} == {"A1": "Иванов", "A2": "Петров П."}
+
+    # Та же выгрузка в sync.py не создаёт дублей импортированных сотрудников
+    synced = sync_rows(session, hr_file[:2])
+    assert (synced.inserted, synced.deleted, synced.rejected) == (0, 0, 0)
+    assert session.query(Employee).count() == 2
+
+def test_csv_header_aliases(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text("ФИО;Дата рождения;Отдел\nИванов;15.05.1990;IT\n", encoding="utf-8")
+    assert list(iter_csv_rows(str(path))) == [
+        (2, {'full_name': "Иванов", 'birth_date': "15.05.1990", 'department': "IT"})
+    ]
+
+
+def test_csv_encodings_and_format_errors(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text("ФИО;Дата рождения;Отдел\nИванов;15.05.1990;Продажи\n", encoding="cp1251")
+    assert list(iter_csv_rows(str(path)))[0][1]['department'] == "Продажи"
+
+    path.write_text("ФИО\nИванов\n", encoding="utf-8")
+    with pytest.raises(ImportFileError, match="нет колонок"):
+        list(iter_csv_rows(str(path)))
+
+    path.write_text("ФИО;Дата рождения;Отдел\nИванов;15.05.1990;" + "x" * 200000 + "\n", encoding="utf-8")
+    with pytest.raises(ImportFileError, match="CSV"):
+        list(iter_csv_rows(str(path)))
+
+
+def test_corrupt_xlsx(tmp_path):
+    path = tmp_path / "roster.xlsx"
+    path.write_text("ФИО;Дата рождения;Отдел\n", encoding="utf-8")  # CSV, переименованный в .xlsx
+    with pytest.raises(ImportFileError, match="повреждён"):
+        list(iter_xlsx_rows(str(path)))
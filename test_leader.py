@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+from database import Department, Employee, Lease, OutboxMessage, utcnow
+
+
+def expire(session, name="scheduler"):
+    """Держатель аренды «завис» и не продлил её вовремя"""
+    session.query(Lease).filter_by(name=name).update({'expires_at': utcnow() - timedelta(seconds=1)})
+    session.commit()
+
+
+def test_only_one_holder(session):
+    token = Lease.acquire(session, "scheduler", "a", 15)
+    assert token == 1
+    assert Lease.acquire(session, "scheduler", "b", 15) is None
+    # Продление не меняет token
+    assert Lease.acquire(session, "scheduler", "a", 15) == token
+
+
+def test_takeover_after_expiry_increments_token(session):
+    old = Lease.acquire(session, "scheduler", "a", 15)
+    expire(session)
+    new = Lease.acquire(session, "scheduler", "b", 15)
+    assert new == old + 1
+    # Бывший держатель не может продлить чужую аренду
+    assert Lease.acquire(session, "scheduler", "a", 15) is None
+
+
+def test_release_allows_immediate_takeover(session):
+    token = Lease.acquire(session, "scheduler", "a", 15)
+    assert not Lease.release(session, "scheduler", "b", token)
+    assert Lease.release(session, "scheduler", "a", token)
+    assert Lease.acquire(session, "scheduler", "b", 15) == token + 1
+
+
+def test_stale_fence_blocks_outbox_claim(session):
+    employee = Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1,
+                        department=Department(name="IT"))
+    session.add(employee)
+    session.commit()
+    OutboxMessage.enqueue(session, [{'employee_id': employee.id, 'greet_date': date(2024, 5, 15),
+                                     'channel': "greeting", 'chat_id': 1, 'text': "🎉", 'priority': 0}])
+
+    old = Lease.acquire(session, "scheduler", "a", 15)
+    expire(session)
+    new = Lease.acquire(session, "scheduler", "b", 15)
+
+    # Реплика «a» ещё считает себя ведущей, но её token устарел
+    assert OutboxMessage.claim(session, limit=10, lease_seconds=60, fence=("scheduler", old))[1] == []
+    assert len(OutboxMessage.claim(session, limit=10, lease_seconds=60, fence=("scheduler", new))[1]) == 1
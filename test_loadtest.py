@@ -0,0 +1,76 @@
+import asyncio
+import random
+from datetime import date
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+import pytest
+from access import access
+from database import Department, Employee, UserRole
+from fake_bot_api import FakeBotApi
+from loadtest import Event, LoadTest
+from main import build_application
+
+
+def test_fake_api_keeps_messages_like_telegram():
+    async def scenario():
+        api = FakeBotApi()
+        base_url = await api.start(port=0)
+        try:
+            async with Bot("123:TEST", base_url=base_url) as bot:
+                markup = InlineKeyboardMarkup([[InlineKeyboardButton("Отделы", callback_data="1dl")]])
+                message = await bot.send_message(42, "Меню", reply_markup=markup)
+                assert api.buttons(42) == ["1dl"]
+                await bot.edit_message_text("Отделы", 42, message.message_id)
+                assert api.buttons(42) == []
+                with pytest.raises(BadRequest, match="not modified"):
+                    await bot.edit_message_text("Отделы", 42, message.message_id)
+
+                api.push_message(42, "/start")
+                updates = await bot.get_updates(timeout=1)
+                assert updates[0].message.text == "/start" and updates[0].message.entities[0].type == "bot_command"
+        finally:
+            await api.stop()
+        return api
+
+    api = asyncio.run(scenario())
+    assert api.calls['editMessageText'] == 2
+    assert api.errors == {"Bad Request: message is not modified": 1}
+
+
+def test_event_roundtrip():
+    for event in (Event(1, "/start"), Event(2, data="1de:5")):
+        assert Event.from_json(event.to_json()) == event
+
+
+def test_click_stream_through_conversation(temp_db, monkeypatch):
+    users = [7000001, 7000002, 7000003]
+    # Снимок прав восстанавливается после теста
+    for name in ("_admins", "_members", "_telegram_ids"):
+        monkeypatch.setattr(access, name, getattr(access, name))
+    with temp_db() as session:
+        session.add(Department(name="Продажи", employees=[
+            Employee(full_name=f"Сотрудник {i}", birth_date=date(1990, 1, 1 + i)) for i in range(7)
+        ] + [Employee(full_name="Пользователь", birth_date=date(1990, 2, 1), telegram_id=users[2])]))
+        session.add_all([UserRole(telegram_id=user, role=UserRole.ADMIN) for user in users[:2]])
+        session.commit()
+
+    async def scenario():
+        api = FakeBotApi()
+        base_url = await api.start(port=0)
+        application = build_application(base_url)
+        try:
+            await access.reload()
+            async with application:
+                await application.updater.start_polling(poll_interval=0, timeout=1)
+                await application.start()
+                report = await LoadTest(api, timeout=5, rng=random.Random(1)).run(rate=40, duration=1.5, users=users)
+                await application.updater.stop()
+                await application.stop()
+        finally:
+            await api.stop()
+        return report
+
+    report = asyncio.run(scenario())
+    assert report.sent > 10 and report.completed > 10
+    assert report.api_calls['editMessageText'] > 0
+    assert "Bad Request: message to edit not found" not in report.api_errors
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from telegram.ext import CommandHandler, ConversationHandler
+import callbacks
+from async_db import run_db
+from callbacks import CallbackRouter
+from database import Department
+from metrics import (
+    Histogram, MetricsServer, instrument, instrument_handlers, api_method_label,
+    HANDLER_LATENCY, HANDLER_ERRORS, UPDATE_QUERIES
+)
+
+
+def test_histogram_exposition():
+    histogram = Histogram("test_seconds", "Тест", ("handler",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.1, "a")
+    histogram.observe(5, "a")
+    lines = histogram.collect()
+    assert 'test_seconds_bucket{handler="a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{handler="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{handler="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{handler="a"} 3' in lines
+    assert histogram.sum("a") == pytest.approx(5.15)
+
+
+def test_api_method_label_is_bounded():
+    assert api_method_label("https://api.telegram.org/bot123:ABC/sendMessage") == "sendMessage"
+    assert api_method_label("http://127.0.0.1:8081/bot123:ABC/getUpdates") == "getUpdates"
+    assert api_method_label("https://api.telegram.org/file/bot123:ABC/documents/file_7.csv") == "file"
+    assert api_method_label("https://api.telegram.org/file/bot123:ABC/photos/file_8") == "file"
+
+
+def test_instrument_counts_queries_in_db_threads():
+    async def test_metrics_handler(update, context):
+        await run_db(Department.get_all)
+        await run_db(Department.get_all)
+
+    async def test_metrics_failing(update, context):
+        raise RuntimeError
+
+    asyncio.run(instrument(test_metrics_handler)(None, None))
+    assert HANDLER_LATENCY.count("test_metrics_handler") == 1
+    assert UPDATE_QUERIES.sum("test_metrics_handler") == 2
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(instrument(test_metrics_failing)(None, None))
+    assert HANDLER_ERRORS.value("test_metrics_failing") == 1
+
+
+def test_instrument_handlers_walks_conversation_and_routes():
+    async def start(update, context):
+        pass
+
+    async def view(update, context, dept_id=None):
+        pass
+
+    router = CallbackRouter({callbacks.DEPARTMENT: view})
+    conversation = ConversationHandler(
+        entry_points=[CommandHandler("start", start)], states={1: [router]}, fallbacks=[]
+    )
+    instrument_handlers([conversation])
+    instrument_handlers([conversation])  # Повторная обёртка не выполняется
+    assert conversation.entry_points[0].callback.wrapped_by == {instrument}
+    assert router.routes[callbacks.DEPARTMENT.code].wrapped_by == {instrument}
+    assert router.routes[callbacks.DEPARTMENT.code].__wrapped__ is view
+
+
+def test_metrics_endpoint():
+    async def scenario():
+        server = MetricsServer(port=0)
+        await server.start()
+        try:
+            responses = []
+            for path in ("/metrics", "/other"):
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                responses.append((await reader.read()).decode())
+                writer.close()
+            return responses
+        finally:
+            await server.stop()
+
+    metrics, other = asyncio.run(scenario())
+    assert metrics.startswith("HTTP/1.1 200") and "# TYPE bot_handler_duration_seconds histogram" in metrics
+    assert other.startswith("HTTP/1.1 404")
@@ -0,0 +1,60 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from database import Base
+from migrations import migrate, current_version, check_schema, LATEST_VERSION
+
+
+def _legacy_engine(tmp_path):
+    """БД в том виде, как её создавал create_all до появления миграций"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE departments (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE)"))
+        conn.execute(text(
+            "CREATE TABLE employees (id INTEGER PRIMARY KEY, full_name VARCHAR(150) NOT NULL, "
+            "birth_date DATE NOT NULL, telegram_id INTEGER UNIQUE, is_head BOOLEAN, "
+            "department_id INTEGER NOT NULL REFERENCES departments(id))"
+        ))
+        conn.execute(text("INSERT INTO departments (id, name) VALUES (1, 'HR')"))
+        conn.execute(text(
+            "INSERT INTO employees (id, full_name, birth_date, is_head, department_id) "
+            "VALUES (1, 'Иванов', :birth, 0, 1)"
+        ), {'birth': date(1990, 5, 15)})
+    return engine
+
+
+def test_migrate_legacy_database(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    assert current_version(engine) == 0
+
+    assert migrate(engine) == list(range(1, LATEST_VERSION + 1))
+    check_schema(engine)
+
+    inspector = inspect(engine)
+    assert {'birth_key', 'external_id', 'content_hash'} <= {c['name'] for c in inspector.get_columns('employees')}
+    assert {
+        'ix_employees_birth_key', 'ix_employees_external_id',
+        'ix_employees_department_full_name', 'ix_employees_department_head',
+    } <= {i['name'] for i in inspector.get_indexes('employees')}
+    foreign_key = inspector.get_foreign_keys('employees')[0]
+    assert foreign_key['options'].get('ondelete') == 'CASCADE'
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT birth_key FROM employees WHERE id = 1")).scalar() == 515
+
+    # Повторный запуск ничего не делает
+    assert migrate(engine) == []
+    engine.dispose()
+
+
+def test_fresh_database_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    with pytest.raises(RuntimeError):
+        check_schema(engine)
+
+    migrate(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert inspector.has_table(table.name)
+        assert {c.name for c in table.columns} == {c['name'] for c in inspector.get_columns(table.name)}
+        assert {i.name for i in table.indexes} <= {i['name'] for i in inspector.get_indexes(table.name)}
+    engine.dispose()
@@ -0,0 +1,158 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from zoneinfo import ZoneInfo
+import pytest
+from sqlalchemy.orm.exc import DetachedInstanceError
+import handlers
+from async_db import run_db
+from cache import cache
+from config import TIMEZONE
+from database import Department, Employee, Session
+from handlers import load_employee_card, view_employees, view_upcoming_birthdays
+from orm_audit import audit, audited, OrmAuditError
+from rendering import render_cache
+from scheduler import build_messages, load_celebration_data
+
+
+def add_departments(session, count):
+    for i in range(count):
+        session.add(Department(name=f"Отдел {i}", employees=[
+            Employee(full_name=f"Сотрудник {i}", birth_date=date(1990, 1, 1 + i))
+        ]))
+    session.commit()
+    session.expunge_all()
+
+
+def test_lazy_load_is_reported(session):
+    add_departments(session, 1)
+    with audit() as report:
+        employee = session.query(Employee).first()
+        assert employee.department.name == "Отдел 0"
+    assert report.lazy_loads == {"Employee.department": 1}
+    assert report.queries == 2
+
+
+def test_n_plus_one_is_reported_in_strict_mode(session):
+    add_departments(session, 5)
+    with pytest.raises(OrmAuditError, match="N\\+1: Department.employees x5"):
+        with audit(strict=True):
+            for department in session.query(Department).all():
+                len(department.employees)
+
+
+def test_detached_access_is_reported(session):
+    add_departments(session, 1)
+    employee = session.query(Employee).first()
+    session.close()
+    with pytest.raises(DetachedInstanceError):
+        with audit() as report:
+            employee.department
+    assert len(report.detached) == 1
+
+
+def test_detached_access_caught_by_handler_is_reported(session):
+    add_departments(session, 1)
+    employee = session.query(Employee).first()
+    session.close()
+    with audit() as report:
+        try:
+            employee.department
+        except DetachedInstanceError:
+            pass
+    assert len(report.detached) == 1
+
+
+def test_audited_handler_publishes_report(caplog):
+    async def lazy_handler(update, context):
+        def load(session):
+            return [employee.department.name for employee in session.query(Employee).limit(1)]
+        return await run_db(load)
+
+    with Session() as session:
+        add_departments(session, 1)
+    asyncio.run(audited(lazy_handler, sample_rate=1.0)(None, None))
+    assert "lazy_handler" in caplog.text and "Employee.department" in caplog.text
+
+
+def test_employee_card_has_no_lazy_loads():
+    with Session() as session:
+        department = Department(name="Карточка", employees=[Employee(full_name="Петров", birth_date=date(1991, 2, 3))])
+        session.add(department)
+        session.commit()
+        emp_id = department.employees[0].id
+
+    with audit(strict=True) as report:
+        asyncio.run(run_db(load_employee_card, emp_id))
+    assert report.queries == 1
+
+
+def add_listing(temp_db, count=8):
+    """Отдел с начальником и count сотрудниками с днями рождения в ближайшие дни"""
+    today = datetime.now(ZoneInfo(TIMEZONE)).date()
+    with temp_db() as session:
+        department = Department(name="Листинг", employees=[
+            Employee(full_name=f"Сотрудник {i}", birth_date=(today + timedelta(days=i)).replace(year=1992),
+                     telegram_id=100 + i, is_head=i == 0)
+            for i in range(count)
+        ])
+        session.add(department)
+        session.commit()
+        return department.id
+
+
+def fake_callback():
+    query = SimpleNamespace(answer=AsyncMock(), edit_message_text=AsyncMock(), message=None)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=1),
+                             effective_chat=SimpleNamespace(id=1))
+    context = SimpleNamespace(user_data={}, bot=SimpleNamespace(send_message=AsyncMock()))
+    return update, context
+
+
+@pytest.fixture
+def empty_caches():
+    cache.clear()
+    render_cache.clear()
+    yield
+    cache.clear()
+    render_cache.clear()
+
+
+def test_view_employees_strict(temp_db, empty_caches):
+    dept_id = add_listing(temp_db)
+    update, context = fake_callback()
+    with audit(strict=True):
+        asyncio.run(view_employees(update, context, dept_id))
+    assert "Сотрудники (8)" in update.callback_query.edit_message_text.call_args.args[0]
+
+
+def test_view_upcoming_birthdays_strict(temp_db, empty_caches, monkeypatch):
+    dept_id = add_listing(temp_db)
+    monkeypatch.setattr(handlers, "is_admin", lambda user_id: True)
+    for department in (dept_id, None):
+        update, context = fake_callback()
+        with audit(strict=True):
+            asyncio.run(view_upcoming_birthdays(update, context, department))
+        assert "Сотрудник 7" in update.callback_query.edit_message_text.call_args.args[0]
+
+
+def test_celebration_loader_strict(temp_db):
+    day = date(2026, 5, 15)
+    with temp_db() as session:
+        departments = [
+            Department(name=f"Отдел {i}", employees=[
+                Employee(full_name=f"Именинник {i}", birth_date=date(1990, 5, 15), telegram_id=100 + i),
+                Employee(full_name=f"Коллега {i}", birth_date=date(1991, 1, 1), telegram_id=200 + i),
+            ])
+            for i in range(6)
+        ]
+        session.add_all(departments)
+        session.commit()
+        due = [(department.employees[0].id, day) for department in departments]
+
+    with audit(strict=True) as report:
+        due, celebrants, colleagues = asyncio.run(run_db(load_celebration_data, due))
+        messages = build_messages(celebrants, colleagues)
+    assert len(due) == 6 and len(messages) == 12
+    assert report.queries == 3
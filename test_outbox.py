@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+from database import Department, Employee, OutboxMessage, utcnow
+
+
+def add_recipient(session):
+    employee = Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1,
+                        department=Department(name="IT"))
+    session.add(employee)
+    session.commit()
+    return employee
+
+
+def message(employee, channel="greeting"):
+    return {'employee_id': employee.id, 'greet_date': date(2024, 5, 15), 'channel': channel,
+            'chat_id': employee.telegram_id, 'text': "🎉", 'priority': 0}
+
+
+def test_enqueue_is_idempotent(session):
+    employee = add_recipient(session)
+    assert OutboxMessage.enqueue(session, [message(employee), message(employee, "colleagues")]) == 2
+    assert OutboxMessage.enqueue(session, [message(employee)]) == 0
+    assert session.query(OutboxMessage).count() == 2
+
+
+def test_claim_ack_and_fencing(session):
+    employee = add_recipient(session)
+    OutboxMessage.enqueue(session, [message(employee), message(employee, "colleagues")])
+
+    token, batch = OutboxMessage.claim(session, limit=1, lease_seconds=60)
+    assert len(batch) == 1 and batch[0].attempts == 1
+    # Второй обработчик не видит арендованную строку
+    other_token, other = OutboxMessage.claim(session, limit=10, lease_seconds=60)
+    assert [m.id for m in other] != [batch[0].id] and len(other) == 1
+
+    assert OutboxMessage.ack(session, other_token, [batch[0].id]) == 0  # чужая аренда
+    assert OutboxMessage.ack(session, token, [batch[0].id]) == 1
+    assert OutboxMessage.claim(session, limit=10, lease_seconds=60)[1] == []
+
+
+def test_expired_lease_is_reclaimed(session):
+    employee = add_recipient(session)
+    OutboxMessage.enqueue(session, [message(employee)])
+    token, batch = OutboxMessage.claim(session, limit=10, lease_seconds=60)
+
+    # Процесс «упал»: аренда истекла, строку забирает следующий запуск
+    session.query(OutboxMessage).update({'lease_until': utcnow() - timedelta(seconds=1)})
+    session.commit()
+    new_token, reclaimed = OutboxMessage.claim(session, limit=10, lease_seconds=60)
+    assert [m.id for m in reclaimed] == [batch[0].id]
+    assert OutboxMessage.ack(session, token, [batch[0].id]) == 0
+
+
+def test_release_retries_then_fails(session):
+    employee = add_recipient(session)
+    OutboxMessage.enqueue(session, [message(employee)])
+    token, batch = OutboxMessage.claim(session, limit=10, lease_seconds=60)
+    OutboxMessage.release(session, token, [batch[0].id], retry_seconds=0, max_attempts=2)
+    assert session.get(OutboxMessage, batch[0].id).status == OutboxMessage.PENDING
+
+    token, batch = OutboxMessage.claim(session, limit=10, lease_seconds=60)
+    OutboxMessage.release(session, token, [batch[0].id], retry_seconds=0, max_attempts=2)
+    session.expire_all()
+    assert session.get(OutboxMessage, batch[0].id).status == OutboxMessage.FAILED
+
+
+def test_department_delete_cascades(session):
+    employee = add_recipient(session)
+    department_id = employee.department_id
+    session.add(Employee(full_name="Петров", birth_date=date(1985, 8, 22), department_id=department_id))
+    session.commit()
+    OutboxMessage.enqueue(session, [message(employee)])
+
+    assert Department.delete_by_id(session, department_id) == 2
+    assert session.query(Employee).count() == 0
+    assert session.query(OutboxMessage).count() == 0
+    assert Department.delete_by_id(session, department_id) is None
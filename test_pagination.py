@@ -0,0 +1,76 @@
+from datetime import date
+from database import Department, Employee
+
+
+def walk_forward(fetch):
+    page = fetch(None)
+    names = [[item.id for item in page.items]]
+    while page.has_next:
+        page = fetch(('n', page.items[-1].id))
+        names.append([item.id for item in page.items])
+    return page, names
+
+
+def test_department_keyset_pages(session):
+    # Порядок по name не совпадает с порядком id
+    session.add_all([Department(name=f"Отдел {i:02d}") for i in range(12, 0, -1)])
+    session.commit()
+    expected = [d.id for d in session.query(Department).order_by(Department.name, Department.id)]
+
+    last, pages = walk_forward(lambda cursor: Department.get_page(session, cursor, per_page=5))
+    assert [len(p) for p in pages] == [5, 5, 2]
+    assert sum(pages, []) == expected
+    assert last.has_prev and not last.has_next
+
+    back = Department.get_page(session, ('p', last.items[0].id), per_page=5)
+    assert [d.id for d in back.items] == expected[5:10]
+    assert back.has_prev and back.has_next
+
+    first = Department.get_page(session, ('p', back.items[0].id), per_page=5)
+    assert [d.id for d in first.items] == expected[:5]
+    assert not first.has_prev
+
+
+def test_employee_keyset_pages_with_duplicate_names(session):
+    it = Department(name="IT")
+    other = Department(name="HR")
+    session.add_all(
+        [Employee(full_name="Иванов", birth_date=date(1990, 1, 1), department=it) for _ in range(7)]
+        + [Employee(full_name="Петров", birth_date=date(1990, 1, 1), department=other)]
+    )
+    session.commit()
+
+    _, pages = walk_forward(lambda cursor: Employee.get_page_by_department(session, it.id, cursor, per_page=3))
+    ids = sum(pages, [])
+    assert ids == sorted(ids) and len(ids) == 7
+
+
+def test_deleted_cursor_falls_back_to_first_page(session):
+    session.add_all([Department(name=name) for name in "ABC"])
+    session.commit()
+    page = Department.get_page(session, ('n', 999), per_page=2)
+    assert [d.name for d in page.items] == ["A", "B"]
+    assert not page.has_prev and page.has_next
+
+
+def test_employee_listing_single_statement(session):
+    it = Department(name="IT")
+    empty = Department(name="Пустой")
+    session.add_all([empty] + [
+        Employee(full_name=f"Сотрудник {i}", birth_date=date(1990, 1, 1), department=it, is_head=(i == 4))
+        for i in range(7)
+    ])
+    session.commit()
+
+    listing = Department.get_employee_listing(session, it.id, per_page=3)
+    assert listing.department.name == "IT"
+    assert listing.total == 7 and listing.head_name == "Сотрудник 4"
+    assert len(listing.page.items) == 3 and listing.page.has_next
+
+    listing = Department.get_employee_listing(session, empty.id, per_page=3)
+    assert listing.page.items == [] and listing.total == 0 and listing.head_name is None
+    assert Department.get_employee_listing(session, 999) is None
+
+    page, total = Department.get_page_with_total(session, per_page=1)
+    assert total == 2 and len(page.items) == 1
+    assert Department.get_with_employee_count(session, it.id)[1] == 7
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+from telegram.ext import CommandHandler, ConversationHandler
+from persistence import DatabasePersistence, drop_conversations
+
+
+def test_user_data_and_conversations_survive_restart(temp_db):
+    async def scenario():
+        first = DatabasePersistence(flush_delay=0.01)
+        await first.update_user_data(1, {'new_employee': {'birth_date': date(1990, 5, 15)}})
+        await first.update_user_data(2, {'current_dept': 5})
+        await first.update_conversation("main", (1, 1), 7)
+        await first.update_conversation("main", (2, 2), 3)
+        await first.update_conversation("main", (2, 2), None)
+        await asyncio.sleep(0.05)  # отложенная запись одной транзакцией
+        await first.drop_user_data(2)
+        await first.flush()
+
+        second = DatabasePersistence()
+        assert await second.get_user_data() == {}  # ленивая загрузка
+        user_data = {}
+        await second.refresh_user_data(1, user_data)
+        dropped = {}
+        await second.refresh_user_data(2, dropped)
+        return user_data, dropped, await second.get_conversations("main")
+
+    user_data, dropped, conversations = asyncio.run(scenario())
+    assert user_data == {'new_employee': {'birth_date': date(1990, 5, 15)}}
+    assert dropped == {}
+    assert conversations == {(1, 1): 7}
+
+
+def test_unloaded_user_keeps_stored_data(temp_db):
+    async def scenario():
+        persistence = DatabasePersistence()
+        await persistence.refresh_user_data(1, {})
+        await persistence.update_user_data(1, {'edit_emp': 3})
+        await persistence.flush()
+
+        assert persistence.unload_idle_users(-1) == [1]
+        await persistence.drop_user_data(1)  # так Application выгружает данные из памяти
+        await persistence.flush()
+
+        user_data = {}
+        await persistence.refresh_user_data(1, user_data)
+        return user_data
+
+    assert asyncio.run(scenario()) == {'edit_emp': 3}
+
+
+def test_user_returning_during_unload_keeps_data(temp_db):
+    async def scenario():
+        persistence = DatabasePersistence()
+        await persistence.refresh_user_data(1, {})
+        await persistence.update_user_data(1, {'current_dept': 3})
+        await persistence.flush()
+
+        assert persistence.unload_idle_users(-1) == [1]
+        # Application убрал данные из памяти; новое обновление пришло раньше drop_user_data
+        live = {}
+        await persistence.refresh_user_data(1, live)
+        assert live == {'current_dept': 3}
+        live['current_dept'] = 4
+        await persistence.drop_user_data(1)
+
+        # Данные остаются загруженными: повторное обращение не накладывает БД поверх
+        await persistence.refresh_user_data(1, live)
+        await persistence.flush()
+
+        fresh = DatabasePersistence()
+        stored = {}
+        await fresh.refresh_user_data(1, stored)
+        return live, stored
+
+    live, stored = asyncio.run(scenario())
+    assert live == {'current_dept': 4} and stored == {'current_dept': 4}
+
+
+def test_expired_conversations_leave_memory(temp_db):
+    handler = ConversationHandler(
+        entry_points=[CommandHandler("start", lambda update, context: 1)], states={1: []}, fallbacks=[],
+        name="main", persistent=True
+    )
+    persistence = DatabasePersistence(flush_delay=0.01)
+    application = SimpleNamespace(handlers={0: [handler]}, persistence=persistence)
+
+    async def scenario():
+        await persistence.update_conversation("main", (1, 1), 1)
+        await persistence.update_conversation("main", (2, 2), 1)
+        await persistence.flush()
+        handler._conversations.update(await persistence.get_conversations("main"))
+
+        assert persistence.expired_conversations(3600) == []
+        persistence._conversation_access[("main", (1, 1))] -= 7200
+        assert persistence.expired_conversations(3600) == [("main", (1, 1))]
+        dropped = await drop_conversations(application, persistence.expired_conversations(3600))
+        assert persistence.expired_conversations(3600) == []  # больше не отслеживается
+        await persistence.flush()
+        return dropped, await persistence.get_conversations("main")
+
+    dropped, stored = asyncio.run(scenario())
+    assert dropped == 1 and stored == {(2, 2): 1}
+    assert handler._conversations == {(2, 2): 1}
@@ -0,0 +1,60 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from cache import cache
+from rendering import render_screen, show_screen, content_digest, render_stats
+
+
+def test_render_cache_follows_data_version():
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return f"версия {len(builds)}", InlineKeyboardMarkup([[InlineKeyboardButton("A", callback_data="1mm")]])
+
+    async def scenario():
+        first = await render_screen(('test_screen', 1), ('test:tag',), build)
+        second = await render_screen(('test_screen', 1), ('test:tag',), build)
+        cache.invalidate('test:tag')
+        third = await render_screen(('test_screen', 1), ('test:tag',), build)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first is second and len(builds) == 2
+    assert third.text == "версия 2"
+
+
+def make_query_update(text, markup):
+    update = MagicMock(spec=Update)
+    update.callback_query.message.text = text
+    update.callback_query.message.reply_markup = markup
+    update.callback_query.edit_message_text = AsyncMock()
+    return update
+
+
+def test_unchanged_message_is_not_edited():
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("A", callback_data="1mm")]])
+
+    async def scenario():
+        async def build():
+            return "текст", markup
+        screen = await render_screen(('same_screen',), (), build)
+
+        same = make_query_update("текст", InlineKeyboardMarkup([[InlineKeyboardButton("A", callback_data="1mm")]]))
+        skipped_before = render_stats.skipped
+        assert await show_screen(same, MagicMock(), screen) is False
+        same.callback_query.edit_message_text.assert_not_called()
+        assert render_stats.skipped == skipped_before + 1
+
+        changed = make_query_update("другой текст", markup)
+        assert await show_screen(changed, MagicMock(), screen) is True
+        changed.callback_query.edit_message_text.assert_awaited_once()
+
+        # Ответ Telegram "message is not modified" не считается ошибкой
+        stale = make_query_update("другой текст", markup)
+        stale.callback_query.edit_message_text.side_effect = BadRequest("Message is not modified")
+        assert await show_screen(stale, MagicMock(), screen) is False
+
+    asyncio.run(scenario())
+    assert content_digest("a", None) != content_digest("b", None)
@@ -0,0 +1,158 @@
+import asyncio
+from datetime import date, datetime, time, timezone
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+from database import Department, Employee, OutboxMessage, birthday_key_ranges
+import scheduler as scheduler_module
+from scheduler import build_messages, build_digest_messages, next_fire_time, BirthdayScheduler
+
+
+def test_schedule_rows_window(session):
+    it = Department(name="IT")
+    session.add_all([
+        Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1, department=it),
+        Employee(full_name="Петров", birth_date=date(1988, 2, 29), telegram_id=2, department=it),
+        Employee(full_name="Сидоров", birth_date=date(1985, 2, 28), telegram_id=3, department=it),
+    ])
+    session.commit()
+
+    def names(start, days=4):
+        ids = {row[0] for row in Employee.get_schedule_rows(session, None, start, days)}
+        return sorted(e.full_name for e in session.query(Employee) if e.id in ids)
+
+    assert names(date(2024, 5, 12)) == ["Иванов"]
+    assert names(date(2024, 5, 16)) == []
+    assert names(date(2023, 2, 27), 2) == ["Петров", "Сидоров"]  # 29.02 в невисокосный год
+    assert names(date(2024, 2, 27), 2) == ["Сидоров"]
+    assert len(Employee.get_schedule_rows(session)) == 3
+
+    employee = session.query(Employee).filter_by(full_name="Иванов").one()
+    employee.birth_date = date(1990, 12, 31)
+    session.commit()
+    assert employee.birth_key == 1231
+    assert names(date(2024, 12, 30)) == ["Иванов"]
+
+
+def test_build_messages(session):
+    it = Department(name="IT")
+    celebrant = Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1, department=it)
+    colleague = Employee(full_name="Петров", birth_date=date(1988, 1, 1), telegram_id=2, department=it)
+    session.add_all([celebrant, colleague])
+    session.commit()
+
+    messages = {m['chat_id']: m for m in build_messages([celebrant], [celebrant, colleague])}
+    assert "поздравляем" in messages[1]['text'] and messages[1]['channel'] == "greeting"
+    assert "Иванов" in messages[2]['text'] and messages[2]['employee_id'] == colleague.id
+
+
+def test_colleagues_notified_of_each_batch(session):
+    # Именинники одного отдела в разных часовых поясах поздравляются разными пакетами
+    it = Department(name="IT", timezone="Europe/Moscow")
+    east = Employee(full_name="Иванов", birth_date=date(1990, 5, 15), telegram_id=1, department=it,
+                    timezone="Asia/Vladivostok")
+    west = Employee(full_name="Петров", birth_date=date(1988, 5, 15), telegram_id=2, department=it)
+    colleague = Employee(full_name="Сидоров", birth_date=date(1985, 1, 1), telegram_id=3, department=it)
+    session.add_all([east, west, colleague])
+    session.commit()
+
+    colleagues = [east, west, colleague]
+    for batch in ([east], [west], [east]):
+        messages = [{**m, 'greet_date': date(2024, 5, 15)} for m in build_messages(batch, colleagues)]
+        OutboxMessage.enqueue(session, messages)
+
+    texts = [m.text for m in session.query(OutboxMessage).filter_by(chat_id=3).order_by(OutboxMessage.id)]
+    assert len(texts) == 2 and "Иванов" in texts[0] and "Петров" in texts[1]
+    # Именинники узнают друг о друге, повторный запуск пакета ничего не дублирует
+    assert session.query(OutboxMessage).count() == 6
+
+
+def test_birthday_key_ranges_wrap_year():
+    assert birthday_key_ranges(date(2024, 12, 28), 7) == [(1228, 1231), (101, 103)]
+    assert birthday_key_ranges(date(2023, 2, 20), 7) == [(220, 226)]
+    assert (229, 229) in birthday_key_ranges(date(2023, 2, 22), 7)
+
+
+def test_upcoming_birthdays_and_digest(session):
+    it, hr = Department(name="IT"), Department(name="HR")
+    session.add_all([
+        Employee(full_name="Начальник IT", birth_date=date(1970, 6, 1), telegram_id=10, is_head=True, department=it),
+        Employee(full_name="Новогодний", birth_date=date(1990, 1, 2), department=it),
+        Employee(full_name="Предновогодний", birth_date=date(1991, 12, 30), department=it),
+        Employee(full_name="Летний", birth_date=date(1992, 7, 1), department=it),
+        Employee(full_name="Кадровик", birth_date=date(1993, 12, 31), department=hr),  # У HR нет начальника
+    ])
+    session.commit()
+
+    upcoming = Employee.get_upcoming_birthdays(session, date(2024, 12, 29), 7)
+    assert [(b.full_name, b.celebration_date) for b in upcoming] == [
+        ("Предновогодний", date(2024, 12, 30)), ("Кадровик", date(2024, 12, 31)), ("Новогодний", date(2025, 1, 2)),
+    ]
+    assert len(Employee.get_upcoming_birthdays(session, date(2024, 12, 29), 7, department_id=hr.id)) == 1
+
+    digest = Employee.get_birthday_digest(session, date(2024, 12, 29), 7)
+    assert [row.birthday.full_name for row in digest] == ["Предновогодний", "Новогодний"]
+    messages = build_digest_messages(digest)
+    assert len(messages) == 1 and messages[0]['chat_id'] == 10
+    assert "30.12 — Предновогодний" in messages[0]['text']
+
+
+def test_next_fire_time_in_local_zone():
+    now = datetime(2024, 5, 14, 12, 0, tzinfo=timezone.utc)
+    fire_at, day = next_fire_time(date(1990, 5, 15), ZoneInfo("Asia/Vladivostok"), time(9, 0), now)
+    assert day == date(2024, 5, 15) and fire_at == datetime(2024, 5, 14, 23, 0, tzinfo=timezone.utc)
+
+    # День рождения сегодня, время прошло -- поздравить сразу
+    fire_at, day = next_fire_time(date(1990, 5, 14), ZoneInfo("Europe/Moscow"), time(9, 0), now)
+    assert fire_at == now and day == date(2024, 5, 14)
+
+
+def test_scheduler_keeps_one_timer_on_heap_top():
+    application = MagicMock()
+    scheduler = BirthdayScheduler(application, fire_time=time(9, 0))
+    now = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    scheduler.rebuild([
+        (1, date(1990, 5, 20), "Europe/Moscow"),
+        (2, date(1990, 5, 10), None),
+        (3, date(1990, 5, 10), "Asia/Vladivostok"),
+    ], now)
+    scheduler._arm()
+    application.job_queue.run_once.assert_called_once()
+    assert application.job_queue.run_once.call_args.kwargs['when'] == datetime(2024, 5, 9, 23, 0, tzinfo=timezone.utc)
+
+    # Перенос сотрудника: старая запись в куче пропускается
+    scheduler.schedule(3, date(1990, 6, 1), "Asia/Vladivostok", now)
+    scheduler.unschedule(1)
+    due = scheduler.pop_due(datetime(2024, 6, 30, tzinfo=timezone.utc))
+    assert due == [(2, date(2024, 5, 10)), (3, date(2024, 6, 1))]
+    assert scheduler.peek() is None
+
+
+def test_refire_after_reload_sends_nothing_new(temp_db, monkeypatch):
+    async def no_drain(context):
+        pass
+    monkeypatch.setattr(scheduler_module, "drain_outbox", no_drain)
+    with temp_db() as session:
+        it = Department(name="IT", timezone="Europe/Moscow")
+        session.add_all([
+            Employee(full_name="Иванов", birth_date=date(1990, 5, 15), department=it),  # без Telegram ID
+            Employee(full_name="Петров", birth_date=date(1988, 5, 15), telegram_id=2, department=it,
+                     timezone="Asia/Vladivostok"),
+            Employee(full_name="Сидоров", birth_date=date(1985, 1, 1), telegram_id=3, department=it),
+        ])
+        session.commit()
+        ivanov, petrov, _ = (e.id for e in session.query(Employee).order_by(Employee.id))
+
+    scheduler = BirthdayScheduler(MagicMock(), fire_time=time(9, 0))
+    day = date(2024, 5, 15)
+
+    async def scenario():
+        await scheduler._congratulate(None, [(ivanov, day), (petrov, day)])
+        # reload() или правка Петрова снова ставят сегодняшний день на «сейчас»
+        await scheduler._congratulate(None, [(petrov, day)])
+        await scheduler._congratulate(None, [(ivanov, day), (petrov, day)])
+
+    asyncio.run(scenario())
+    with temp_db() as session:
+        texts = [m.text for m in session.query(OutboxMessage).filter_by(chat_id=3)]
+        assert len(texts) == 1 and "Иванов" in texts[0] and "Петров" in texts[0]
+        assert session.query(OutboxMessage).count() == 2  # + поздравление Петрову
@@ -0,0 +1,37 @@
+from datetime import date
+from database import Department, Employee
+
+
+def populate(session):
+    it = Department(name="Информационные технологии")
+    accounting = Department(name="Бухгалтерия")
+    session.add_all([
+        Employee(full_name="Иванов Иван Иванович", birth_date=date(1990, 5, 15), department=it),
+        Employee(full_name="Иваненко Пётр", birth_date=date(1991, 1, 1), department=accounting),
+        Employee(full_name="Петров Иван", birth_date=date(1985, 8, 22), department=accounting),
+    ])
+    session.commit()
+    return it, accounting
+
+
+def names(hits):
+    return [hit.full_name for hit in hits]
+
+
+def test_prefix_search_is_ranked_and_maintained(temp_db):
+    with temp_db() as session:
+        it, accounting = populate(session)
+
+        # Больше совпадений в ФИО -- выше в результатах
+        assert names(Employee.search(session, "иван")) == ["Иванов Иван Иванович", "Иваненко Пётр", "Петров Иван"]
+        assert names(Employee.search(session, "иван бухг")) == ["Иваненко Пётр", "Петров Иван"]
+        assert names(Employee.search(session, "ПЕТР")) == ["Петров Иван"]
+        assert Employee.search(session, '"*:') == []
+
+        # Индекс обновляется триггерами при изменениях
+        Department.rename(session, accounting.id, "Финансы")
+        assert names(Employee.search(session, "фин")) == ["Иваненко Пётр", "Петров Иван"]
+        Employee.update_fields(session, Employee.search(session, "петров")[0].id, full_name="Сидоров Иван")
+        assert names(Employee.search(session, "сидор")) == ["Сидоров Иван"]
+        Department.delete_by_id(session, it.id)
+        assert names(Employee.search(session, "иванов")) == []
@@ -0,0 +1,71 @@
+from datetime import date
+from database import Department, Employee
+from sync import sync_rows
+
+
+def snapshot(*items):
+    return [
+        (line, {'external_id': ext, 'full_name': name, 'birth_date': birth, 'department': dept, 'telegram_id': tg})
+        for line, (ext, name, birth, dept, tg) in enumerate(items, start=2)
+    ]
+
+
+def test_sync_applies_only_changes(session):
+    manual = Employee(full_name="Добавлен вручную", birth_date=date(1990, 1, 1), department=Department(name="IT"))
+    session.add(manual)
+    session.commit()
+
+    first = sync_rows(session, snapshot(
+        ("A1", "Иванов", "15.05.1990", "IT", "1"),
+        ("A2", "Петров", "02.01.1985", "IT", "2"),
+        ("A3", "Сидоров", "03.03.1980", "HR", ""),
+    ))
+    assert (first.inserted, first.updated, first.deleted) == (3, 0, 0)
+
+    # Иванов и Петров обменялись Telegram ID, Сидоров переведён, A2 -> без изменений ФИО
+    second = sync_rows(session, snapshot(
+        ("A1", "Иванов", "15.05.1990", "IT", "2"),
+        ("A2", "Петров", "02.01.1985", "IT", "1"),
+        ("A3", "Сидоров", "03.03.1980", "IT", ""),
+        ("A4", "Кузнецов", "04.04.1994", "HR", ""),
+    ))
+    assert (second.inserted, second.updated, second.moved, second.deleted) == (1, 3, 1, 0)
+    assert session.query(Employee).filter_by(external_id="A1").one().telegram_id == 2
+
+    third = sync_rows(session, snapshot(
+        ("A1", "Иванов", "15.05.1990", "IT", "2"),
+        ("A4", "Кузнецов", "04.04.1994", "HR", ""),
+    ))
+    assert (third.unchanged, third.deleted, third.changes) == (2, 2, 2)
+    assert session.get(Employee, manual.id) is not None
+
+
+def test_sync_rejects_telegram_id_of_unmanaged_employee(session):
+    session.add(Employee(full_name="Вручную", birth_date=date(1990, 1, 1), telegram_id=7,
+                         department=Department(name="IT")))
+    session.commit()
+    report = sync_rows(session, snapshot(("A1", "Иванов", "15.05.1990", "IT", "7")))
+    assert report.inserted == 0 and report.rejected == 1
+
+
+def test_sync_rejects_duplicate_telegram_ids_in_snapshot(session):
+    sync_rows(session, snapshot(("A1", "Иванов", "15.05.1990", "IT", "1")))
+
+    # Новый сотрудник претендует на ID, который остаётся у изменённого; два новых -- на один ID;
+    # изменение A1 отклонено, поэтому его прежний ID 1 не освобождается
+    report = sync_rows(session, snapshot(
+        ("A2", "Петров", "02.01.1985", "IT", "3"),
+        ("A1", "Иванов", "15.05.1990", "HR", "3"),
+        ("A3", "Сидоров", "03.03.1980", "IT", "5"),
+        ("A4", "Кузнецов", "04.04.1994", "IT", "5"),
+        ("A5", "Смирнов", "05.05.1995", "IT", "1"),
+    ))
+    assert (report.inserted, report.updated, report.rejected) == (2, 0, 3)
+    assert [line for line, _ in report.errors] == [3, 5, 6]
+    assert {e.external_id: e.telegram_id for e in session.query(Employee)} == {"A1": 1, "A2": 3, "A3": 5}
+
+
+def test_dry_run(session):
+    report = sync_rows(session, snapshot(("A1", "Иванов", "15.05.1990", "IT", "")), dry_run=True)
+    assert report.inserted == 1
+    assert session.query(Employee).count() == 0
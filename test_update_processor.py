@@ -0,0 +1,34 @@
+import asyncio
+from unittest.mock import MagicMock
+from telegram import Update
+from update_processor import PerUserUpdateProcessor
+
+
+def make_update(chat_id, user_id):
+    update = MagicMock(spec=Update)
+    update.effective_chat.id = chat_id
+    update.effective_user.id = user_id
+    return update
+
+
+def test_same_user_is_sequential_other_users_concurrent():
+    async def scenario():
+        processor = PerUserUpdateProcessor(10)
+        log = []
+
+        async def handle(name, delay):
+            log.append(f"start {name}")
+            await asyncio.sleep(delay)
+            log.append(f"end {name}")
+
+        await asyncio.gather(
+            processor.process_update(make_update(1, 1), handle("a1", 0.05)),
+            processor.process_update(make_update(1, 1), handle("a2", 0)),
+            processor.process_update(make_update(2, 2), handle("b1", 0)),
+        )
+        return log, processor
+
+    log, processor = asyncio.run(scenario())
+    assert log.index("end a1") < log.index("start a2")
+    assert log.index("end b1") < log.index("end a1")
+    assert processor._locks == {}
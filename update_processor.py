@@ -0,0 +1,59 @@
+# update_processor.py
+import asyncio
+from typing import Awaitable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей.
+
+    Обновления одного пользователя в одном чате обрабатываются строго по
+    очереди -- это тот же ключ (chat_id, user_id), по которому
+    ConversationHandler хранит состояние диалога, поэтому переходы
+    состояний остаются согласованными. Слот общего лимита занимается только
+    после того, как подошла очередь пользователя, чтобы ожидающие обновления
+    одного пользователя не задерживали остальных.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # ключ -> [блокировка, число ожидающих обновлений]
+
+    @staticmethod
+    def update_key(update: object) -> tuple | None:
+        """Ключ упорядочивания обновлений"""
+        if not isinstance(update, Update):
+            return None
+        chat = update.effective_chat
+        user = update.effective_user
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self.update_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
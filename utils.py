@@ -1,11 +1,12 @@
 # utils.py
 import random
-from config import ADMIN_IDS, CONFIRM_CODE_LENGTH
+from config import CONFIRM_CODE_LENGTH
 from datetime import datetime
+from access import access
 
 def is_admin(user_id: int) -> bool:
-    """Проверка прав администратора"""
-    return user_id in ADMIN_IDS
+    """Проверка прав администратора (по снимку в памяти, без запроса к БД)"""
+    return access.is_admin(user_id)
 
 def generate_confirm_code() -> str:
     """Генерация кода подтверждения"""
@@ -17,4 +18,4 @@ def validate_date(date_str: str) -> bool:
         datetime.strptime(date_str, "%d.%m.%Y")
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False